@@ -0,0 +1,77 @@
+# JSON export of a large source model: CustomJSONEncoder (dataclasses_json) against model_export
+#
+# Usage: python benchmarks/bench_export.py [--fields 50000] [--fields-per-class 50] [--repeat 5]
+#
+# `stdlib` is model_export with the json module, `orjson` the same if orjson is installed. Every document is checked
+# to be the same as the one of CustomJSONEncoder once parsed.
+
+import argparse
+import enum
+import json
+import time
+
+import dataclasses_json
+import synthetic
+
+from gk.source_index import model_export
+
+
+class CustomJSONEncoder(json.JSONEncoder):
+    """The former export, through the reflection of dataclasses_json"""
+
+    def default(self, obj):
+        if issubclass(type(obj), enum.Enum):
+            return str(obj)
+
+        if issubclass(type(obj), dataclasses_json.DataClassJsonMixin):
+            return obj.to_dict()
+
+        return json.JSONEncoder.default(self, obj)
+
+
+def _best_time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fields", type=int, default=50000)
+    parser.add_argument("--fields-per-class", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    source_model = synthetic.synthetic_model(args.fields, args.fields_per_class)
+    orjson = model_export.orjson
+
+    def stdlib_export():
+        model_export.orjson = None
+        try:
+            return model_export.source_model_to_json(source_model)
+        finally:
+            model_export.orjson = orjson
+
+    encoders = {
+        "dataclasses_json": lambda: json.dumps(source_model, cls=CustomJSONEncoder),
+        "stdlib": stdlib_export,
+    }
+    if orjson is not None:
+        encoders["orjson"] = lambda: model_export.source_model_to_json(source_model)
+
+    reference = json.loads(encoders["dataclasses_json"]())
+    print(f"{'encoder':>18} {'time [ms]':>10} {'speedup':>8} {'size [MB]':>10}")
+    baseline = None
+    for name, encoder in encoders.items():
+        document = encoder()
+        assert json.loads(document) == reference, f"{name} exports a different document"
+        seconds = _best_time(encoder, args.repeat)
+        baseline = baseline or seconds
+        print(f"{name:>18} {seconds * 1000:>10.1f} {baseline / seconds:>8.1f} {len(document) / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
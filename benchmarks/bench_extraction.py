@@ -0,0 +1,83 @@
+# Model extraction pruned by the analysis of the template, on a header with mostly unannotated classes
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_extraction.py [--classes 512] [--annotated 16] [--fields 16]
+#                                                             [--repeat 5]
+#
+#   full     collect_source_model extracting every class, field and field type
+#   pruned   collect_source_model with the extraction of the template of the example
+# Both models render the same code.
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--classes", type=int, default=512)
+    parser.add_argument("--annotated", type=int, default=16, help="Annotated classes")
+    parser.add_argument("--fields", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import config, main as generator, parse_source, parse_worker, templating_tools
+
+    j2_env = templating_tools.build_jinja_environment(synthetic.EXAMPLE_CONFIG.parent)
+    app_config = config.load_app_config(synthetic.EXAMPLE_CONFIG)
+    template_config = app_config.templates[0]
+    analyzed_config = generator.analyze_templates(app_config, j2_env).templates[0]
+    print(f"Extraction: {analyzed_config.extraction}")
+
+    scope_fn = parse_source.build_scope_filter(**template_config.to_dict())
+    parsing_filter = parse_source.build_filter(**template_config.to_dict())
+    annotation_names = set(template_config.filter_annotations)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = pathlib.Path(work_dir)
+        (work_dir / "annotations.hpp").write_text(synthetic.ANNOTATIONS_HEADER)
+        header_file = work_dir / "unannotated.hpp"
+        header_file.write_text(
+            synthetic.synthetic_header(
+                "h",
+                class_count=args.classes,
+                field_count=args.fields,
+                includes=[],
+                annotated_field_count=args.fields // 2,
+                annotated_class_count=args.annotated,
+            )
+        )
+        translation_unit = parse_worker.create_translation_unit(clang_index.Index.create(), header_file)
+
+        def best_time(extraction):
+            best, source_model = float("inf"), None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                source_model = parse_source.collect_source_model(
+                    translation_unit, scope_fn, annotation_names, extraction=extraction
+                )
+                best = min(best, time.perf_counter() - start)
+            return best, parse_source.filter_source_model(source_model, parsing_filter)
+
+        full_time, full_model = best_time(template_config.extraction)
+        pruned_time, pruned_model = best_time(analyzed_config.extraction)
+
+    renders = [
+        generator.render_template(j2_env, render_config, header_file, source_model)
+        for render_config, source_model in [(template_config, full_model), (analyzed_config, pruned_model)]
+    ]
+    assert renders[0] == renders[1], "The pruned model renders differently"
+
+    for stage, stage_time, source_model in [("full", full_time, full_model), ("pruned", pruned_time, pruned_model)]:
+        field_count = sum(len(class_type.fields) for class_type in source_model.class_types)
+        class_count = len(source_model.class_types)
+        print(f"{stage:<7} {stage_time * 1000:>8.1f} ms {class_count:>6} classes {field_count:>7} fields")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# Traversal and model filter of one large synthetic translation unit
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_filter.py [--classes 2000] [--fields 16] [--annotated-fields 4]
+#                                                         [--methods 8] [--repeat 5]
+#
+#   scan     collect_source_model, the walk of the cursors
+#   filter   filter_source_model with the filter of the example template
+# The header includes the STL and json.hpp, whose cursors are enumerated but out of the main file scope.
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+
+def _best_time(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--classes", type=int, default=2000)
+    parser.add_argument("--fields", type=int, default=16)
+    parser.add_argument("--annotated-fields", type=int, default=4, help="Fields of a class with a FIELD annotation")
+    parser.add_argument("--methods", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import config, parse_source, parse_worker
+
+    template_config = config.load_app_config(synthetic.EXAMPLE_CONFIG).templates[0]
+    scope_fn = parse_source.build_scope_filter(**template_config.to_dict())
+    parsing_filter = parse_source.build_filter(**template_config.to_dict())
+    annotation_names = set(template_config.filter_annotations)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        (header_file,) = synthetic.write_synthetic_tree(
+            pathlib.Path(work_dir),
+            1,
+            class_count=args.classes,
+            field_count=args.fields,
+            annotated_field_count=args.annotated_fields,
+            method_count=args.methods,
+        )
+        translation_unit = parse_worker.create_translation_unit(clang_index.Index.create(), header_file)
+
+        statistics = parse_source.TraversalStatistics()
+        parse_source.collect_source_model(translation_unit, scope_fn, annotation_names, statistics)
+        scan_time, source_model = _best_time(
+            lambda: parse_source.collect_source_model(translation_unit, scope_fn, annotation_names), args.repeat
+        )
+        filter_time, filtered_model = _best_time(
+            lambda: parse_source.filter_source_model(source_model, parsing_filter), args.repeat
+        )
+
+    field_count = sum(len(class_type.fields) for class_type in filtered_model.class_types)
+    print(
+        f"{len(filtered_model.class_types)} classes, {field_count} fields, {statistics.cursors} enumerated cursors, "
+        f"{statistics.annotations} annotations"
+    )
+    print(f"scan   {scan_time * 1000:>8.1f} ms")
+    print(f"filter {filter_time * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Eager against lazy models, for a template the analysis cannot prune, on a header with mostly unannotated classes
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_lazy.py [--classes 512] [--annotated 16] [--fields 16] [--repeat 5]
+#
+#   eager   build_source_models, then rendering
+#   lazy    build_source_models with lazy=True, then rendering, which resolves the classes the template reads
+# The template selects the classes in its loop, so every class and field type would be extracted eagerly.
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+TEMPLATE = """{% for class in model.class_types if class.has_annotation("SERIALIZABLE") %}
+struct {{ class.name }}Fields {
+{% for field in class.fields %}
+    {{ field.type }} {{ field.name }};
+{% endfor %}
+};
+{% endfor %}
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--classes", type=int, default=512)
+    parser.add_argument("--annotated", type=int, default=16, help="Annotated classes")
+    parser.add_argument("--fields", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import config, main as generator, parse_worker, templating_tools
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = pathlib.Path(work_dir)
+        (work_dir / "fields.j2").write_text(TEMPLATE)
+        j2_env = templating_tools.build_jinja_environment(work_dir)
+        app_config = config.AppConfig(
+            templates=[
+                config.TemplateConfig(
+                    template="fields.j2", filter_annotations=["SERIALIZABLE", "FIELD"], filename_suffix=".h"
+                )
+            ]
+        )
+        template_configs = generator.analyze_templates(app_config, j2_env).templates
+        print(f"Extraction: {template_configs[0].extraction}")
+
+        (work_dir / "annotations.hpp").write_text(synthetic.ANNOTATIONS_HEADER)
+        header_file = work_dir / "unannotated.hpp"
+        header_file.write_text(
+            synthetic.synthetic_header(
+                "h",
+                class_count=args.classes,
+                field_count=args.fields,
+                includes=[],
+                annotated_class_count=args.annotated,
+            )
+        )
+        translation_unit = parse_worker.create_translation_unit(clang_index.Index.create(), header_file)
+
+        def best_time(lazy: bool):
+            best, content = float("inf"), None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                (source_model,) = parse_worker.build_source_models(translation_unit, template_configs, lazy=lazy)
+                content = generator.render_template(j2_env, template_configs[0], header_file, source_model)
+                best = min(best, time.perf_counter() - start)
+            return best, content
+
+        eager_time, eager_content = best_time(False)
+        lazy_time, lazy_content = best_time(True)
+
+    assert eager_content == lazy_content, "The lazy model renders differently"
+    print(f"{'eager':<6} {eager_time * 1000:>8.1f} ms")
+    print(f"{'lazy':<6} {lazy_time * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Peak RSS of generate-code against the number of input headers
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_memory.py [--counts 1 2 4 8 16 32]
+#
+# Every measurement runs in a fresh interpreter, since the peak RSS of a process never goes down.
+# `streaming` runs main.execute, `retained` keeps every translation unit alive like the former implementation did.
+
+import argparse
+import json
+import pathlib
+import resource
+import subprocess
+import sys
+import tempfile
+
+import synthetic
+
+
+def measure(mode: str, header_count: int, work_dir: pathlib.Path):
+    synthetic.set_clang_library_path()
+
+    from gk.source_index import config, main
+
+    source_dir = work_dir / "src"
+    target_dir = work_dir / "out"
+    header_files = synthetic.write_synthetic_tree(source_dir, header_count)
+
+    if mode == "streaming":
+        args = main.build_argparser().parse_args(
+            ["-c", str(synthetic.EXAMPLE_CONFIG), "-d", str(target_dir), "-I", str(source_dir), "-i"]
+            + [str(header_file) for header_file in header_files]
+        )
+        app_config = config.load_app_config(synthetic.EXAMPLE_CONFIG)
+        main.execute(app_config, args, synthetic.EXAMPLE_CONFIG.parent)
+    else:
+        translation_units = dict(main.create_translation_units([str(header_file) for header_file in header_files]))
+        assert len(translation_units) == header_count
+
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--modes", nargs="+", default=["retained", "streaming"])
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "COUNT", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, header_count, work_dir = args.child
+        print(json.dumps({"peak_rss_mb": measure(mode, int(header_count), pathlib.Path(work_dir))}))
+        return
+
+    print(f"{'headers':>8} " + " ".join(f"{mode + ' [MB]':>16}" for mode in args.modes))
+    for header_count in args.counts:
+        row = []
+        for mode in args.modes:
+            with tempfile.TemporaryDirectory() as work_dir:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", mode, str(header_count), work_dir],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            row.append(json.loads(output.splitlines()[-1])["peak_rss_mb"])
+        print(f"{header_count:>8} " + " ".join(f"{value:>16.1f}" for value in row))
+
+
+if __name__ == "__main__":
+    main()
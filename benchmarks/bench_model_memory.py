@@ -0,0 +1,52 @@
+# Memory of a large source model, like the one of a whole project
+#
+# Usage: python benchmarks/bench_model_memory.py [--fields 50000] [--fields-per-class 50]
+#
+# The model is built without libclang, with every string a separate object like the ones the python binding returns.
+# `built` is the model as the parser creates it, `unpickled` the same model loaded from the model cache.
+
+import argparse
+import pickle
+import time
+import tracemalloc
+
+import synthetic
+
+
+def measure(build_fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    source_model = build_fn()
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return source_model, current, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fields", type=int, default=50000)
+    parser.add_argument("--fields-per-class", type=int, default=50)
+    args = parser.parse_args()
+
+    source_model, current, peak, elapsed = measure(
+        lambda: synthetic.synthetic_model(args.fields, args.fields_per_class)
+    )
+    pickled = pickle.dumps(source_model, protocol=pickle.HIGHEST_PROTOCOL)
+    _, unpickled_current, unpickled_peak, unpickled_elapsed = measure(lambda: pickle.loads(pickled))
+
+    field_count = sum(len(class_type.fields) for class_type in source_model.class_types)
+    print(f"{'':>10} {'size [MB]':>10} {'peak [MB]':>10} {'B/field':>8} {'time [ms]':>10}")
+    for name, size, peak_size, seconds in [
+        ("built", current, peak, elapsed),
+        ("unpickled", unpickled_current, unpickled_peak, unpickled_elapsed),
+    ]:
+        print(
+            f"{name:>10} {size / 2**20:>10.1f} {peak_size / 2**20:>10.1f} {size / field_count:>8.0f}"
+            f" {seconds * 1000:>10.1f}"
+        )
+    print(f"{field_count} fields, {len(source_model.class_types)} classes, pickled {len(pickled) / 2**20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# Stage timings of the parse -> model -> render pipeline on synthetic headers
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_pipeline.py [--scenarios small large] [--output results.json]
+#                                                           [--baseline previous.json --tolerance 0.25]
+#
+# Every scenario runs in a fresh interpreter, so its peak RSS is its own. The stages are timed separately:
+#   parse     create_translation_units (libclang)
+#   scan      collect_source_model, the single walk collecting the annotations and the classes
+#   filter    filter_source_model for the template
+#   render    write_template with the template of the example
+#   export    export_json
+# The best of `--repeat` runs is reported. With `--baseline`, stages slower than the baseline by more than the
+# tolerance are listed and the exit code is 1.
+
+from typing import Any, Dict, List
+import argparse
+import json
+import pathlib
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    # Headers of the example project, with the STL and nlohmann/json included
+    "small": dict(headers=4, class_count=4, field_count=8, namespace_depth=2, annotated_field_count=None, heavy=True),
+    # Many fields, half of them annotated, no heavy includes so the model dominates
+    "wide": dict(headers=4, class_count=8, field_count=128, namespace_depth=2, annotated_field_count=64, heavy=False),
+    # Many classes in deeply nested namespaces
+    "large": dict(
+        headers=8, class_count=64, field_count=16, namespace_depth=8, annotated_field_count=None, heavy=False
+    ),
+}
+
+STAGES = ["parse", "scan", "filter", "render", "export"]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _clang_version() -> str:
+    from clang.cindex import _CXString, conf
+
+    get_version = conf.lib.clang_getClangVersion
+    get_version.restype = _CXString
+    get_version.errcheck = _CXString.from_result
+    return get_version()
+
+
+def run_scenario(scenario: Dict[str, Any], repeat: int, work_dir: pathlib.Path) -> Dict[str, Any]:
+    synthetic.set_clang_library_path()
+
+    from gk.source_index import config, main, parse_source, templating_tools
+
+    template_config = config.load_app_config(synthetic.EXAMPLE_CONFIG).templates[0]
+    j2_env = templating_tools.build_jinja_environment(synthetic.EXAMPLE_CONFIG.parent)
+    header_files = synthetic.write_synthetic_tree(
+        work_dir / "src",
+        scenario["headers"],
+        class_count=scenario["class_count"],
+        field_count=scenario["field_count"],
+        namespace_depth=scenario["namespace_depth"],
+        annotated_field_count=scenario["annotated_field_count"],
+        includes=synthetic.HEAVY_INCLUDES if scenario["heavy"] else [],
+    )
+    target_dir = work_dir / "out"
+
+    scope_fn = parse_source.build_scope_filter(**template_config.to_dict())
+    parsing_filter = parse_source.build_filter(**template_config.to_dict())
+    annotation_names = set(template_config.filter_annotations)
+
+    timings = {stage: float("inf") for stage in STAGES}
+    peak_rss = {}
+
+    def timed(stage: str, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[stage] = min(timings[stage], time.perf_counter() - start)
+        peak_rss[stage] = _peak_rss_mb()
+        return result
+
+    for _ in range(repeat):
+        # Every cursor enumerated by the walk, including the ones pruned without calling the scope filter
+        statistics = parse_source.TraversalStatistics()
+        # Files with the same content are not written again, which would not be measured otherwise
+        for output_file in target_dir.glob("*"):
+            output_file.unlink()
+
+        translation_units = timed(
+            "parse", lambda: dict(main.create_translation_units([str(header_file) for header_file in header_files]))
+        )
+        unfiltered_models = timed(
+            "scan",
+            # The translation units are deleted at the end of the run, they are passed in
+            lambda translation_units=translation_units: {
+                header_file: parse_source.collect_source_model(translation_unit, scope_fn, annotation_names, statistics)
+                for header_file, translation_unit in translation_units.items()
+            },
+        )
+        source_models = timed(
+            "filter",
+            lambda: {
+                header_file: parse_source.filter_source_model(source_model, parsing_filter)
+                for header_file, source_model in unfiltered_models.items()
+            },
+        )
+        timed(
+            "render",
+            lambda: [
+                main.write_template(
+                    j2_env,
+                    template_config,
+                    header_file,
+                    source_model,
+                    main.output_file_path(target_dir, template_config, header_file, False),
+                )
+                for header_file, source_model in source_models.items()
+            ],
+        )
+        timed(
+            "export",
+            lambda: [
+                main.export_json(source_model, main.output_file_path(target_dir, template_config, header_file, True))
+                for header_file, source_model in source_models.items()
+            ],
+        )
+        del translation_units
+
+    return {
+        "scenario": scenario,
+        "stages": {
+            stage: {"wall_ms": timings[stage] * 1000, "peak_rss_mb": peak_rss[stage]} for stage in STAGES
+        },
+        "cursors": statistics.cursors,
+        "classes": sum(len(source_model.class_types) for source_model in source_models.values()),
+        "fields": sum(
+            len(class_type.fields) for source_model in source_models.values() for class_type in source_model.class_types
+        ),
+        "peak_rss_mb": _peak_rss_mb(),
+        "clang_version": _clang_version(),
+    }
+
+
+def find_regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results["scenarios"].items():
+        baseline_result = baseline["scenarios"].get(name)
+        if baseline_result is None or baseline_result["scenario"] != result["scenario"]:
+            continue
+        for stage in STAGES:
+            wall_ms = result["stages"][stage]["wall_ms"]
+            baseline_wall_ms = baseline_result["stages"][stage]["wall_ms"]
+            if wall_ms > baseline_wall_ms * (1 + tolerance):
+                regressions.append(f"{name}/{stage}: {baseline_wall_ms:.1f} ms -> {wall_ms:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS.keys()), default=list(SCENARIOS.keys()))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=str, default="benchmark-results.json")
+    parser.add_argument("--baseline", type=str, default=None, help="Results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline")
+    parser.add_argument("--child", nargs=3, metavar=("SCENARIO", "REPEAT", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        name, repeat, work_dir = args.child
+        print(json.dumps(run_scenario(SCENARIOS[name], int(repeat), pathlib.Path(work_dir))))
+        return
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "scenarios": {},
+    }
+
+    header = " ".join(f"{stage + ' [ms]':>12}" for stage in STAGES)
+    print(f"{'scenario':>10} {header} {'cursors':>9} {'RSS [MB]':>9}")
+    for name in args.scenarios:
+        with tempfile.TemporaryDirectory() as work_dir:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", name, str(args.repeat), work_dir],
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+        result = json.loads(output.stdout.splitlines()[-1])
+        results["scenarios"][name] = result
+        print(
+            f"{name:>10} "
+            + " ".join(f"{result['stages'][stage]['wall_ms']:>12.1f}" for stage in STAGES)
+            + f" {result['cursors']:>9} {result['peak_rss_mb']:>9.1f}"
+        )
+
+    pathlib.Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = find_regressions(results, json.loads(pathlib.Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
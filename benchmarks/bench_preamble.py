@@ -0,0 +1,67 @@
+# Per header parse time with and without the shared precompiled preamble
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_preamble.py [--headers 8] [--repeat 3]
+#
+# Parses the header of the example/ tree, and synthetic headers including the heavy includes of the example
+# (`<string>`, `<vector>` and nlohmann/json.hpp), which are the precompiled includes.
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+EXAMPLE_HEADER = synthetic.EXAMPLE_INCLUDE_DIR / "example" / "example.hpp"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import config, parse_worker, preamble
+
+    template_configs = config.load_app_config(synthetic.EXAMPLE_CONFIG).templates
+    clang_index_parser = clang_index.Index.create()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        header_files = [EXAMPLE_HEADER] + synthetic.write_synthetic_tree(pathlib.Path(work_dir), args.headers)
+
+        start = time.perf_counter()
+        precompiled_preamble = preamble.build_preamble(
+            clang_index_parser, synthetic.HEAVY_INCLUDES, pathlib.Path(work_dir)
+        )
+        print(f"Precompiling the preamble: {(time.perf_counter() - start) * 1000:.1f} ms")
+        if precompiled_preamble is None:
+            return
+
+        print(f"{'header':>12} {'without [ms]':>13} {'with [ms]':>10} {'same model':>11}")
+        totals = [0.0, 0.0]
+        for header_file in header_files:
+            elapsed = []
+            results = []
+            for header_preamble in [None, precompiled_preamble]:
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    result = parse_worker.parse_header(
+                        clang_index_parser, header_file, template_configs, header_preamble
+                    )
+                    best = min(best, time.perf_counter() - start)
+                elapsed.append(best)
+                results.append(result)
+
+            totals = [total + e for total, e in zip(totals, elapsed)]
+            same_model = results[0].source_models == results[1].source_models
+            print(f"{header_file.name:>12} {elapsed[0] * 1000:>13.1f} {elapsed[1] * 1000:>10.1f} {str(same_model):>11}")
+
+        print(f"{'total':>12} {totals[0] * 1000:>13.1f} {totals[1] * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Parse time of synthetic headers including the standard library, against the real headers and the stubs
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_stubs.py [--headers 8] [--repeat 3]
+#
+# The field types of the models are compared, and the errors of the translation units counted: libclang without its
+# resource directory does not find `stddef.h`, and the types depending on it come out as `int`.
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+INCLUDES = ["<string>", "<vector>", "<map>", "<memory>", "<unordered_map>"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headers", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import compile_flags, parse_source, parse_worker
+
+    variants = {
+        "real": parse_worker.CLANG_ARGS,
+        "stubs": parse_worker.CLANG_ARGS + compile_flags.stub_arguments([]),
+    }
+    clang_index_parser = clang_index.Index.create()
+    scope_fn = parse_source.build_scope_filter()
+    field_types = {}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        header_files = synthetic.write_synthetic_tree(pathlib.Path(work_dir), args.headers, includes=INCLUDES)
+        for header_file in header_files:
+            header_file.write_text(
+                header_file.read_text().replace("int f0;", "std::map<std::string, std::vector<int>> f0;")
+            )
+
+        print(f"{'variant':>8} {'parse [ms]':>12} {'errors':>8}")
+        for name, clang_args in variants.items():
+            elapsed = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                translation_units = [
+                    parse_worker.create_translation_unit(clang_index_parser, header_file, clang_args=clang_args)
+                    for header_file in header_files
+                ]
+                elapsed = min(elapsed, time.perf_counter() - start)
+            errors = sum(
+                diagnostic.severity >= clang_index.Diagnostic.Error
+                for translation_unit in translation_units
+                for diagnostic in translation_unit.diagnostics
+            )
+            field_types[name] = [
+                field.type
+                for translation_unit in translation_units
+                for class_type in parse_source.collect_source_model(
+                    translation_unit, scope_fn, {"SERIALIZABLE", "FIELD"}
+                ).class_types
+                for field in class_type.fields
+            ]
+            print(f"{name:>8} {elapsed * 1000:>12.1f} {errors:>8}")
+
+    differences = {
+        (real_type, stub_type)
+        for real_type, stub_type in zip(field_types["real"], field_types["stubs"])
+        if real_type != stub_type
+    }
+    for real_type, stub_type in sorted(differences):
+        print(f"Field type {real_type!r} with the real headers, {stub_type!r} with the stubs")
+
+
+if __name__ == "__main__":
+    main()
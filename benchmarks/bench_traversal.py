@@ -0,0 +1,66 @@
+# Cursor visits and wall time of parse_source_model with and without the main file scope
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_traversal.py [--headers 4] [--repeat 3]
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headers", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import parse_source, parse_worker
+
+    scopes = {
+        "all files": {"traverse_included_files": True},
+        "main file": {},
+    }
+    annotation_names = ["SERIALIZABLE", "FIELD"]
+    parsing_filter = parse_source.build_filter(filter_annotations=annotation_names)
+    clang_index_parser = clang_index.Index.create()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        header_files = synthetic.write_synthetic_tree(pathlib.Path(work_dir), args.headers)
+        translation_units = [
+            parse_worker.create_translation_unit(clang_index_parser, header_file) for header_file in header_files
+        ]
+
+        print(f"{'scope':>10} {'visited cursors':>16} {'time [ms]':>10} {'classes':>8}")
+        for scope_name, scope_config in scopes.items():
+            scope_fn = parse_source.build_scope_filter(**scope_config)
+            visited = 0
+
+            def counting_scope_fn(cursor) -> bool:
+                nonlocal visited
+                in_scope = scope_fn(cursor)
+                visited += in_scope
+                return in_scope
+
+            elapsed = float("inf")
+            for _ in range(args.repeat):
+                visited = 0
+                start = time.perf_counter()
+                source_models = [
+                    parse_source.parse_source_model(
+                        translation_unit, parsing_filter, counting_scope_fn, annotation_names
+                    )
+                    for translation_unit in translation_units
+                ]
+                elapsed = min(elapsed, time.perf_counter() - start)
+                class_count = sum(len(source_model.class_types) for source_model in source_models)
+
+            print(f"{scope_name:>10} {visited:>16} {elapsed * 1000:>10.1f} {class_count:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Per header parsing against unity translation units on a synthetic tree of headers including the STL and json.hpp
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_unity.py [--headers 500] [--jobs 1] [--modes per-header unity]
+#
+# Every mode runs in a fresh interpreter, so its peak RSS is its own. The models and the dependencies of both modes are
+# checked to be the same.
+
+import argparse
+import json
+import pathlib
+import pickle
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic
+
+MODES = ["per-header", "unity"]
+
+
+def run_mode(mode: str, header_count: int, jobs: int, work_dir: pathlib.Path) -> dict:
+    synthetic.set_clang_library_path()
+
+    from gk.source_index import config, parse_worker
+
+    template_configs = config.load_app_config(synthetic.EXAMPLE_CONFIG).templates
+    header_files = sorted((work_dir / "src").glob("header_*.hpp"))[:header_count]
+
+    start = time.perf_counter()
+    if mode == "unity":
+        results = list(parse_worker.parse_headers_unity(header_files, template_configs, jobs))
+    elif jobs == 1:
+        results = list(parse_worker.parse_headers(header_files, template_configs))
+    else:
+        results = list(parse_worker.parse_headers_parallel(header_files, template_configs, jobs))
+    elapsed = time.perf_counter() - start
+
+    errors = [result.error for result in results if result.error is not None]
+    (work_dir / f"{mode}.pickle").write_bytes(
+        pickle.dumps([(result.source_models, result.dependencies) for result in results])
+    )
+    return {
+        "wall_s": elapsed,
+        "errors": len(errors),
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--headers", type=int, default=500)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--child", nargs=4, metavar=("MODE", "HEADERS", "JOBS", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, header_count, jobs, work_dir = args.child
+        print(json.dumps(run_mode(mode, int(header_count), int(jobs), pathlib.Path(work_dir))))
+        return
+
+    print(f"{'mode':>12} {'headers':>8} {'wall [s]':>9} {'per header [ms]':>16} {'RSS [MB]':>9} {'errors':>7}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        synthetic.write_synthetic_tree(pathlib.Path(work_dir) / "src", args.headers)
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode, str(args.headers), str(args.jobs), work_dir],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(
+                f"{mode:>12} {args.headers:>8} {result['wall_s']:>9.2f} {result['wall_s'] * 1000 / args.headers:>16.1f}"
+                f" {result['peak_rss_mb']:>9.1f} {result['errors']:>7}"
+            )
+
+        if len(args.modes) == 2:
+            models = [pickle.loads((pathlib.Path(work_dir) / f"{mode}.pickle").read_bytes()) for mode in args.modes]
+            print("Same models and dependencies" if models[0] == models[1] else "The models are different")
+
+
+if __name__ == "__main__":
+    main()
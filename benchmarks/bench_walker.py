@@ -0,0 +1,80 @@
+# Per cursor cost of the model traversal on a deeply nested synthetic header
+#
+# Usage: CLANG_PATH=... python benchmarks/bench_walker.py [--depth 200] [--classes 4] [--fields 8] [--repeat 5]
+#
+#   scan       collect_source_model
+#   walk       collect_source_model reading no annotations, the cost of the traversal itself
+#   recursive  `walk` with the cursors walked by recursion instead of the explicit stack, its baseline
+# Every namespace level holds annotated classes with a nested class. clang limits the nesting of braces to 256 by
+# default, which bounds the depth.
+
+import argparse
+import pathlib
+import tempfile
+import time
+
+import synthetic
+
+
+def recursive_walk_cursors(cursor, visit_fn, context):
+    """walk_cursors by recursion like the traversal it replaced, one Python frame per nesting level"""
+    for child in cursor.get_children():
+        child_context = visit_fn(child, context)
+        if child_context is not None:
+            recursive_walk_cursors(child, visit_fn, child_context)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--depth", type=int, default=200)
+    parser.add_argument("--classes", type=int, default=4, help="Classes per namespace level")
+    parser.add_argument("--fields", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    synthetic.set_clang_library_path()
+
+    import clang.cindex as clang_index
+    from gk.source_index import parse_source, parse_worker
+
+    scope_fn = parse_source.build_scope_filter()
+    annotation_names = {"SERIALIZABLE", "FIELD"}
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = pathlib.Path(work_dir)
+        (work_dir / "annotations.hpp").write_text(synthetic.ANNOTATIONS_HEADER)
+        header_file = work_dir / "nested.hpp"
+        header_file.write_text(synthetic.nested_synthetic_header(args.depth, args.classes, args.fields))
+        translation_unit = parse_worker.create_translation_unit(clang_index.Index.create(), header_file)
+
+        def best_time(annotation_names):
+            best, statistics, source_model = float("inf"), None, None
+            for _ in range(args.repeat):
+                statistics = parse_source.TraversalStatistics()
+                start = time.perf_counter()
+                source_model = parse_source.collect_source_model(
+                    translation_unit, scope_fn, annotation_names, statistics
+                )
+                best = min(best, time.perf_counter() - start)
+            return best, statistics, source_model
+
+        scan_time, statistics, source_model = best_time(annotation_names)
+        walk_time, _, _ = best_time(set())
+        iterative_walk_cursors = parse_source.walk_cursors
+        parse_source.walk_cursors = recursive_walk_cursors
+        try:
+            recursive_time, recursive_statistics, _ = best_time(set())
+        finally:
+            parse_source.walk_cursors = iterative_walk_cursors
+        assert recursive_statistics.cursors == statistics.cursors, "The walks enumerate different cursors"
+
+    field_count = sum(len(class_type.fields) for class_type in source_model.class_types)
+    print(f"{len(source_model.class_types)} classes, {field_count} fields, {statistics.cursors} enumerated cursors")
+    for stage, stage_time in [("scan", scan_time), ("walk", walk_time), ("recursive", recursive_time)]:
+        print(f"{stage:<9} {stage_time * 1000:>8.1f} ms {stage_time * 1e6 / statistics.cursors:>8.2f} us per cursor")
+    overhead = (walk_time - recursive_time) * 1e6 / statistics.cursors
+    print(f"Explicit stack against recursion: {overhead:+.2f} us per cursor ({walk_time / recursive_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
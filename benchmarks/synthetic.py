@@ -0,0 +1,136 @@
+# Synthetic source trees for the benchmarks
+
+from typing import List, Optional
+import os
+import pathlib
+
+import clang.cindex as clang_index
+
+from gk.source_index.model import (
+    AccessSpecifier,
+    AnnotationDescriptor,
+    ClassTypeDescriptor,
+    FieldTypeDescriptor,
+    SourceModel,
+)
+
+REPO_DIR = pathlib.Path(__file__).absolute().parent.parent
+EXAMPLE_INCLUDE_DIR = REPO_DIR / "example" / "include"
+EXAMPLE_CONFIG = REPO_DIR / "example" / "src" / "example-config.yaml"
+
+ANNOTATIONS_HEADER = """#pragma once
+#define SERIALIZABLE(type)
+#define FIELD(type)
+"""
+
+# Absolute path, so the benchmarks do not depend on include directories being forwarded to clang
+HEAVY_INCLUDES = ["<string>", "<vector>", f'"{(EXAMPLE_INCLUDE_DIR / "nlohmann" / "json.hpp").as_posix()}"']
+
+
+def set_clang_library_path():
+    clang_path = os.getenv("CLANG_PATH")
+    if clang_path is not None and not clang_index.Config.loaded:
+        clang_index.Config.set_library_path(clang_path)
+
+
+def synthetic_header(
+    name: str,
+    class_count: int = 4,
+    field_count: int = 8,
+    namespace_depth: int = 2,
+    annotated: bool = True,
+    includes: List[str] = HEAVY_INCLUDES,
+    annotated_field_count: Optional[int] = None,
+    method_count: int = 0,
+    annotated_class_count: Optional[int] = None,
+) -> str:
+    # The first `annotated_class_count` classes are annotated (all of them if None), and the first
+    # `annotated_field_count` fields of these (all of them if None)
+    lines = ["#pragma once", '#include "annotations.hpp"']
+    lines += [f"#include {include}" for include in includes]
+
+    namespaces = [f"{name}_ns{depth}" for depth in range(namespace_depth)]
+    lines += [f"namespace {namespace} {{" for namespace in namespaces]
+    for class_index in range(class_count):
+        lines.append(f"struct {name}_C{class_index} {{")
+        lines += [f"    int f{field_index};" for field_index in range(field_count)]
+        lines += [f"    int m{method_index}(int a, const char* b) const;" for method_index in range(method_count)]
+        lines.append("};")
+    lines += ["}" for _ in namespaces]
+
+    if annotated:
+        qualifier = "::".join(namespaces)
+        for class_index in range(class_count if annotated_class_count is None else annotated_class_count):
+            class_name = f"{qualifier}::{name}_C{class_index}"
+            lines.append(f"SERIALIZABLE({class_name})")
+            annotated_fields = range(
+                field_count if annotated_field_count is None else min(annotated_field_count, field_count)
+            )
+            lines += [f"FIELD({class_name}::f{field_index})" for field_index in annotated_fields]
+
+    return "\n".join(lines) + "\n"
+
+
+def nested_synthetic_header(depth: int = 200, class_count: int = 4, field_count: int = 8) -> str:
+    # Annotated classes with a nested class on every level of `depth` nested namespaces
+    lines = ["#pragma once", '#include "annotations.hpp"']
+    qualifier = ""
+    annotations = []
+    for level in range(depth):
+        lines.append(f"namespace n{level} {{")
+        qualifier += f"::n{level}"
+        for class_index in range(class_count):
+            lines.append(f"struct C{class_index} {{")
+            lines += [f"    int f{field_index};" for field_index in range(field_count)]
+            lines.append("    struct Nested { int a; };")
+            lines.append("};")
+            annotations.append(f"SERIALIZABLE({qualifier}::C{class_index})")
+            annotations += [f"FIELD({qualifier}::C{class_index}::f{field_index})" for field_index in range(field_count)]
+    lines += ["}" for _ in range(depth)]
+    return "\n".join(lines + annotations) + "\n"
+
+
+def write_synthetic_tree(target_dir: pathlib.Path, header_count: int, **kwargs) -> List[pathlib.Path]:
+    target_dir.mkdir(parents=True, exist_ok=True)
+    (target_dir / "annotations.hpp").write_text(ANNOTATIONS_HEADER)
+
+    header_files = []
+    for header_index in range(header_count):
+        header_file = target_dir / f"header_{header_index}.hpp"
+        header_file.write_text(synthetic_header(f"h{header_index}", **kwargs))
+        header_files.append(header_file)
+    return header_files
+
+
+FIELD_TYPES = ["int", "float", "std::string", "std::vector<int>", "std::map<std::string, int>"]
+
+
+def _copy(value: str) -> str:
+    # A new string object with the same value
+    return "".join(list(value))
+
+
+def synthetic_model(field_count: int = 50000, fields_per_class: int = 50, namespace_count: int = 16) -> SourceModel:
+    # Every string is a separate object, like the ones the python binding returns
+    class_types = []
+    for class_index in range(field_count // fields_per_class):
+        namespace = f"::project::module{class_index % namespace_count}"
+        class_name = f"Class{class_index}"
+        class_types.append(
+            ClassTypeDescriptor(
+                name=class_name,
+                namespace=_copy(namespace),
+                access_specifier=AccessSpecifier.PUBLIC,
+                annotations=[AnnotationDescriptor(name=_copy("SERIALIZABLE"), arguments=[])],
+                fields=[
+                    FieldTypeDescriptor(
+                        name=f"field{field_index}",
+                        access_specifier=AccessSpecifier.PUBLIC,
+                        annotations=[AnnotationDescriptor(name=_copy("FIELD"), arguments=[_copy("json")])],
+                        type=_copy(FIELD_TYPES[field_index % len(FIELD_TYPES)]),
+                    )
+                    for field_index in range(fields_per_class)
+                ],
+            )
+        )
+    return SourceModel(class_types=class_types, function_types=[])
@@ -230,8 +230,15 @@ endfunction(_add_execute_script_target)
 # OUT_DIR where collected translations are collected
 # SOURCES sources to be scanned
 # INPUT_DIR directory where sources are
+# CACHE_DIR directory of the persistent model cache (${CMAKE_BINARY_DIR}/generate-code-cache by default)
+# INCLUDE_DIRS include directories, forwarded to clang
+# DEFINITIONS macro definitions, NAME or NAME=VALUE
+# COMPILE_COMMANDS compile_commands.json or its directory (CMAKE_EXPORT_COMPILE_COMMANDS), headers are parsed with the
+#   flags of their source files
+# OUTPUT_FILES name of a variable which receives the list of the generated files
 #
 # Allows run custom code generation using prototypes
+# The generator runs only if a source, one of its includes, the config or a template changed
 # ---
 function(add_code_generation_target)
 	if(NOT _PYTHON_CLANG_BINDING_OK)
@@ -241,8 +248,8 @@ function(add_code_generation_target)
 	cmake_parse_arguments(
 		ARGS # prefix
 		"" # flags
-		"TARGET;OUT_DIR;CONFIG_FILE" # single-values
-		"SOURCES;INCLUDE_DIRS" # lists
+		"TARGET;OUT_DIR;CONFIG_FILE;CACHE_DIR;OUTPUT_FILES;COMPILE_COMMANDS" # single-values
+		"SOURCES;INCLUDE_DIRS;DEFINITIONS" # lists
 		${ARGN}
 	)
 
@@ -258,27 +265,96 @@ function(add_code_generation_target)
 	# set(GEN_TARGET "${ARGS_TARGET}_generate")
 	set(GEN_TARGET "${ARGS_TARGET}")
 
-	if(NOT TARGET ${GEN_TARGET})
-		add_custom_target(${GEN_TARGET})
-	endif()
-
 	set(_include_dirs)
 
 	if(ARGS_INCLUDE_DIRS)
 		set(_include_dirs "-I" ${ARGS_INCLUDE_DIRS})
 	endif(ARGS_INCLUDE_DIRS)
 
-	_add_execute_script_target(
-		TARGET ${GEN_TARGET} PRE_BUILD
-		SCRIPT ${_GENERATE_CODE_PATH}
-		OPTIONS
+	set(_clang_flags)
+
+	if(ARGS_DEFINITIONS)
+		list(APPEND _clang_flags "--define" ${ARGS_DEFINITIONS})
+	endif(ARGS_DEFINITIONS)
+
+	if(ARGS_COMPILE_COMMANDS)
+		list(APPEND _clang_flags "--compile-commands" ${ARGS_COMPILE_COMMANDS})
+	endif(ARGS_COMPILE_COMMANDS)
+
+	if(ARGS_CACHE_DIR)
+		set(_cache_dir ${ARGS_CACHE_DIR})
+	else()
+		set(_cache_dir ${CMAKE_BINARY_DIR}/generate-code-cache)
+	endif()
+
+	set(_options
 		"--config" ${ARGS_CONFIG_FILE}
 		${_include_dirs}
-		"--clang-path" ${CLANG_PATH}
 		"--input" ${ARGS_SOURCES}
 		"--dir" ${ARGS_OUT_DIR}
 	)
 
-	# TODO: return the generated file list
-	# TODO: Run generation if any of the input files changed - in config time (?)
+	# Names of the generated files only depend on the config and the sources, nothing gets parsed here
+	execute_process(
+		COMMAND ${_GENERATE_CODE_PATH} ${_options} "--list-outputs"
+		WORKING_DIRECTORY ${CMAKE_CURRENT_BINARY_DIR}
+		RESULT_VARIABLE _error_code
+		OUTPUT_VARIABLE _outputs
+	)
+	if(NOT _error_code MATCHES "0")
+		message(FATAL_ERROR "Could not list the generated files.\n Exit code: ${_error_code}")
+	endif()
+	string(REGEX REPLACE "\n$" "" _outputs "${_outputs}")
+	string(REPLACE "\n" ";" _outputs "${_outputs}")
+
+	# The list goes stale once the config changes, or a header gains or loses its annotations if unannotated headers
+	# are skipped; CMake configures again then
+	execute_process(
+		COMMAND ${_GENERATE_CODE_PATH} ${_options} "--list-outputs-dependencies"
+		WORKING_DIRECTORY ${CMAKE_CURRENT_BINARY_DIR}
+		RESULT_VARIABLE _error_code
+		OUTPUT_VARIABLE _outputs_dependencies
+	)
+	if(NOT _error_code MATCHES "0")
+		message(FATAL_ERROR "Could not list the dependencies of the generated files.\n Exit code: ${_error_code}")
+	endif()
+	string(REGEX REPLACE "\n$" "" _outputs_dependencies "${_outputs_dependencies}")
+	string(REPLACE "\n" ";" _outputs_dependencies "${_outputs_dependencies}")
+	set_property(DIRECTORY APPEND PROPERTY CMAKE_CONFIGURE_DEPENDS ${_outputs_dependencies})
+
+	# Unchanged files are not rewritten, the stamp tells the build tool that the generator has run
+	set(_stamp ${CMAKE_CURRENT_BINARY_DIR}/${GEN_TARGET}_generate_code.stamp)
+	set(_depfile ${CMAKE_CURRENT_BINARY_DIR}/${GEN_TARGET}_generate_code.d)
+
+	set(_depfile_options)
+	if(CMAKE_GENERATOR MATCHES "Ninja" OR CMAKE_VERSION VERSION_GREATER_EQUAL 3.21)
+		set(_depfile_options DEPFILE ${_depfile})
+	endif()
+
+	add_custom_command(
+		OUTPUT ${_stamp}
+		BYPRODUCTS ${_outputs}
+		COMMAND ${_GENERATE_CODE_PATH} ${_options}
+			${_clang_flags}
+			"--clang-path" ${CLANG_PATH}
+			"--cache-dir" ${_cache_dir}
+			"--depfile" ${_depfile}
+			"--depfile-target" ${_stamp}
+		COMMAND ${CMAKE_COMMAND} -E touch ${_stamp}
+		DEPENDS ${ARGS_SOURCES} ${ARGS_CONFIG_FILE}
+		${_depfile_options}
+		COMMAND_EXPAND_LISTS
+		WORKING_DIRECTORY ${CMAKE_CURRENT_BINARY_DIR}
+		COMMENT "Generating code from ${ARGS_CONFIG_FILE}"
+	)
+
+	if(TARGET ${GEN_TARGET})
+		target_sources(${GEN_TARGET} PRIVATE ${_stamp})
+	else()
+		add_custom_target(${GEN_TARGET} DEPENDS ${_stamp})
+	endif()
+
+	if(ARGS_OUTPUT_FILES)
+		set(${ARGS_OUTPUT_FILES} ${_outputs} PARENT_SCOPE)
+	endif()
 endfunction(add_code_generation_target)
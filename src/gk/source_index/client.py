@@ -0,0 +1,92 @@
+# Thin client of the generate-code daemon (generate-code --serve)
+#
+# Imports nothing but the standard library, so it starts in a few milliseconds. If no daemon is listening on the
+# socket, or the platform has no Unix sockets, the request runs in process like generate-code would.
+
+from typing import Dict, List
+import argparse
+import json
+import os
+import socket
+import sys
+
+SOCKET_ENV = "GENERATE_CODE_SOCKET"
+
+
+def build_argparser() -> argparse.ArgumentParser:
+    # Every other argument is forwarded to generate-code
+    args = argparse.ArgumentParser(
+        description="Sends a generate-code request to the daemon started with generate-code --serve",
+        allow_abbrev=False,
+    )
+
+    args.add_argument(
+        "--socket",
+        dest="socket_path",
+        type=str,
+        required=False,
+        default=os.getenv(SOCKET_ENV),
+        help=f"Unix socket of the daemon (default: ${SOCKET_ENV})",
+    )
+
+    args.add_argument(
+        "--shutdown",
+        dest="is_shutdown",
+        default=False,
+        action="store_true",
+        help="Stops the daemon",
+    )
+
+    return args
+
+
+def send_request(socket_path: str, request: Dict) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        with connection.makefile("rb") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if "exit_code" in reply:
+                    return reply["exit_code"]
+                if "stdout" in reply:
+                    sys.stdout.write(reply["stdout"])
+                if "stderr" in reply:
+                    sys.stderr.write(reply["stderr"])
+
+    # The daemon went away in the middle of the request
+    return 1
+
+
+def run_in_process(argv: List[str]):
+    from gk.source_index import main as generator
+
+    sys.argv = ["generate-code"] + argv
+    generator.main()
+
+
+def main():
+    args, argv = build_argparser().parse_known_args()
+    argv = [arg for arg in argv if arg != "--"]
+
+    if args.socket_path is None or not hasattr(socket, "AF_UNIX"):
+        if args.is_shutdown:
+            return
+        run_in_process(argv)
+        return
+
+    request = {"shutdown": True} if args.is_shutdown else {"argv": argv, "cwd": os.getcwd()}
+    try:
+        exit_code = send_request(args.socket_path, request)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if args.is_shutdown:
+            return
+        run_in_process(argv)
+        return
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import pathlib
+import shlex
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+COMPILE_COMMANDS_NAME = "compile_commands.json"
+
+STUBS_DIR = pathlib.Path(__file__).absolute().parent / "stubs"
+
+# Flags of a compile command which change what clang sees of a header; output, dependency, optimization and warning
+# flags are dropped. The ones with a path are resolved against the directory of the command.
+_PATH_FLAGS = ("-isystem", "-iquote", "-idirafter", "-isysroot", "-include", "-I")
+_VALUE_FLAGS = ("-D", "-U", "-target")
+_JOINED_FLAGS = ("-std=", "--sysroot=", "--target=")
+_SINGLE_FLAGS = ("-nostdinc", "-nostdinc++")
+# Flags dropped together with their value, which would otherwise be taken for the ones above: a precompiled header is
+# only valid for the compiler which built it, and the arguments passed to the frontend come in pairs
+_SKIPPED_FLAGS = ("-include-pch", "-Xclang")
+
+
+def _split_flag(argument: str, flags: Tuple[str, ...]) -> Tuple[str, str]:
+    """The flag and its joined value, empty if it is the next argument"""
+    flag = next(flag for flag in flags if argument.startswith(flag))
+    return flag, argument[len(flag) :]
+
+
+def _absolute(path: str, directory: pathlib.Path) -> str:
+    return os.path.normpath(os.path.join(directory, path))
+
+
+def forwarded_arguments(arguments: List[str], directory: pathlib.Path) -> List[str]:
+    """The flags of a compile command (without the compiler) which are forwarded to libclang"""
+    forwarded = []
+    arguments_iter = iter(arguments)
+    for argument in arguments_iter:
+        if argument in _SINGLE_FLAGS or argument.startswith(_JOINED_FLAGS):
+            if argument.startswith("--sysroot="):
+                argument = "--sysroot=" + _absolute(argument[len("--sysroot=") :], directory)
+            forwarded.append(argument)
+        elif argument == "--sysroot":
+            forwarded.append("--sysroot=" + _absolute(next(arguments_iter, ""), directory))
+        elif argument in _SKIPPED_FLAGS:
+            next(arguments_iter, None)
+        elif argument.startswith(_PATH_FLAGS):
+            flag, value = _split_flag(argument, _PATH_FLAGS)
+            forwarded += [flag, _absolute(value or next(arguments_iter, ""), directory)]
+        elif argument.startswith(_VALUE_FLAGS):
+            flag, value = _split_flag(argument, _VALUE_FLAGS)
+            forwarded += [flag, value or next(arguments_iter, "")]
+    return forwarded
+
+
+def compilation_database_file(path: pathlib.Path) -> pathlib.Path:
+    """A `compile_commands.json`, or the one in a directory"""
+    return path / COMPILE_COMMANDS_NAME if path.is_dir() else path
+
+
+class CompilationDatabase:
+    """Flags of the source files of a `compile_commands.json`
+
+    Headers are rarely in the database, they get the flags of the source file next to them with the same name, or of
+    the first source file of their closest directory, like clangd does.
+    """
+
+    def __init__(self, entries: Dict[pathlib.Path, List[str]]) -> None:
+        self._entries = entries
+        self._by_stem: Dict[Tuple[pathlib.Path, str], pathlib.Path] = {}
+        self._by_directory: Dict[pathlib.Path, pathlib.Path] = {}
+        for source_file in sorted(entries.keys()):
+            self._by_stem.setdefault((source_file.parent, source_file.stem), source_file)
+            for directory in source_file.parents:
+                self._by_directory.setdefault(directory, source_file)
+
+    @classmethod
+    def load(cls, database_file: pathlib.Path) -> "CompilationDatabase":
+        LOGGER.info(f"Loading compilation database {database_file}")
+        entries = {}
+        for command in json.loads(database_file.read_text()):
+            directory = pathlib.Path(command["directory"])
+            arguments = command["arguments"] if "arguments" in command else shlex.split(command["command"])
+            source_file = pathlib.Path(_absolute(command["file"], directory))
+            # The first one wins, like with clang tools
+            entries.setdefault(source_file, forwarded_arguments(arguments[1:], directory))
+        return cls(entries)
+
+    def source_file(self, header_file: pathlib.Path) -> Optional[pathlib.Path]:
+        """The source file whose flags the header is parsed with"""
+        header_file = pathlib.Path(os.path.normpath(header_file.absolute()))
+        if header_file in self._entries:
+            return header_file
+        source_file = self._by_stem.get((header_file.parent, header_file.stem))
+        if source_file is not None:
+            return source_file
+        return next(
+            (self._by_directory[directory] for directory in header_file.parents if directory in self._by_directory),
+            None,
+        )
+
+    def arguments(self, header_file: pathlib.Path) -> List[str]:
+        source_file = self.source_file(header_file)
+        return self._entries[source_file] if source_file is not None else []
+
+
+def stub_arguments(stub_include_dirs: List[str]) -> List[str]:
+    """Replaces the standard library with declarations only, and the third party headers with the given stubs"""
+    arguments = ["-nostdinc", "-nostdinc++"]
+    for include_dir in stub_include_dirs:
+        arguments += ["-I", include_dir]
+    return arguments + ["-isystem", str(STUBS_DIR)]
+
+
+class CompileFlags:
+    """Clang arguments of the headers of a run
+
+    The arguments of the app config come first, then the ones of the compile command of the header, then the ones of
+    the command line, so the later ones win. A header is resolved once per run.
+    """
+
+    def __init__(
+        self,
+        common_args: List[str],
+        override_args: Optional[List[str]] = None,
+        compile_commands: Optional[pathlib.Path] = None,
+    ) -> None:
+        self._common_args = list(common_args)
+        self._override_args = list(override_args or [])
+        self.database_file = compilation_database_file(compile_commands) if compile_commands is not None else None
+        self._database: Optional[CompilationDatabase] = None
+        self._resolved: Dict[pathlib.Path, List[str]] = {}
+
+    @property
+    def database(self) -> Optional[CompilationDatabase]:
+        if self._database is None and self.database_file is not None:
+            self._database = CompilationDatabase.load(self.database_file)
+        return self._database
+
+    def args(self, header_file: pathlib.Path) -> List[str]:
+        args = self._resolved.get(header_file)
+        if args is None:
+            database_args = self.database.arguments(header_file) if self.database is not None else []
+            args = self._resolved[header_file] = self._common_args + database_args + self._override_args
+        return args
+
+    def resolve(self, header_files: List[pathlib.Path]) -> Dict[pathlib.Path, List[str]]:
+        return {header_file: self.args(header_file) for header_file in header_files}
+
+    def cache_key(self) -> List[str]:
+        """Everything the arguments of a header depend on, without loading the compilation database"""
+        key = self._common_args + ["--"] + self._override_args
+        if self.database_file is not None:
+            try:
+                key.append(hashlib.sha256(self.database_file.read_bytes()).hexdigest())
+            except OSError:
+                key.append("missing")
+        return key
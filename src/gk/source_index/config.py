@@ -1,24 +1,93 @@
 from typing import List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dataclasses_json import DataClassJsonMixin
+import enum
 import pathlib
 import yaml
 
 
+@dataclass
+class Extraction(DataClassJsonMixin):
+    """Parts of the models a template reads, the parser skips the rest; everything is extracted by default"""
+
+    # Only the classes with one of these annotations
+    class_annotations: Optional[List[str]] = None
+    # Only the fields with one of these annotations, none at all if empty
+    field_annotations: Optional[List[str]] = None
+    # The spelling of the field types
+    field_types: Optional[bool] = True
+
+
 @dataclass
 class TemplateConfig(DataClassJsonMixin):
     template: str
     filter_annotations: List[str]
-    filename_suffix: str
+    # Aggregate templates render to their `filename` and need neither
+    filename_suffix: Optional[str] = ""
     filename_prefix: Optional[str] = ""
     allow_public_members_only: Optional[bool] = True
+    # Declarations are collected from the parsed header only, plus from the files under these prefixes
+    allowed_path_prefixes: Optional[List[str]] = field(default_factory=list)
+    traverse_included_files: Optional[bool] = False
+    # Makes the template an aggregate one: rendered once into this file, with the merged model of every input
+    filename: Optional[str] = None
+    # Derived from the template if not set, see template_analysis
+    extraction: Optional[Extraction] = None
+
+
+class UnannotatedHeaders(enum.Enum):
+    """What becomes of the headers whose text names none of the annotation macros of the templates"""
+
+    # Rendered with an empty model, without being parsed
+    EMPTY = "empty"
+    # Not parsed, and nothing is generated for them
+    SKIP = "skip"
 
 
 @dataclass
 class AppConfig(DataClassJsonMixin):
     templates: List[TemplateConfig]
+    # Common heavy includes precompiled once per run and loaded by every header, like `<string>` or `"json.hpp"`
+    precompiled_includes: Optional[List[str]] = field(default_factory=list)
+    # Every header is parsed if not set; classes without annotations are still in the models of the parsed headers
+    unannotated_headers: Optional[UnannotatedHeaders] = None
+    # Arguments of every translation unit, like `-std=c++17` or `-DNDEBUG`
+    clang_args: Optional[List[str]] = field(default_factory=list)
+    include_directories: Optional[List[str]] = field(default_factory=list)
+    # A `compile_commands.json` or its directory, the headers are parsed with the flags of their source files
+    compile_commands: Optional[str] = None
+    # Parses against declarations of the standard library and the headers of these directories, instead of the real
+    # ones; the types are still spelled the same
+    stub_system_headers: Optional[bool] = False
+    stub_include_directories: Optional[List[str]] = field(default_factory=list)
+
+
+def _resolve_quoted_include(config_dir: pathlib.Path, include: str) -> str:
+    if not include.startswith('"'):
+        return include
+    return '"' + (config_dir / include.strip('"')).as_posix() + '"'
 
 
 def load_app_config(config_file: pathlib.Path) -> AppConfig:
     with open(config_file, "r") as f:
-        return AppConfig.schema().load(yaml.safe_load(f))
+        app_config = AppConfig.schema().load(yaml.safe_load(f))
+
+    # Relative prefixes are relative to the config file
+    for template_config in app_config.templates:
+        template_config.allowed_path_prefixes = [
+            str(config_file.parent / prefix) for prefix in template_config.allowed_path_prefixes or []
+        ]
+
+    # Quoted includes and the directories are relative to the config file as well
+    config_dir = config_file.parent.absolute()
+    app_config.precompiled_includes = [
+        _resolve_quoted_include(config_dir, include) for include in app_config.precompiled_includes or []
+    ]
+    app_config.clang_args = app_config.clang_args or []
+    app_config.include_directories = [str(config_dir / directory) for directory in app_config.include_directories or []]
+    app_config.stub_include_directories = [
+        str(config_dir / directory) for directory in app_config.stub_include_directories or []
+    ]
+    if app_config.compile_commands:
+        app_config.compile_commands = str(config_dir / app_config.compile_commands)
+    return app_config
@@ -0,0 +1,23 @@
+from typing import Dict, Iterable
+import pathlib
+
+from gk.source_index import utils
+
+
+def _escape_path(path: pathlib.Path) -> str:
+    # Make syntax, which both Ninja and Make understands
+    return path.as_posix().replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+
+def format_depfile(dependencies: Dict[pathlib.Path, Iterable[pathlib.Path]]) -> str:
+    """One rule per generated file, listing every input it was generated from"""
+    lines = []
+    for output_file, input_files in dependencies.items():
+        inputs = " \\\n  ".join(_escape_path(input_file) for input_file in input_files)
+        lines.append(f"{_escape_path(output_file)}: \\\n  {inputs}\n" if inputs else f"{_escape_path(output_file)}:\n")
+    return "".join(lines)
+
+
+def write_depfile(depfile_path: pathlib.Path, dependencies: Dict[pathlib.Path, Iterable[pathlib.Path]]):
+    # Always with `\n` line endings
+    utils.write_atomic(depfile_path, format_depfile(dependencies).encode("utf-8"))
@@ -0,0 +1,159 @@
+from typing import Any, Callable, Dict, List, Tuple
+import sys
+
+import clang.cindex as clang_index
+
+from gk.source_index.config import Extraction
+from gk.source_index.model import (
+    AnnotatedDescriptor,
+    AnnotationDescriptor,
+    ClassTypeDescriptor,
+    Descriptor,
+    FieldTypeDescriptor,
+    SourceModel,
+)
+from gk.source_index.parse_source import CollectedClass, SourceModelVisitor, find_access_specifier, has_any_annotation
+
+# Models whose classes and fields are read from the cursors the first time a template looks at them, so the ones it
+# never renders cost nothing besides the walk. The values are memoized in the slots of the eager descriptors. The
+# cursors keep their translation unit alive, a lazy model is resolved into an eager one before it is cached, sent to
+# another process or merged into the project model.
+
+
+def _memoized(slot_owner: type, slot: str, resolve_fn: Callable[[Any], Any]) -> property:
+    """The slot of the eager descriptor, filled by `resolve_fn` on first access"""
+    member = slot_owner.__dict__[slot]
+
+    def get(self):
+        try:
+            return member.__get__(self)
+        except AttributeError:
+            value = resolve_fn(self)
+            member.__set__(self, value)
+            return value
+
+    return property(get)
+
+
+class _LazyModelSource:
+    """What the descriptors of a lazy model are resolved from, shared by all of them"""
+
+    def __init__(
+        self,
+        annotation_map: Dict[str, List[AnnotationDescriptor]],
+        filter_fn: Callable[[Descriptor], bool],
+        extraction: Extraction,
+    ) -> None:
+        self.annotation_map = annotation_map
+        self.filter_fn = filter_fn
+        self.extraction = extraction
+
+    def annotations(self, full_name: str) -> Tuple[AnnotationDescriptor, ...]:
+        """All of them, the extraction selects by the unfiltered ones"""
+        return tuple(self.annotation_map.get(full_name, ()))
+
+    def filtered_annotations(self, annotations: Tuple[AnnotationDescriptor, ...]) -> Tuple[AnnotationDescriptor, ...]:
+        return tuple(annotation for annotation in annotations if self.filter_fn(annotation))
+
+
+class LazyFieldTypeDescriptor(FieldTypeDescriptor):
+    __slots__ = ("_cursor", "_source")
+
+    def __init__(
+        self,
+        cursor: clang_index.Cursor,
+        source: _LazyModelSource,
+        name: str,
+        annotations: Tuple[AnnotationDescriptor, ...],
+    ) -> None:
+        # The name and the annotations select the fields, they are known already
+        self.name = sys.intern(name)
+        self.annotations = source.filtered_annotations(annotations)
+        self._cursor = cursor
+        self._source = source
+
+    access_specifier = _memoized(
+        AnnotatedDescriptor, "access_specifier", lambda self: find_access_specifier(self._cursor.access_specifier)
+    )
+    type = _memoized(
+        FieldTypeDescriptor,
+        "type",
+        lambda self: sys.intern(self._cursor.type.spelling) if self._source.extraction.field_types else "",
+    )
+
+    def _eager_args(self) -> Tuple:
+        return (self.name, self.access_specifier, self.annotations, self.type)
+
+    def resolve(self) -> FieldTypeDescriptor:
+        return FieldTypeDescriptor(*self._eager_args())
+
+    def __reduce_ex__(self, protocol):
+        return (FieldTypeDescriptor, self._eager_args())
+
+
+class LazyClassTypeDescriptor(ClassTypeDescriptor):
+    __slots__ = ("_collected_class", "_source")
+
+    def __init__(self, collected_class: CollectedClass, source: _LazyModelSource) -> None:
+        self.name = sys.intern(collected_class.full_name.rsplit("::", 1)[1])
+        self.namespace = sys.intern(collected_class.namespace if collected_class.namespace else "::")
+        self.annotations = source.filtered_annotations(source.annotations(collected_class.full_name))
+        self._fields_by_annotation = None
+        self._collected_class = collected_class
+        self._source = source
+
+    def _resolve_fields(self) -> Tuple[FieldTypeDescriptor, ...]:
+        source = self._source
+        fields = []
+        for cursor in self._collected_class.field_cursors:
+            name = cursor.spelling
+            annotations = source.annotations(f"{self._collected_class.full_name}::{name}")
+            if not has_any_annotation(annotations, source.extraction.field_annotations):
+                continue
+            field = LazyFieldTypeDescriptor(cursor, source, name, annotations)
+            if source.filter_fn(field):
+                fields.append(field)
+        return tuple(fields)
+
+    access_specifier = _memoized(
+        AnnotatedDescriptor,
+        "access_specifier",
+        lambda self: find_access_specifier(self._collected_class.cursor.access_specifier),
+    )
+    fields = _memoized(ClassTypeDescriptor, "fields", _resolve_fields)
+
+    def _eager_args(self) -> Tuple:
+        fields = tuple(field.resolve() for field in self.fields)
+        return (self.name, self.access_specifier, self.annotations, self.namespace, fields)
+
+    def resolve(self) -> ClassTypeDescriptor:
+        return ClassTypeDescriptor(*self._eager_args())
+
+    def __reduce_ex__(self, protocol):
+        return (ClassTypeDescriptor, self._eager_args())
+
+
+def lazy_source_model(visitor: SourceModelVisitor, filter_fn: Callable[[Descriptor], bool]) -> SourceModel:
+    """The model of a template, like the unfiltered model of the visitor filtered for it, resolved on demand"""
+    source = _LazyModelSource(visitor.annotation_map, filter_fn, visitor.extraction)
+    class_types = []
+    for collected_class in visitor.classes:
+        if not has_any_annotation(source.annotations(collected_class.full_name), visitor.extraction.class_annotations):
+            continue
+        class_type = LazyClassTypeDescriptor(collected_class, source)
+        if filter_fn(class_type):
+            class_types.append(class_type)
+    return SourceModel(class_types=class_types, function_types=[])
+
+
+def resolve_source_model(source_model: SourceModel) -> SourceModel:
+    """The eager model of a lazy one, which no longer needs the translation unit"""
+    if not any(isinstance(class_type, LazyClassTypeDescriptor) for class_type in source_model.class_types):
+        return source_model
+    return SourceModel(
+        class_types=[
+            class_type.resolve() if isinstance(class_type, LazyClassTypeDescriptor) else class_type
+            for class_type in source_model.class_types
+        ],
+        function_types=source_model.function_types,
+    )
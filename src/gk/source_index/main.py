@@ -1,46 +1,34 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import argparse
+import collections
+import dataclasses
 import sys
 import os
 import pathlib
-import json
-
-import dataclasses_json
-import enum
-import uuid
 
 import logging
 
 import clang.cindex as clang_index
 
+from gk.source_index import compile_flags
 from gk.source_index import config
+from gk.source_index import depfile
+from gk.source_index import model_cache
+from gk.source_index import model_export
 from gk.source_index import parse_source
+from gk.source_index import parse_worker
+from gk.source_index import preamble
+from gk.source_index import profiling
+from gk.source_index import template_analysis
 from gk.source_index import templating_tools
+from gk.source_index import utils
+from gk.source_index.model import SourceModel
+from gk.source_index.project_model import DuplicateDefinitionError, ProjectModel
+from gk.source_index.parse_worker import CLANG_PARSE_OPTIONS
 
 
 LOGGER = logging.getLogger(__name__)
 
-CLANG_PARSE_OPTIONS = (
-    clang_index.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
-    | clang_index.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
-    | clang_index.TranslationUnit.PARSE_INCOMPLETE
-)
-
-
-# TODO -> utils
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
-
-        if issubclass(type(obj), enum.Enum):
-            return str(obj)
-
-        if issubclass(type(obj), dataclasses_json.DataClassJsonMixin):
-            return obj.to_dict()
-
-        return json.JSONEncoder.default(self, obj)
-
 
 def build_argparser() -> argparse.ArgumentParser:
     args = argparse.ArgumentParser(
@@ -52,7 +40,7 @@ def build_argparser() -> argparse.ArgumentParser:
         "-c",
         dest="config_path",
         type=str,
-        required=True,
+        required=False,
         help="App configuration file",
     )
 
@@ -80,7 +68,7 @@ def build_argparser() -> argparse.ArgumentParser:
         type=str,
         metavar="N",
         nargs="+",
-        required=True,
+        required=False,
         help="List of input files to be parsed",
     )
 
@@ -89,10 +77,60 @@ def build_argparser() -> argparse.ArgumentParser:
         "-I",
         dest="includes",
         type=str,
+        nargs="+",
+        default=[],
         required=False,
         help="Include directories",
     )
 
+    args.add_argument(
+        "--define",
+        "-D",
+        dest="defines",
+        type=str,
+        nargs="+",
+        default=[],
+        required=False,
+        help="Macro definitions, NAME or NAME=VALUE",
+    )
+
+    args.add_argument(
+        "--std",
+        dest="std",
+        type=str,
+        required=False,
+        default=None,
+        help="Language standard of the parsed headers, like c++17",
+    )
+
+    args.add_argument(
+        "--sysroot",
+        dest="sysroot",
+        type=str,
+        required=False,
+        default=None,
+        help="Root directory of the system headers",
+    )
+
+    args.add_argument(
+        "--compile-commands",
+        dest="compile_commands",
+        type=str,
+        required=False,
+        default=None,
+        help="compile_commands.json or its directory; headers are parsed with the flags of the source file next to "
+        "them (overrides the config)",
+    )
+
+    args.add_argument(
+        "--stub-system-headers",
+        dest="is_stub_system_headers",
+        default=False,
+        action="store_true",
+        help="Parses against declarations of the standard library instead of the real headers, which is enough for "
+        "the annotated declarations",
+    )
+
     args.add_argument(
         "--clang-path",
         "-C",
@@ -103,11 +141,140 @@ def build_argparser() -> argparse.ArgumentParser:
         default=None, #os.getenv("CLANG_PATH"),
     )
 
+    args.add_argument(
+        "--jobs",
+        "-j",
+        dest="jobs",
+        type=int,
+        required=False,
+        default=1,
+        help="Number of worker processes parsing the input files (0 uses every CPU)",
+    )
+
+    args.add_argument(
+        "--unity",
+        dest="is_unity",
+        default=False,
+        action="store_true",
+        help="Parses the input files in a single translation unit (one per worker), which parses their common includes "
+        "once; the input files need include guards",
+    )
+
+    args.add_argument(
+        "--lazy-models",
+        dest="is_lazy_models",
+        default=False,
+        action="store_true",
+        help="Reads the classes and fields of a header from its translation unit when the templates use them, which "
+        "skips the ones they do not render; applies to serial runs without --unity, the models stored in the cache "
+        "are still complete",
+    )
+
+    args.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Directory of the persistent cache of the models and the compiled templates (disabled if not set)",
+    )
+
+    args.add_argument(
+        "--cache-max-size",
+        dest="cache_max_size",
+        type=int,
+        required=False,
+        default=model_cache.DEFAULT_MAX_CACHE_SIZE // (1024 * 1024),
+        help="Size limit of the model cache in megabytes",
+    )
+
+    args.add_argument(
+        "--depfile",
+        dest="depfile_path",
+        type=str,
+        required=False,
+        default=None,
+        help="Writes a Makefile style depfile of the generated files",
+    )
+
+    args.add_argument(
+        "--depfile-target",
+        dest="depfile_target",
+        type=str,
+        required=False,
+        default=None,
+        help="Single target of the depfile (e.g. a stamp file) instead of a rule for every generated file",
+    )
+
+    args.add_argument(
+        "--list-outputs",
+        dest="is_list_outputs",
+        default=False,
+        action="store_true",
+        help="Prints the files which would be generated then exits, without parsing anything",
+    )
+
+    args.add_argument(
+        "--list-outputs-dependencies",
+        dest="is_list_outputs_dependencies",
+        default=False,
+        action="store_true",
+        help="Prints the files the list of --list-outputs depends on then exits, like for CMAKE_CONFIGURE_DEPENDS",
+    )
+
+    args.add_argument(
+        "--serve",
+        dest="serve_socket",
+        type=str,
+        required=False,
+        default=None,
+        help="Runs as a daemon on this Unix socket, keeping libclang, templates and models warm between requests "
+        "of generate-code-client",
+    )
+
+    args.add_argument(
+        "--watch",
+        dest="is_watch",
+        default=False,
+        action="store_true",
+        help="Keeps running and regenerates the code of the headers affected by every change of the inputs, "
+        "their includes, the config or the templates",
+    )
+
+    args.add_argument(
+        "--profile",
+        dest="is_profile",
+        default=False,
+        action="store_true",
+        help="Logs the wall and CPU time of every stage, template and the slowest headers",
+    )
+
+    args.add_argument(
+        "--profile-trace",
+        dest="profile_trace_path",
+        type=str,
+        required=False,
+        default=None,
+        help="Writes the timings as a Chrome trace (chrome://tracing, Perfetto)",
+    )
+
+    return args
+
+
+def parse_args(argv: Optional[List[str]] = None) -> Any:
+    parser = build_argparser()
+    args = parser.parse_args(argv)
+    # Only the daemon can go without these
+    if args.serve_socket is None:
+        if args.config_path is None:
+            parser.error("the following arguments are required: --config/-c")
+        if not args.input_files:
+            parser.error("the following arguments are required: --input/-i")
     return args
 
 
 def fetch_args() -> Any:
-    return build_argparser().parse_args()
+    return parse_args()
 
 # TOOD -> utils
 def find_relative_path(
@@ -122,87 +289,432 @@ def find_relative_path(
     return None
 
 
+def output_file_path(
+    target_path: pathlib.Path, template_config, header_file: Optional[pathlib.Path], is_export_json: bool
+):
+    if template_config.filename:
+        # Aggregate templates have a single output
+        target_file = target_path / template_config.filename
+    else:
+        target_file = target_path / pathlib.Path(
+            template_config.filename_prefix
+            + header_file.stem
+            + template_config.filename_suffix
+        )
+    return target_file.with_suffix(".json") if is_export_json else target_file
+
+
+def list_outputs(app_config, args) -> List[pathlib.Path]:
+    target_path = pathlib.Path(args.target_path).absolute()
+    source_files = [pathlib.Path(source_file) for source_file in args.input_files]
+    if app_config.unannotated_headers is config.UnannotatedHeaders.SKIP:
+        # Reading the headers is still a lot cheaper than parsing them
+        source_files, _ = prescan_headers(app_config, source_files)
+    return [
+        output_file_path(target_path, template_config, source_file, args.is_export_json)
+        for source_file in source_files
+        for template_config in app_config.templates
+        if not template_config.filename
+    ] + [
+        output_file_path(target_path, template_config, None, args.is_export_json)
+        for template_config in app_config.templates
+        if template_config.filename
+    ]
+
+
+def list_outputs_dependencies(app_config, args) -> List[pathlib.Path]:
+    """The files the list of the outputs depends on: the config, and the headers if the pre-scan skips some"""
+    dependencies = [pathlib.Path(args.config_path).absolute()]
+    if app_config.unannotated_headers is config.UnannotatedHeaders.SKIP:
+        dependencies += [pathlib.Path(source_file).absolute() for source_file in args.input_files]
+    return dependencies
+
+
+def create_compile_flags(app_config, args) -> compile_flags.CompileFlags:
+    common_args = list(parse_worker.CLANG_ARGS)
+    if app_config.stub_system_headers or args.is_stub_system_headers:
+        common_args += compile_flags.stub_arguments(app_config.stub_include_directories)
+    common_args += app_config.clang_args
+    for include_dir in app_config.include_directories:
+        common_args += ["-I", include_dir]
+
+    override_args = []
+    for include_dir in args.includes:
+        override_args += ["-I", str(pathlib.Path(include_dir).absolute())]
+    override_args += [f"-D{define}" for define in args.defines]
+    if args.std:
+        override_args.append(f"-std={args.std}")
+    if args.sysroot:
+        override_args.append(f"--sysroot={pathlib.Path(args.sysroot).absolute()}")
+
+    compile_commands = args.compile_commands or app_config.compile_commands
+    return compile_flags.CompileFlags(
+        common_args, override_args, pathlib.Path(compile_commands).absolute() if compile_commands else None
+    )
+
+
 def create_translation_units(
-    source_files: List[str],
+    source_files: List[str], flags: Optional[compile_flags.CompileFlags] = None
 ) -> Tuple[pathlib.Path, clang_index.TranslationUnit]:
-    # TODO: Add Includes
     clang_index_parser = clang_index.Index.create()
     for source_file in source_files:
-        source_path = pathlib.Path(source_file)
-        if source_path.exists():
-            logging.info(f"Creating translation unit for {source_path}")
-            yield source_path.absolute(), clang_index_parser.parse(
-                str(source_path),
-                args=["-std=c++11"],
-                options=CLANG_PARSE_OPTIONS,
-            )
+        source_path = pathlib.Path(source_file).absolute()
+        yield source_path, parse_worker.create_translation_unit(
+            clang_index_parser, source_path, clang_args=flags.args(source_path) if flags is not None else None
+        )
+
+
+def prescan_headers(
+    app_config, header_files: List[pathlib.Path]
+) -> Tuple[List[pathlib.Path], List[pathlib.Path]]:
+    """Splits the headers into the ones which have to be parsed and the ones without annotations"""
+    pattern = parse_worker.annotation_pattern(app_config.templates)
+    if pattern is None:
+        LOGGER.warning(
+            "Parsing every header, unannotated_headers needs annotation filters and no traversal of the included files"
+        )
+        return header_files, []
+
+    annotated_files, unannotated_files = [], []
+    for header_file in header_files:
+        if parse_worker.has_annotations(header_file, pattern):
+            annotated_files.append(header_file)
         else:
-            raise RuntimeError(f"Cannot open file {source_path}")
+            unannotated_files.append(header_file)
+    return annotated_files, unannotated_files
+
+
+def _parse_files(
+    app_config,
+    args,
+    header_files: List[pathlib.Path],
+    cache: Optional[model_cache.ModelCache],
+    preamble_cache: preamble.PreambleCache,
+    profiler: profiling.Profiler,
+) -> Iterator[parse_worker.ParseResult]:
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    with profiler.measure("flags"):
+        clang_args = create_compile_flags(app_config, args).resolve(header_files)
+
+    precompiled_preamble = None
+    if app_config.precompiled_includes:
+        # The headers with other arguments are parsed without it
+        preamble_args, _ = collections.Counter(map(tuple, clang_args.values())).most_common(1)[0]
+        with profiler.measure("preamble"):
+            precompiled_preamble = preamble_cache.get(
+                clang_index.Index.create(), app_config.precompiled_includes, list(preamble_args)
+            )
+
+    is_unity = args.is_unity and parse_worker.supports_unity(app_config.templates)
+    if args.is_unity and not is_unity:
+        LOGGER.warning("Parsing the headers one by one, --unity does not support traversing the included files")
+
+    if is_unity:
+        results = parse_worker.parse_headers_unity(
+            header_files, app_config.templates, jobs, args.clang_path, precompiled_preamble, clang_args
+        )
+    elif jobs == 1:
+        results = parse_worker.parse_headers(
+            header_files, app_config.templates, precompiled_preamble, clang_args, args.is_lazy_models
+        )
+    else:
+        if args.is_lazy_models:
+            LOGGER.warning("The models are built in the worker processes, --lazy-models applies to serial runs only")
+        LOGGER.info(f"Parsing {len(header_files)} files with {jobs} workers")
+        results = parse_worker.parse_headers_parallel(
+            header_files, app_config.templates, jobs, args.clang_path, precompiled_preamble, clang_args
+        )
+
+    for result in results:
+        yield result
+        # Once the templates of the header are rendered; the cache keeps the complete models of lazy ones, which no
+        # longer hold the translation unit
+        if cache is not None:
+            cache.store(parse_worker.resolve_models(result))
+
+
+def parse_input_files(
+    app_config,
+    args,
+    cache: Optional[model_cache.ModelCache] = None,
+    preamble_cache: Optional[preamble.PreambleCache] = None,
+    profiler: Optional[profiling.Profiler] = None,
+) -> Iterator[parse_worker.ParseResult]:
+    header_files = [pathlib.Path(source_file).absolute() for source_file in args.input_files]
+    profiler = profiler if profiler is not None else profiling.Profiler()
+
+    # Before the cache, which may hold the complete model of a header parsed without the pre-scan
+    if app_config.unannotated_headers is not None:
+        with profiler.measure("prescan") as span:
+            header_files, unannotated_files = prescan_headers(app_config, header_files)
+            span.counters["avoided_parses"] = len(unannotated_files)
+        LOGGER.info(f"Pre-scan: {len(unannotated_files)} headers without annotations are not parsed")
+        for header_file in unannotated_files:
+            yield parse_worker.unannotated_result(header_file, app_config.templates, app_config.unannotated_headers)
+
+    if cache is not None:
+        outdated_files = []
+        for header_file in header_files:
+            with profiler.measure("cache", str(header_file)):
+                result = cache.load(header_file)
+            if result is not None:
+                yield result
+            else:
+                outdated_files.append(header_file)
+        header_files = outdated_files
+
+    if not header_files:
+        return
+
+    if preamble_cache is not None:
+        yield from _parse_files(app_config, args, header_files, cache, preamble_cache, profiler)
+    else:
+        # The preamble of a single run is removed once the files are parsed
+        with preamble.PreambleCache() as run_preamble_cache:
+            yield from _parse_files(app_config, args, header_files, cache, run_preamble_cache, profiler)
 
 
 # TODO: Typing
-def write_template(j2_env, template_config, header_file, source_model, target_filename):
+def render_template(j2_env, template_config, header_file, source_model, header_files=None) -> str:
+    """Aggregate templates get no `header`, but the `headers` of every input"""
     template = j2_env.get_template(str(template_config.template))
     LOGGER.info(f"Generating code from {template_config.template}")
-    with target_filename.open("w") as f:
-        result = template.render(
-            header=str(header_file),
-            model=source_model,
-        )
-        f.write(result)
+    return template.render(
+        header=str(header_file) if header_file is not None else None,
+        headers=[str(header) for header in header_files] if header_files is not None else [str(header_file)],
+        model=source_model,
+    )
+
+
+def write_output(target_filename: pathlib.Path, content: str, output_statistics=None):
+    if not utils.write_if_changed(target_filename, content, output_statistics):
+        LOGGER.info(f"{target_filename} is up to date")
+
+
+# TODO: Typing
+def write_template(j2_env, template_config, header_file, source_model, target_filename, output_statistics=None):
+    content = render_template(j2_env, template_config, header_file, source_model)
+    write_output(target_filename, content, output_statistics)
 
 
 # TODO: Typing
-def export_json(source_model, target_filename):
+def export_json(source_model, target_filename, output_statistics=None):
     target_json = target_filename.with_suffix(".json")
-    with target_json.open("w") as f:
-        LOGGER.info(f"Exporting model to {target_json}")
-        json.dump(source_model, f, cls=CustomJSONEncoder)
+    LOGGER.info(f"Exporting model to {target_json}")
+    if not utils.write_if_changed(target_json, model_export.source_model_to_json(source_model), output_statistics):
+        LOGGER.info(f"{target_json} is up to date")
 
 
-def execute(app_config, args, root_dir):
-    target_path = pathlib.Path(args.target_path)
-    target_path.mkdir(parents=True, exist_ok=True)
+def model_cache_clang_args(app_config, args) -> List[str]:
+    # The models depend on the precompiled includes, not on the PCH file of the current run
+    return create_compile_flags(app_config, args).cache_key() + app_config.precompiled_includes
+
+
+def template_cache_dir(args) -> Optional[pathlib.Path]:
+    # Compiled templates are kept next to the models
+    return pathlib.Path(args.cache_dir) if args.cache_dir else None
+
 
-    translation_units: Dict[pathlib.Path, clang_index.TranslationUnit] = dict(
-        create_translation_units(args.input_files)
+def create_model_cache(app_config, args) -> Optional[model_cache.ModelCache]:
+    if not args.cache_dir:
+        return None
+    return model_cache.ModelCache(
+        pathlib.Path(args.cache_dir),
+        app_config.templates,
+        model_cache_clang_args(app_config, args),
+        args.cache_max_size * 1024 * 1024,
     )
 
-    j2_env = (
-        templating_tools.build_jinja_environment(root_dir)
-        if not args.is_export_json
-        else None
+
+def analyze_templates(app_config: config.AppConfig, j2_env) -> config.AppConfig:
+    """The app config with the extraction of every template which does not declare one"""
+    # The JSON export has no templates, it gets the complete models
+    if j2_env is None:
+        return app_config
+    return dataclasses.replace(
+        app_config,
+        templates=[
+            template_config
+            if template_config.extraction is not None
+            else dataclasses.replace(
+                template_config,
+                extraction=template_analysis.analyze_template(j2_env, str(template_config.template)),
+            )
+            for template_config in app_config.templates
+        ],
     )
-    for template_config in app_config.templates:
-        for header_file, translation_unit in translation_units.items():
-            target_file = target_path / pathlib.Path(
-                template_config.filename_prefix
-                + header_file.stem
-                + template_config.filename_suffix
+
+
+def render_aggregate_templates(
+    j2_env,
+    args,
+    aggregate_templates,
+    project_model: ProjectModel,
+    include_dirs: List[pathlib.Path],
+    find_template_dependencies: Callable[[config.TemplateConfig], List[pathlib.Path]],
+    output_dependencies: Dict[pathlib.Path, List[pathlib.Path]],
+    output_statistics: utils.OutputStatistics,
+    profiler: profiling.Profiler,
+) -> List[str]:
+    """Renders the aggregate templates with the merged models of every header, returns the ones which failed"""
+    target_path = pathlib.Path(args.target_path)
+    config_file = pathlib.Path(args.config_path).absolute()
+    failed_templates: List[str] = []
+    header_files = project_model.header_files
+    header_include_paths = [
+        find_relative_path(header_file, include_dirs) or header_file for header_file in header_files
+    ]
+    for template_index, template_config in aggregate_templates:
+        target_file = output_file_path(target_path, template_config, None, args.is_export_json)
+        output_dependencies[target_file.absolute()] = project_model.dependencies(header_files) + [config_file]
+        try:
+            with profiler.measure("merge", template=template_config.template):
+                source_model = project_model.source_model(template_index, header_files)
+        except DuplicateDefinitionError as e:
+            LOGGER.error(f"Cannot merge the models for {target_file}: {e}")
+            failed_templates.append(template_config.template)
+            continue
+
+        if not args.is_export_json:
+            output_dependencies[target_file.absolute()] += find_template_dependencies(template_config)
+            with profiler.measure("render", template=template_config.template):
+                content = render_template(j2_env, template_config, None, source_model, header_include_paths)
+            with profiler.measure("write", template=template_config.template):
+                write_output(target_file, content, output_statistics)
+        else:
+            with profiler.measure("export", template=template_config.template):
+                export_json(source_model, target_file, output_statistics)
+    return failed_templates
+
+
+def write_dependencies(
+    args, output_dependencies: Dict[pathlib.Path, List[pathlib.Path]], skipped_files: List[pathlib.Path]
+):
+    """The headers skipped by the pre-scan are dependencies of every output, annotating one adds outputs"""
+    LOGGER.info(f"Writing dependencies to {args.depfile_path}")
+    if args.depfile_target:
+        dependencies = [path for paths in output_dependencies.values() for path in paths] + skipped_files
+        output_dependencies = {pathlib.Path(args.depfile_target).absolute(): list(dict.fromkeys(dependencies))}
+    else:
+        output_dependencies = {
+            output_file: dependencies + skipped_files for output_file, dependencies in output_dependencies.items()
+        }
+    depfile.write_depfile(pathlib.Path(args.depfile_path), output_dependencies)
+
+
+def finish_run(args, cache: Optional[model_cache.ModelCache], profiler: profiling.Profiler):
+    """Evicts the cache and reports the profile of a run"""
+    if cache is not None:
+        cache.evict()
+        cache.log_statistics()
+
+    if args.is_profile:
+        LOGGER.info(f"Profile:\n{profiler.summary()}")
+    if args.profile_trace_path:
+        profiler.write_chrome_trace(pathlib.Path(args.profile_trace_path))
+
+
+def execute(app_config, args, root_dir, j2_env=None, cache=None, preamble_cache=None, project_model=None):
+    """Generates the code; long running processes pass their warm Jinja environment, model and preamble cache
+
+    The aggregate templates are rendered with the models of every header of the project model, which long running
+    processes keep between the runs of some of the headers.
+    """
+    target_path = pathlib.Path(args.target_path)
+    target_path.mkdir(parents=True, exist_ok=True)
+
+    if j2_env is None and not args.is_export_json:
+        j2_env = templating_tools.build_jinja_environment(root_dir, template_cache_dir(args))
+    # Long running processes analyze the templates before creating their caches, the models depend on it
+    app_config = analyze_templates(app_config, j2_env)
+    include_dirs = [pathlib.Path(include_dir).absolute() for include_dir in args.includes]
+
+    if cache is None:
+        cache = create_model_cache(app_config, args)
+
+    aggregate_templates = [
+        (template_index, template_config)
+        for template_index, template_config in enumerate(app_config.templates)
+        if template_config.filename
+    ]
+    if project_model is None:
+        project_model = ProjectModel()
+
+    # Every header is rendered as soon as its models are ready, translation units are never kept around
+    output_statistics = utils.OutputStatistics()
+    output_dependencies: Dict[pathlib.Path, List[pathlib.Path]] = {}
+    template_dependencies: Dict[str, List[pathlib.Path]] = {}
+    config_file = pathlib.Path(args.config_path).absolute()
+    failed_files: List[pathlib.Path] = []
+    skipped_files: List[pathlib.Path] = []
+    failed_templates: List[str] = []
+    profiler = profiling.Profiler()
+
+    def find_template_dependencies(template_config) -> List[pathlib.Path]:
+        if template_config.template not in template_dependencies:
+            template_dependencies[template_config.template] = templating_tools.find_template_dependencies(
+                j2_env, str(template_config.template)
             )
+        return template_dependencies[template_config.template]
+
+    for result in parse_input_files(app_config, args, cache, preamble_cache, profiler):
+        header_file = result.header_file
+        profiler.add(result.spans)
+        if result.error is not None:
+            LOGGER.error(f"Failed to parse {header_file}: {result.error}")
+            failed_files.append(header_file)
+            continue
+        if not result.source_models:
+            # Skipped by the pre-scan
+            skipped_files += result.dependencies
 
-            # Skip if the target file is newer than the source file
-            if header_file.stat().st_mtime < target_file.stat().st_mtime:
-                LOGGER.info(f"Skipping {header_file} (target file is newer)")
+        for template_config, source_model in zip(app_config.templates, result.source_models):
+            if template_config.filename:
                 continue
 
-            LOGGER.info(f"Parsing {header_file}")
-            parsing_filter = parse_source.build_filter(**template_config.to_dict())
-            source_model = parse_source.parse_source_model(
-                translation_unit, parsing_filter
-            )
+            target_file = output_file_path(target_path, template_config, header_file, args.is_export_json)
+            output_dependencies[target_file.absolute()] = result.dependencies + [config_file]
 
             if not args.is_export_json:
-                header_include_path = find_relative_path(header_file, args.includes) or header_file
-                write_template(
-                    j2_env,
-                    template_config,
-                    header_include_path,
-                    source_model,
-                    target_file,
-                )
+                output_dependencies[target_file.absolute()] += find_template_dependencies(template_config)
+
+                header_include_path = find_relative_path(header_file, include_dirs) or header_file
+                with profiler.measure("render", str(header_file), template_config.template):
+                    content = render_template(j2_env, template_config, header_include_path, source_model)
+                with profiler.measure("write", str(header_file), template_config.template):
+                    write_output(target_file, content, output_statistics)
             else:
-                export_json(source_model, target_file)
+                with profiler.measure("export", str(header_file), template_config.template):
+                    export_json(source_model, target_file, output_statistics)
+
+        if aggregate_templates:
+            project_model.update(parse_worker.resolve_models(result))
+
+    if aggregate_templates and failed_files:
+        LOGGER.error("Skipping the aggregate templates, the model of the project is incomplete")
+    elif aggregate_templates:
+        failed_templates = render_aggregate_templates(
+            j2_env,
+            args,
+            aggregate_templates,
+            project_model,
+            include_dirs,
+            find_template_dependencies,
+            output_dependencies,
+            output_statistics,
+            profiler,
+        )
+
+    LOGGER.info(f"Generated files: {output_statistics.written} rewritten, {output_statistics.unchanged} unchanged")
+
+    if args.depfile_path:
+        write_dependencies(args, output_dependencies, skipped_files)
+    finish_run(args, cache, profiler)
+
+    if failed_files:
+        raise RuntimeError(f"Code generation failed for {len(failed_files)} of {len(args.input_files)} input files")
+    if failed_templates:
+        raise RuntimeError(f"Code generation failed for the aggregate templates {', '.join(failed_templates)}")
 
 
 def main():
@@ -212,17 +724,37 @@ def main():
 
     args = fetch_args()
 
-    if args.clang_path is not None:
-        clang_index.Config.set_library_path(args.clang_path)
-        logging.info(f"Using clang library path: {args.clang_path}")
+    if args.serve_socket is not None:
+        from gk.source_index import server
+
+        server.serve(pathlib.Path(args.serve_socket), args.clang_path)
+        return
 
     config_path = pathlib.Path(args.config_path)
     app_config = config.load_app_config(config_path)
 
+    if args.is_list_outputs:
+        for output_file in list_outputs(app_config, args):
+            print(output_file.as_posix())
+        return
+    if args.is_list_outputs_dependencies:
+        for dependency in list_outputs_dependencies(app_config, args):
+            print(dependency.as_posix())
+        return
+
+    if args.clang_path is not None:
+        clang_index.Config.set_library_path(args.clang_path)
+        logging.info(f"Using clang library path: {args.clang_path}")
+
     root_dir = pathlib.Path(config_path.parent)
 
     try:
-        execute(app_config, args, root_dir)
+        if args.is_watch:
+            from gk.source_index import watch
+
+            watch.watch(app_config, args, root_dir)
+        else:
+            execute(app_config, args, root_dir)
     except Exception as e:
         LOGGER.error(f"Error: {e}", exc_info=True)
         sys.exit(1)
@@ -1,6 +1,10 @@
-from typing import List, Any
+from typing import Dict, FrozenSet, List, Any, Optional
+from collections import defaultdict
 from dataclasses import dataclass
+from functools import cached_property
+import abc
 import enum
+import sys
 from dataclasses_json import DataClassJsonMixin
 
 
@@ -11,53 +15,220 @@ class AccessSpecifier(enum.Enum):
     PUBLIC = 3
 
 
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+class _SlottedJsonMixin(abc.ABC):
+    """The methods of DataClassJsonMixin, which gives every instance a `__dict__` as it has no `__slots__`"""
+
+    __slots__ = ()
+
+    dataclass_json_config = None
+    to_json = DataClassJsonMixin.to_json
+    to_dict = DataClassJsonMixin.to_dict
+    from_json = DataClassJsonMixin.__dict__["from_json"]
+    from_dict = DataClassJsonMixin.__dict__["from_dict"]
+    schema = DataClassJsonMixin.__dict__["schema"]
+
+
+# Still a DataClassJsonMixin for isinstance() checks
+DataClassJsonMixin.register(_SlottedJsonMixin)
+
+
+# A project has ten thousands of descriptors, so they have no `__dict__`, hold tuples and share their strings: the
+# names, namespaces, types and annotations are interned, lists passed to the constructors are turned into tuples. The
+# fields are still declared as lists, which the schemas of dataclasses_json support.
+
+
 @dataclass
-class Descriptor(DataClassJsonMixin):
+class Descriptor(_SlottedJsonMixin):
+    __slots__ = ("name",)
+
     name: str
 
+    def __post_init__(self):
+        self.name = sys.intern(self.name)
+
 
 @dataclass
 class AnnotationDescriptor(Descriptor):
+    __slots__ = ("arguments",)
+
     arguments: List[Any]
 
+    def __post_init__(self):
+        super().__post_init__()
+        self.arguments = tuple(_intern(argument) for argument in self.arguments)
+
 
 @dataclass
 class AnnotatedDescriptor(Descriptor):
+    __slots__ = ("access_specifier", "annotations")
+
     access_specifier: AccessSpecifier
     annotations: List[AnnotationDescriptor]
 
+    def __post_init__(self):
+        super().__post_init__()
+        self.annotations = tuple(self.annotations)
+
+    # Descriptors have a few annotations at most, they are looked up without an index
+
+    @property
+    def annotations_by_name(self) -> Dict[str, List[AnnotationDescriptor]]:
+        annotations_by_name = defaultdict(list)
+        for annotation in self.annotations:
+            annotations_by_name[annotation.name].append(annotation)
+        return dict(annotations_by_name)
+
+    @property
+    def annotation_names(self) -> FrozenSet[str]:
+        return frozenset(annotation.name for annotation in self.annotations)
+
+    def has_annotation(self, name: str) -> bool:
+        return any(annotation.name == name for annotation in self.annotations)
+
+    def annotation(self, name: str) -> Optional[AnnotationDescriptor]:
+        """The first annotation of the name"""
+        return next((annotation for annotation in self.annotations if annotation.name == name), None)
+
 
 @dataclass
 class TypeDescriptor(Descriptor):
+    __slots__ = ("type",)
+
     type: str
 
+    def __post_init__(self):
+        super().__post_init__()
+        self.type = sys.intern(self.type)
+
 
 @dataclass
 class FunctionTypeDescriptor(AnnotatedDescriptor):
+    __slots__ = ("namespace", "return_type", "argument_list")
+
     namespace: str
     return_type: TypeDescriptor
     argument_list: List[TypeDescriptor]
 
+    def __post_init__(self):
+        super().__post_init__()
+        self.namespace = sys.intern(self.namespace)
+        self.argument_list = tuple(self.argument_list)
+
 
 @dataclass
 class FieldTypeDescriptor(AnnotatedDescriptor):
+    __slots__ = ("type",)
+
     type: str
 
+    def __post_init__(self):
+        super().__post_init__()
+        self.type = sys.intern(self.type)
+
 
 @dataclass
 class PropertyTypeDescriptor(AnnotatedDescriptor):
+    __slots__ = ("setter", "getter")
+
     setter: FunctionTypeDescriptor
     getter: FieldTypeDescriptor
 
 
+def _index_by_annotation(items: List[AnnotatedDescriptor]) -> Dict[str, List[AnnotatedDescriptor]]:
+    items_by_annotation = defaultdict(list)
+    for item in items:
+        # An item annotated twice with the same name is listed once
+        for name in dict.fromkeys(annotation.name for annotation in item.annotations):
+            items_by_annotation[name].append(item)
+    return dict(items_by_annotation)
+
+
+def _qualify_namespace(namespace: str) -> str:
+    # Namespaces are stored like `::ns1::ns2`, the global one as `::`
+    return namespace if namespace.startswith("::") else f"::{namespace}"
+
+
+# The indexes below are built on first use and are not fields, so they are neither compared, exported nor pickled.
+# A model is not modified after it is built, changing one afterwards leaves its indexes stale.
+
+
 @dataclass
 class ClassTypeDescriptor(AnnotatedDescriptor):
+    __slots__ = ("namespace", "fields", "_fields_by_annotation")
+
     namespace: str
     fields: List[FieldTypeDescriptor]
     # members = List[FieldTypeDescriptor]
 
+    def __post_init__(self):
+        super().__post_init__()
+        self.namespace = sys.intern(self.namespace)
+        self.fields = tuple(self.fields)
+        self._fields_by_annotation = None
+
+    @property
+    def qualified_name(self) -> str:
+        return f"::{self.name}" if self.namespace == "::" else f"{self.namespace}::{self.name}"
+
+    @property
+    def fields_by_annotation(self) -> Dict[str, List[FieldTypeDescriptor]]:
+        if self._fields_by_annotation is None:
+            self._fields_by_annotation = _index_by_annotation(self.fields)
+        return self._fields_by_annotation
+
+    def fields_with_annotation(self, name: str) -> List[FieldTypeDescriptor]:
+        return self.fields_by_annotation.get(name, [])
+
+    def __getstate__(self):
+        # Pickled without the index, like into the model cache
+        slots = (slot for owner in type(self).__mro__ for slot in getattr(owner, "__slots__", ()))
+        return None, {slot: None if slot == "_fields_by_annotation" else getattr(self, slot) for slot in slots}
+
 
 @dataclass
 class SourceModel(DataClassJsonMixin):
     class_types: List[ClassTypeDescriptor]
     function_types: List[FunctionTypeDescriptor]
+
+    @cached_property
+    def classes_by_annotation(self) -> Dict[str, List[ClassTypeDescriptor]]:
+        return _index_by_annotation(self.class_types)
+
+    @cached_property
+    def classes_by_qualified_name(self) -> Dict[str, ClassTypeDescriptor]:
+        return {class_type.qualified_name: class_type for class_type in self.class_types}
+
+    @cached_property
+    def classes_by_name(self) -> Dict[str, List[ClassTypeDescriptor]]:
+        classes_by_name = defaultdict(list)
+        for class_type in self.class_types:
+            classes_by_name[class_type.name].append(class_type)
+        return dict(classes_by_name)
+
+    @cached_property
+    def classes_by_namespace(self) -> Dict[str, List[ClassTypeDescriptor]]:
+        classes_by_namespace = defaultdict(list)
+        for class_type in self.class_types:
+            classes_by_namespace[class_type.namespace].append(class_type)
+        return dict(classes_by_namespace)
+
+    def __getstate__(self):
+        # Pickled without the indexes, like into the model cache
+        return {"class_types": self.class_types, "function_types": self.function_types}
+
+    def classes_with_annotation(self, name: str) -> List[ClassTypeDescriptor]:
+        return self.classes_by_annotation.get(name, [])
+
+    def find_class(self, name: str) -> Optional[ClassTypeDescriptor]:
+        """Looks up a class by its qualified name (`ns1::ns2::A`, with or without the leading `::`), or by its name"""
+        if "::" in name:
+            return self.classes_by_qualified_name.get(_qualify_namespace(name))
+        classes = self.classes_by_name.get(name)
+        return classes[0] if classes else None
+
+    def classes_in_namespace(self, namespace: str) -> List[ClassTypeDescriptor]:
+        return self.classes_by_namespace.get(_qualify_namespace(namespace) if namespace else "::", [])
@@ -0,0 +1,238 @@
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import dataclasses
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+
+import logging
+
+from gk.source_index.config import TemplateConfig
+from gk.source_index.parse_worker import ParseResult
+from gk.source_index import utils
+from gk.source_index.utils import write_atomic
+
+LOGGER = logging.getLogger(__name__)
+
+# Bump when the layout of the cached models changes
+CACHE_FORMAT_VERSION = 2
+
+DEFAULT_MAX_CACHE_SIZE = 256 * 1024 * 1024
+
+DEFAULT_MAX_MEMORY_ENTRIES = 4096
+
+
+def _hash_strings(*values: str) -> str:
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(value.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def cache_context(template_configs: List[TemplateConfig], clang_args: List[str]) -> str:
+    """Everything besides the parsed files a model depends on"""
+    return _hash_strings(
+        str(CACHE_FORMAT_VERSION),
+        utils.tool_version(),
+        json.dumps(clang_args),
+        json.dumps([template_config.to_dict() for template_config in template_configs], sort_keys=True),
+    )
+
+
+@dataclass
+class CacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+
+class ModelCache:
+    """Persistent cache of the source models of the headers
+
+    Every header has a manifest with the include closure recorded at its last parse. A model is keyed by the content
+    of the header and of the files in its include closure, the clang arguments, the template configs and the tool
+    version, so a warm run does not need libclang to tell whether a header changed.
+    """
+
+    def __init__(
+        self,
+        cache_dir: pathlib.Path,
+        template_configs: List[TemplateConfig],
+        clang_args: List[str],
+        max_size: int = DEFAULT_MAX_CACHE_SIZE,
+    ) -> None:
+        self._cache_dir = cache_dir
+        self._max_size = max_size
+        self._context = cache_context(template_configs, clang_args)
+        # Shared includes are hashed only once per run
+        self._file_digests: Dict[pathlib.Path, str] = {}
+        self.statistics = CacheStatistics()
+
+    @property
+    def _manifest_dir(self) -> pathlib.Path:
+        return self._cache_dir / "manifests"
+
+    @property
+    def _model_dir(self) -> pathlib.Path:
+        return self._cache_dir / "models"
+
+    def _manifest_file(self, header_file: pathlib.Path) -> pathlib.Path:
+        return self._manifest_dir / f"{_hash_strings(self._context, str(header_file))}.json"
+
+    def _file_digest(self, file_path: pathlib.Path) -> str:
+        digest = self._file_digests.get(file_path)
+        if digest is None:
+            try:
+                digest = hashlib.sha256(file_path.read_bytes()).hexdigest()
+            except OSError:
+                digest = "missing"
+            self._file_digests[file_path] = digest
+        return digest
+
+    def _model_key(self, header_file: pathlib.Path, dependencies: List[pathlib.Path]) -> str:
+        return _hash_strings(
+            self._context,
+            str(header_file),
+            *(f"{dependency}:{self._file_digest(dependency)}" for dependency in dependencies),
+        )
+
+    def load(self, header_file: pathlib.Path) -> Optional[ParseResult]:
+        try:
+            dependencies = [
+                pathlib.Path(dependency)
+                for dependency in json.loads(self._manifest_file(header_file).read_text())["dependencies"]
+            ]
+            model_file = self._model_dir / f"{self._model_key(header_file, dependencies)}.pickle"
+            source_models = pickle.loads(model_file.read_bytes())
+        except (OSError, ValueError, KeyError, pickle.UnpicklingError, EOFError, AttributeError):
+            self.statistics.misses += 1
+            return None
+
+        # Keeps recently used entries from being evicted
+        os.utime(model_file)
+        os.utime(self._manifest_file(header_file))
+        self.statistics.hits += 1
+        LOGGER.info(f"Using cached model of {header_file}")
+        return ParseResult(header_file=header_file, source_models=source_models, dependencies=dependencies)
+
+    def store(self, result: ParseResult):
+        if result.error is not None or not result.dependencies:
+            return
+
+        model_key = self._model_key(result.header_file, result.dependencies)
+        write_atomic(
+            self._model_dir / f"{model_key}.pickle",
+            pickle.dumps(result.source_models, protocol=pickle.HIGHEST_PROTOCOL),
+        )
+        write_atomic(
+            self._manifest_file(result.header_file),
+            json.dumps({"dependencies": [str(dependency) for dependency in result.dependencies]}).encode("utf-8"),
+        )
+        self.statistics.stores += 1
+
+    def evict(self):
+        """Removes the least recently used models and manifests until the cache fits into its size limit
+
+        Manifests count towards the size as well, the ones of headers which are gone or of an old context are evicted
+        like the models. A manifest without its model is a miss, and written again with the model.
+        """
+        cache_files = []
+        for cache_dir in (self._model_dir, self._manifest_dir):
+            try:
+                cache_files += [(entry.stat(), entry) for entry in cache_dir.iterdir()]
+            except OSError:
+                pass
+
+        cache_size = sum(stat.st_size for stat, _ in cache_files)
+        for stat, cache_file in sorted(cache_files, key=lambda item: item[0].st_mtime):
+            if cache_size <= self._max_size:
+                break
+            cache_file.unlink(missing_ok=True)
+            cache_size -= stat.st_size
+            if cache_file.suffix == ".pickle":
+                self.statistics.evictions += 1
+
+    def log_statistics(self):
+        statistics = self.statistics
+        LOGGER.info(
+            f"Model cache: {statistics.hits} hits, {statistics.misses} misses, "
+            f"{statistics.stores} stored, {statistics.evictions} evicted"
+        )
+
+
+@dataclass
+class _MemoryEntry:
+    result: ParseResult
+    signatures: List[Optional[Tuple[int, int]]]
+
+
+class MemoryModelCache:
+    """Models of a long running process, with an optional persistent cache behind
+
+    An entry is dropped once the modification time or the size of a file in its include closure changes; checking a
+    few hundred files with stat costs a fraction of a millisecond.
+    """
+
+    def __init__(self, backing_cache: Optional[ModelCache] = None, max_entries: int = DEFAULT_MAX_MEMORY_ENTRIES):
+        self.backing_cache = backing_cache
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[pathlib.Path, _MemoryEntry]" = OrderedDict()
+        self.statistics = CacheStatistics()
+
+    def _remember(self, result: ParseResult):
+        self._entries[result.header_file] = _MemoryEntry(
+            # The timings belong to the run which parsed the header
+            result=dataclasses.replace(result, spans=[]),
+            signatures=[utils.file_signature(dependency) for dependency in result.dependencies],
+        )
+        self._entries.move_to_end(result.header_file)
+
+    def dependencies(self, header_file: pathlib.Path) -> List[pathlib.Path]:
+        """The include closure of the header at its last parse"""
+        entry = self._entries.get(header_file)
+        return entry.result.dependencies if entry is not None else [header_file]
+
+    def load(self, header_file: pathlib.Path) -> Optional[ParseResult]:
+        entry = self._entries.get(header_file)
+        if entry is not None and entry.signatures == [
+            utils.file_signature(dependency) for dependency in entry.result.dependencies
+        ]:
+            self._entries.move_to_end(header_file)
+            self.statistics.hits += 1
+            LOGGER.info(f"Using model of {header_file} from memory")
+            return entry.result
+
+        self.statistics.misses += 1
+        result = self.backing_cache.load(header_file) if self.backing_cache is not None else None
+        if result is not None:
+            self._remember(result)
+        return result
+
+    def store(self, result: ParseResult):
+        if result.error is not None or not result.dependencies:
+            return
+        self._remember(result)
+        self.statistics.stores += 1
+        if self.backing_cache is not None:
+            self.backing_cache.store(result)
+
+    def evict(self):
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self.statistics.evictions += 1
+        if self.backing_cache is not None:
+            self.backing_cache.evict()
+
+    def log_statistics(self):
+        statistics = self.statistics
+        LOGGER.info(
+            f"Memory model cache: {statistics.hits} hits, {statistics.misses} misses, "
+            f"{statistics.stores} stored, {statistics.evictions} evicted"
+        )
+        if self.backing_cache is not None:
+            self.backing_cache.log_statistics()
@@ -0,0 +1,78 @@
+from typing import Any, Dict, List, Optional
+import json
+
+from gk.source_index.model import (
+    AccessSpecifier,
+    ClassTypeDescriptor,
+    FieldTypeDescriptor,
+    FunctionTypeDescriptor,
+    SourceModel,
+    TypeDescriptor,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Walks the descriptor types directly instead of the reflection of dataclasses_json. The documents are the same as the
+# ones dataclasses_json gave: fields in declaration order, access specifiers as `str()` of the enum. Both backends write
+# the same bytes: no whitespace and UTF-8 text as is.
+
+_ACCESS_SPECIFIERS: Dict[Optional[AccessSpecifier], Optional[str]] = {
+    None: None,
+    **{access_specifier: str(access_specifier) for access_specifier in AccessSpecifier},
+}
+
+
+def _annotations(annotations) -> List[Dict[str, Any]]:
+    return [{"name": annotation.name, "arguments": list(annotation.arguments)} for annotation in annotations]
+
+
+def _type(type_descriptor: TypeDescriptor) -> Dict[str, Any]:
+    return {"name": type_descriptor.name, "type": type_descriptor.type}
+
+
+def _field(field: FieldTypeDescriptor) -> Dict[str, Any]:
+    return {
+        "name": field.name,
+        "access_specifier": _ACCESS_SPECIFIERS[field.access_specifier],
+        "annotations": _annotations(field.annotations),
+        "type": field.type,
+    }
+
+
+def _class(class_type: ClassTypeDescriptor) -> Dict[str, Any]:
+    return {
+        "name": class_type.name,
+        "access_specifier": _ACCESS_SPECIFIERS[class_type.access_specifier],
+        "annotations": _annotations(class_type.annotations),
+        "namespace": class_type.namespace,
+        "fields": [_field(field) for field in class_type.fields],
+    }
+
+
+def _function(function_type: FunctionTypeDescriptor) -> Dict[str, Any]:
+    return {
+        "name": function_type.name,
+        "access_specifier": _ACCESS_SPECIFIERS[function_type.access_specifier],
+        "annotations": _annotations(function_type.annotations),
+        "namespace": function_type.namespace,
+        "return_type": _type(function_type.return_type),
+        "argument_list": [_type(argument) for argument in function_type.argument_list],
+    }
+
+
+def source_model_to_dict(source_model: SourceModel) -> Dict[str, Any]:
+    return {
+        "class_types": [_class(class_type) for class_type in source_model.class_types],
+        "function_types": [_function(function_type) for function_type in source_model.function_types],
+    }
+
+
+def source_model_to_json(source_model: SourceModel) -> str:
+    """Uses orjson if it is installed"""
+    document = source_model_to_dict(source_model)
+    if orjson is not None:
+        return orjson.dumps(document).decode("utf-8")
+    return json.dumps(document, separators=(",", ":"), ensure_ascii=False)
@@ -1,14 +1,22 @@
-from typing import Dict, Tuple, List, Union, Callable
+from typing import Collection, Dict, Iterable, NamedTuple, Optional, Tuple, Type, TypeVar, List, Union, Callable
 from collections import defaultdict
+import ctypes
+import dataclasses
+import operator
+import os
+import re
 
 from more_itertools import always_iterable
 
 import clang.cindex as clang_index
 
+from gk.source_index.config import Extraction
 from gk.source_index.model import (
     AccessSpecifier,
+    AnnotatedDescriptor,
     AnnotationDescriptor,
     ClassTypeDescriptor,
+    Descriptor,
     FieldTypeDescriptor,
     FunctionTypeDescriptor,
     SourceModel,
@@ -18,66 +26,143 @@ import logging
 
 LOGGER = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 # TODO: Extract this
 class Filter:
+    """Filters the items of a source model by their descriptor type
+
+    The filter functions of a descriptor type are resolved once, a model is then filtered with a dictionary lookup per
+    item.
+    """
+
     def __init__(self) -> None:
         self._filter_list: List[
-            Tuple[List[clang_index.CursorKind], Callable[[clang_index.Cursor], bool]]
+            Tuple[Tuple[Type[Descriptor], ...], Callable[[Descriptor], bool]]
         ] = []
+        self._dispatch_table: Dict[Type[Descriptor], Tuple[Callable[[Descriptor], bool], ...]] = {}
 
     def add_filter(
         self,
-        kinds: Union[clang_index.CursorKind, List[clang_index.CursorKind]],
-        filter_fn: Callable[[clang_index.Cursor], bool],
+        kinds: Union[Type[Descriptor], List[Type[Descriptor]]],
+        filter_fn: Callable[[Descriptor], bool],
     ):
-        self._filter_list.append((always_iterable(kinds), filter_fn))
-
-    def __call__(self, cursor: clang_index.Cursor) -> bool:
-        return self.do_filter(cursor)
-
-    def do_filter(self, cursor: clang_index.Cursor) -> bool:
-        return (
-            all(
-                fn(cursor)
-                for _, fn in filter(
-                    lambda k: cursor.kind in k,
-                    [(k, fn) for k, fn in self._filter_list],
-                )
+        # always_iterable returns a one-shot iterator, which would be exhausted by the first lookup
+        self._filter_list.append((tuple(always_iterable(kinds)), filter_fn))
+        self._dispatch_table.clear()
+
+    def filters_of(self, descriptor_type: Type[Descriptor]) -> Tuple[Callable[[Descriptor], bool], ...]:
+        filter_fns = self._dispatch_table.get(descriptor_type)
+        if filter_fns is None:
+            filter_fns = self._dispatch_table[descriptor_type] = tuple(
+                fn for kinds, fn in self._filter_list if issubclass(descriptor_type, kinds)
             )
-            if self._filter_list
-            else True
-        )
+        return filter_fns
+
+    def __call__(self, item: Descriptor) -> bool:
+        return self.do_filter(item)
+
+    def do_filter(self, item: Descriptor) -> bool:
+        for fn in self.filters_of(type(item)):
+            if not fn(item):
+                return False
+        return True
 
 
 # TODO: Extract this
 def build_filter(**kwargs) -> Filter:
     public_only = kwargs.get("allow_public_members_only", True)
-    accepted_annotations = kwargs.get("filter_annotations", [])
+    accepted_annotations = frozenset(kwargs.get("filter_annotations", None) or [])
 
     filter_fn = Filter()
 
     if public_only:
         filter_fn.add_filter(
-            [
-                clang_index.CursorKind.FIELD_DECL,
-                clang_index.CursorKind.CLASS_DECL,
-                clang_index.CursorKind.STRUCT_DECL,
-            ],
-            lambda cursor: cursor.access_specifier
-            == clang_index.AccessSpecifier.PUBLIC,
+            [FieldTypeDescriptor, ClassTypeDescriptor],
+            # Declarations outside of classes have no access specifier
+            lambda item: item.access_specifier is AccessSpecifier.PUBLIC or item.access_specifier is None,
         )
 
     if accepted_annotations:
         filter_fn.add_filter(
-            clang_index.CursorKind.MACRO_INSTANTIATION,
-            # TODO: Does it get lost after we may get rid of the object?
-            lambda cursor: cursor.spelling in accepted_annotations,
+            AnnotationDescriptor,
+            lambda item: item.name in accepted_annotations,
         )
 
     return filter_fn
 
 
+def filter_source_model(source_model: SourceModel, filter_fn: Callable[[Descriptor], bool]) -> SourceModel:
+    # Models are not modified once built, so the descriptors which pass the filter unchanged are shared
+    def _filter_annotated(item: AnnotatedDescriptor, **changes) -> AnnotatedDescriptor:
+        annotations = tuple(annotation for annotation in item.annotations if filter_fn(annotation))
+        if len(annotations) != len(item.annotations):
+            changes["annotations"] = annotations
+        return dataclasses.replace(item, **changes) if changes else item
+
+    def _filter_class(class_type: ClassTypeDescriptor) -> ClassTypeDescriptor:
+        fields = tuple(_filter_annotated(field) for field in class_type.fields if filter_fn(field))
+        if len(fields) == len(class_type.fields) and all(map(operator.is_, fields, class_type.fields)):
+            return _filter_annotated(class_type)
+        return _filter_annotated(class_type, fields=fields)
+
+    return SourceModel(
+        class_types=[_filter_class(class_type) for class_type in source_model.class_types if filter_fn(class_type)],
+        function_types=[function_type for function_type in source_model.function_types if filter_fn(function_type)],
+    )
+
+
+_location_is_from_main_file = None
+
+
+def is_from_main_file(location: clang_index.SourceLocation) -> bool:
+    # Not exposed by the python binding, but a lot cheaper than comparing `location.file.name`
+    global _location_is_from_main_file
+    if _location_is_from_main_file is None:
+        _location_is_from_main_file = clang_index.conf.lib.clang_Location_isFromMainFile
+        _location_is_from_main_file.argtypes = [clang_index.SourceLocation]
+        _location_is_from_main_file.restype = ctypes.c_int
+    return bool(_location_is_from_main_file(location))
+
+
+# TODO: Extract this
+def build_scope_filter(**kwargs) -> Callable[[clang_index.Cursor], bool]:
+    """Decides which subtrees are traversed by their location: the main file and the allowed path prefixes"""
+    if kwargs.get("traverse_included_files", False):
+        return lambda _: True
+
+    allowed_path_prefixes = tuple(
+        os.path.normcase(os.path.abspath(prefix)) for prefix in kwargs.get("allowed_path_prefixes", None) or []
+    )
+
+    if not allowed_path_prefixes:
+        return lambda cursor: is_from_main_file(cursor.location)
+
+    # Prefixes are matched only once per file
+    scope_cache: Dict[str, bool] = {}
+
+    def scope_fn(cursor: clang_index.Cursor) -> bool:
+        location = cursor.location
+        if is_from_main_file(location):
+            return True
+
+        location_file = location.file
+        if location_file is None:
+            # Builtin macro definitions, nothing to look for
+            return False
+
+        file_name = location_file.name
+        in_scope = scope_cache.get(file_name)
+        if in_scope is None:
+            in_scope = scope_cache[file_name] = os.path.normcase(os.path.abspath(file_name)).startswith(
+                allowed_path_prefixes
+            )
+        return in_scope
+
+    return scope_fn
+
+
 _access_specifier_map = {
     clang_index.AccessSpecifier.PUBLIC: AccessSpecifier.PUBLIC,
     clang_index.AccessSpecifier.PRIVATE: AccessSpecifier.PRIVATE,
@@ -91,108 +176,268 @@ def find_access_specifier(
     return _access_specifier_map.get(access_specifier, None)
 
 
-def fetch_annotation_tokens(cursor: clang_index.Cursor) -> Tuple[str, str, List[str]]:
-    extracted_tokens = []
+class MalformedAnnotationError(ValueError):
+    pass
+
+
+def _split_annotation_tokens(tokens: Iterable[str]) -> List[str]:
+    # `NAME(target, arguments...)`: the tokens between the separators are joined, the ones after the last are dropped
+    token_groups = []
     token_group = []
-    for token in cursor.get_tokens():
-        token_str = token.spelling
-        if token_str not in ["(", ")", ","]:
+    for token_str in tokens:
+        if token_str not in ("(", ")", ","):
             token_group.append(token_str)
         else:
-            extracted_tokens.append("".join(token_group))
+            token_groups.append("".join(token_group))
             token_group.clear()
-
-    # TODO Throw an error here if the annotation is malformed
-    # At this point only predefied annotations should appear
-    return extracted_tokens[0], extracted_tokens[1], extracted_tokens[2:]
+    return token_groups
 
 
-def fetch_annotations(
-    cursor: clang_index.Cursor,
-    filter_fn: Callable[[clang_index.Cursor], bool],
-    namespace: str = "",
-):
-    if cursor.kind in [clang_index.CursorKind.MACRO_INSTANTIATION] and filter_fn(
-        cursor
-    ):
-        (name, target, arguments) = fetch_annotation_tokens(cursor)
-        yield namespace + "::" + target, AnnotationDescriptor(
-            arguments=arguments, name=name
+def _annotation_parts(token_groups: List[str], location: clang_index.SourceLocation) -> Tuple[str, str, List[str]]:
+    if len(token_groups) < 2 or not token_groups[1]:
+        file_name = location.file.name if location.file is not None else "<unknown>"
+        annotation = token_groups[0] if token_groups else "annotation"
+        raise MalformedAnnotationError(
+            f"{file_name}:{location.line}: Malformed {annotation}, expected NAME(target, arguments...)"
         )
+    return token_groups[0], token_groups[1], token_groups[2:]
 
-    elif cursor.kind is clang_index.CursorKind.NAMESPACE:
-        namespace += f"::{cursor.spelling}"
 
-    for child in cursor.get_children():
-        yield from fetch_annotations(child, filter_fn, namespace)
+def fetch_annotation_tokens(cursor: clang_index.Cursor) -> Tuple[str, str, List[str]]:
+    token_groups = _split_annotation_tokens(token.spelling for token in cursor.get_tokens())
+    return _annotation_parts(token_groups, cursor.location)
+
+
+# Tokens of the annotations read from the source text, the whitespace and the comments between them are skipped
+_ANNOTATION_TOKEN_PATTERN = re.compile(
+    r"""(?P<skip>\s+|//[^\n]*|/\*.*?\*/|\\\n)
+    |[(),]
+    |"(?:\\.|[^"\\\n])*"
+    |'(?:\\.|[^'\\\n])*'
+    |[^\s"'(),/]+
+    |/""",
+    re.VERBOSE | re.DOTALL,
+)
 
+_get_file_contents = None
 
-def fetch_fields(
-    cursor: clang_index.Cursor,
-    annotation_map: Dict[str, List[AnnotationDescriptor]],
-    filter_fn: Callable[[clang_index.Cursor], bool],
-    namespace: str,
-) -> FieldTypeDescriptor:
-    for child in cursor.get_children():
-        full_name = f"{namespace}::{child.spelling}"
-        annotations = annotation_map.get(full_name, [])
-        if child.kind in [clang_index.CursorKind.FIELD_DECL] and filter_fn(cursor):
-            yield FieldTypeDescriptor(
-                name=child.spelling,
-                access_specifier=find_access_specifier(child.access_specifier),
-                annotations=annotations,
-                type=child.type.spelling,
-            )
 
+def _file_contents(translation_unit: clang_index.TranslationUnit, source_file: clang_index.File) -> Optional[bytes]:
+    # Not exposed by the python binding; the text clang parsed, unsaved files included
+    global _get_file_contents
+    if _get_file_contents is None:
+        _get_file_contents = clang_index.conf.lib.clang_getFileContents
+        _get_file_contents.argtypes = [clang_index.TranslationUnit, clang_index.File, ctypes.POINTER(ctypes.c_size_t)]
+        _get_file_contents.restype = ctypes.c_void_p
+    size = ctypes.c_size_t()
+    contents = _get_file_contents(translation_unit, source_file, ctypes.byref(size))
+    return ctypes.string_at(contents, size.value) if contents else None
 
-def fetch_class_defintions(
-    cursor: clang_index.Cursor,
-    annotation_map: Dict[str, List[AnnotationDescriptor]],
-    filter_fn: Callable[[clang_index.Cursor], bool],
-    namespace: str = "",
-) -> ClassTypeDescriptor:
-    if cursor.kind in [
-        clang_index.CursorKind.CLASS_DECL,
-        clang_index.CursorKind.STRUCT_DECL,
-    ] and filter_fn(cursor):
-        full_name = f"{namespace}::{cursor.spelling}"
-        annotations = annotation_map.get(full_name, [])
-        fields = list(fetch_fields(cursor, annotation_map, filter_fn, full_name))
-        yield ClassTypeDescriptor(
-            namespace=namespace if namespace else "::",
-            name=cursor.spelling,
-            access_specifier=find_access_specifier(cursor.access_specifier),
-            annotations=annotations,
-            fields=fields,
-        )
-    elif cursor.kind is clang_index.CursorKind.NAMESPACE:
-        namespace += f"::{cursor.spelling}"
 
-    for child in cursor.get_children():
-        yield from fetch_class_defintions(child, annotation_map, filter_fn, namespace)
+def walk_cursors(
+    cursor: clang_index.Cursor, visit_fn: Callable[[clang_index.Cursor, T], Optional[T]], context: T
+) -> None:
+    """Walks the descendants of the cursor depth first, in source order, with an explicit stack instead of recursion
 
+    `visit_fn` is called with every cursor and the context of its parent. The children of the cursor are walked with
+    the context it returns, or skipped if it returns None.
+    """
+    stack = [(iter(cursor.get_children()), context)]
+    while stack:
+        children, context = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            continue
+        child_context = visit_fn(child, context)
+        if child_context is not None:
+            stack.append((iter(child.get_children()), child_context))
 
-# ---
 
+@dataclasses.dataclass
+class TraversalStatistics:
+    # Every child cursor enumerated, in scope or not
+    cursors: int = 0
+    annotations: int = 0
+    # Files whose text was fetched for their annotations
+    file_reads: int = 0
+    # Annotations tokenized by libclang, whose file text was not available
+    get_tokens_calls: int = 0
 
-def parse_annotations(
-    translation_unit: clang_index.TranslationUnit,
-    filter_fn: Callable[[clang_index.Cursor], bool],
-) -> Dict[str, List[AnnotationDescriptor]]:
-    res: Dict[str, List[AnnotationDescriptor]] = defaultdict(list)
-    for k, v in fetch_annotations(translation_unit.cursor, filter_fn):
-        res[k].append(v)
-    return res
 
+class AnnotationReader:
+    """Reads the annotations from the text of their files by the extent of their macro instantiations
 
-def parse_class_types(
-    translation_unit: clang_index.TranslationUnit,
-    annotation_map: Dict[str, List[AnnotationDescriptor]],
-    filter_fn: Callable[[clang_index.Cursor], bool],
-) -> ClassTypeDescriptor:
-    return list(
-        fetch_class_defintions(translation_unit.cursor, annotation_map, filter_fn)
-    )
+    Every file is fetched from libclang once per translation unit, instead of tokenizing every annotation.
+    """
+
+    def __init__(self, statistics: Optional[TraversalStatistics] = None) -> None:
+        self._file_contents: Dict[str, Optional[bytes]] = {}
+        self.statistics = statistics if statistics is not None else TraversalStatistics()
+
+    def read(self, cursor: clang_index.Cursor) -> Tuple[str, str, List[str]]:
+        extent = cursor.extent
+        start = extent.start
+        source_file = start.file
+        if source_file is None:
+            return fetch_annotation_tokens(cursor)
+
+        file_name = source_file.name
+        if file_name not in self._file_contents:
+            self.statistics.file_reads += 1
+            self._file_contents[file_name] = _file_contents(cursor.translation_unit, source_file)
+        contents = self._file_contents[file_name]
+        if contents is None:
+            self.statistics.get_tokens_calls += 1
+            return fetch_annotation_tokens(cursor)
+
+        text = contents[start.offset : extent.end.offset].decode("utf-8", errors="replace")
+        tokens = (match.group() for match in _ANNOTATION_TOKEN_PATTERN.finditer(text) if match.lastgroup != "skip")
+        return _annotation_parts(_split_annotation_tokens(tokens), start)
+
+
+class _Scope(NamedTuple):
+    namespace: str
+    # Field cursors of the class whose body is walked, None outside of a class body
+    fields: Optional[List[clang_index.Cursor]] = None
+
+
+class CollectedClass(NamedTuple):
+    full_name: str
+    namespace: str
+    cursor: clang_index.Cursor
+    field_cursors: List[clang_index.Cursor]
+
+
+def has_any_annotation(annotations: Iterable[AnnotationDescriptor], names: Optional[Collection[str]]) -> bool:
+    return names is None or any(annotation.name in names for annotation in annotations)
+
+
+class SourceModelVisitor:
+    """Collects annotations, classes and their fields in a single traversal
+
+    The descriptors are built once the annotations are known, only for the classes and fields the extraction keeps.
+    """
+
+    def __init__(
+        self,
+        scope_fn: Callable[[clang_index.Cursor], bool] = lambda _: True,
+        annotation_names: Optional[Collection[str]] = None,
+        statistics: Optional[TraversalStatistics] = None,
+        extraction: Optional[Extraction] = None,
+    ) -> None:
+        self._scope_fn = scope_fn
+        # Macros which are tokenized as annotations, all of them if not set
+        self._annotation_names = annotation_names
+        self.extraction = extraction if extraction is not None else Extraction()
+        self.statistics = statistics if statistics is not None else TraversalStatistics()
+        self._annotation_reader = AnnotationReader(self.statistics)
+        self.annotation_map: Dict[str, List[AnnotationDescriptor]] = defaultdict(list)
+        self.classes: List[CollectedClass] = []
+
+    def visit(self, cursor: clang_index.Cursor, namespace: str = ""):
+        visit_fn = self._dispatch_table.get(cursor.kind)
+        if visit_fn is not None:
+            scope = visit_fn(self, cursor, _Scope(namespace))
+            if scope is not None:
+                walk_cursors(cursor, self._visit_child, scope)
+
+    def _visit_child(self, cursor: clang_index.Cursor, scope: _Scope) -> Optional[_Scope]:
+        self.statistics.cursors += 1
+        kind = cursor.kind
+        if kind is clang_index.CursorKind.FIELD_DECL:
+            # Fields are collected from the body of a class only, which is in scope already
+            return self.visit_field(cursor, scope) if scope.fields is not None else None
+        # Kinds which cannot hold a class or an annotation are pruned before their location is looked up
+        visit_fn = self._dispatch_table.get(kind)
+        if visit_fn is None or not self._scope_fn(cursor):
+            return None
+        return visit_fn(self, cursor, scope)
+
+    def visit_annotation(self, cursor: clang_index.Cursor, scope: _Scope) -> None:
+        if self._annotation_names is None or cursor.spelling in self._annotation_names:
+            self.statistics.annotations += 1
+            (name, target, arguments) = self._annotation_reader.read(cursor)
+            self.annotation_map[scope.namespace + "::" + target].append(
+                AnnotationDescriptor(arguments=arguments, name=name)
+            )
+
+    def visit_namespace(self, cursor: clang_index.Cursor, scope: _Scope) -> _Scope:
+        return _Scope(f"{scope.namespace}::{cursor.spelling}")
+
+    def visit_class(self, cursor: clang_index.Cursor, scope: _Scope) -> Optional[_Scope]:
+        if not cursor.is_definition():
+            # A forward declaration, the class is defined elsewhere, maybe in another header
+            return None
+        namespace = scope.namespace
+        field_cursors: List[clang_index.Cursor] = []
+        self.classes.append(CollectedClass(f"{namespace}::{cursor.spelling}", namespace, cursor, field_cursors))
+        # Nested classes keep the namespace of the enclosing one
+        return _Scope(namespace, field_cursors)
+
+    def visit_field(self, cursor: clang_index.Cursor, scope: _Scope) -> _Scope:
+        scope.fields.append(cursor)
+        # Elaborated type specifiers (`struct A* a;`) declare classes inside of fields
+        return _Scope(scope.namespace)
+
+    def visit_children(self, cursor: clang_index.Cursor, scope: _Scope) -> _Scope:
+        return _Scope(scope.namespace)
+
+    # Every other kind, like functions, methods, enums, typedefs or macro definitions, is not traversed. A typedef or
+    # an alias of a class defined in place (`typedef struct {} T;`) would visit the class a second time.
+    _dispatch_table: Dict[
+        clang_index.CursorKind, Callable[["SourceModelVisitor", clang_index.Cursor, _Scope], Optional[_Scope]]
+    ] = {
+        clang_index.CursorKind.MACRO_INSTANTIATION: visit_annotation,
+        clang_index.CursorKind.CLASS_DECL: visit_class,
+        clang_index.CursorKind.STRUCT_DECL: visit_class,
+        clang_index.CursorKind.NAMESPACE: visit_namespace,
+        clang_index.CursorKind.TRANSLATION_UNIT: visit_children,
+        # `extern "C" {}`
+        clang_index.CursorKind.LINKAGE_SPEC: visit_children,
+        clang_index.CursorKind.UNEXPOSED_DECL: visit_children,
+        # Classes nested in these were collected before
+        clang_index.CursorKind.UNION_DECL: visit_children,
+        clang_index.CursorKind.CLASS_TEMPLATE: visit_children,
+        clang_index.CursorKind.CLASS_TEMPLATE_PARTIAL_SPECIALIZATION: visit_children,
+    }
+
+    def build_field(self, full_name: str, cursor: clang_index.Cursor) -> Optional[FieldTypeDescriptor]:
+        name = cursor.spelling
+        annotations = tuple(self.annotation_map.get(f"{full_name}::{name}", ()))
+        if not has_any_annotation(annotations, self.extraction.field_annotations):
+            return None
+        return FieldTypeDescriptor(
+            name=name,
+            access_specifier=find_access_specifier(cursor.access_specifier),
+            annotations=annotations,
+            # Printing a type is the most expensive lookup of a field
+            type=cursor.type.spelling if self.extraction.field_types else "",
+        )
+
+    def build_class(self, collected_class: CollectedClass) -> Optional[ClassTypeDescriptor]:
+        annotations = tuple(self.annotation_map.get(collected_class.full_name, ()))
+        if not has_any_annotation(annotations, self.extraction.class_annotations):
+            return None
+        fields = (self.build_field(collected_class.full_name, cursor) for cursor in collected_class.field_cursors)
+        return ClassTypeDescriptor(
+            namespace=collected_class.namespace if collected_class.namespace else "::",
+            name=collected_class.cursor.spelling,
+            access_specifier=find_access_specifier(collected_class.cursor.access_specifier),
+            annotations=annotations,
+            fields=tuple(field for field in fields if field is not None),
+        )
+
+    def build_source_model(self) -> SourceModel:
+        # Annotations may follow the declarations they refer to, so they are resolved once everything is collected
+        class_types = (self.build_class(collected_class) for collected_class in self.classes)
+        return SourceModel(
+            class_types=[class_type for class_type in class_types if class_type is not None],
+            function_types=[],
+        )
+
+
+# ---
 
 
 def parse_function_types(
@@ -204,31 +449,65 @@ def parse_function_types(
     return []
 
 
+def visit_source_model(
+    translation_unit: clang_index.TranslationUnit,
+    scope_fn: Callable[[clang_index.Cursor], bool] = lambda _: True,
+    annotation_names: Optional[Collection[str]] = None,
+    statistics: Optional[TraversalStatistics] = None,
+    extraction: Optional[Extraction] = None,
+) -> SourceModelVisitor:
+    """Walks the translation unit, the visitor holds the cursors of the classes and fields and the annotations"""
+    visitor = SourceModelVisitor(scope_fn, annotation_names, statistics, extraction)
+    visitor.visit(translation_unit.cursor)
+    return visitor
+
+
+def collect_source_model(
+    translation_unit: clang_index.TranslationUnit,
+    scope_fn: Callable[[clang_index.Cursor], bool] = lambda _: True,
+    annotation_names: Optional[Collection[str]] = None,
+    statistics: Optional[TraversalStatistics] = None,
+    extraction: Optional[Extraction] = None,
+) -> SourceModel:
+    """Builds the unfiltered model of the translation unit, the template filters are applied on it afterwards"""
+    return visit_source_model(translation_unit, scope_fn, annotation_names, statistics, extraction).build_source_model()
+
+
+def collect_cursors_source_model(
+    cursors: Iterable[clang_index.Cursor],
+    scope_fn: Callable[[clang_index.Cursor], bool] = lambda _: True,
+    annotation_names: Optional[Collection[str]] = None,
+    statistics: Optional[TraversalStatistics] = None,
+    extraction: Optional[Extraction] = None,
+) -> SourceModel:
+    """Builds the unfiltered model of some top level cursors, like the ones of a header of a unity translation unit"""
+    visitor = SourceModelVisitor(scope_fn, annotation_names, statistics, extraction)
+    for cursor in cursors:
+        visitor.statistics.cursors += 1
+        visitor.visit(cursor)
+    return visitor.build_source_model()
+
+
 def parse_source_model(
     translation_unit: clang_index.TranslationUnit,
-    filter_fn: Callable[[clang_index.Cursor], bool] = lambda _: True,
+    filter_fn: Callable[[Descriptor], bool] = lambda _: True,
+    scope_fn: Callable[[clang_index.Cursor], bool] = lambda _: True,
+    annotation_names: Optional[Collection[str]] = None,
 ) -> SourceModel:
     if translation_unit:
-        annotation_map = parse_annotations(translation_unit, filter_fn)
-
-        return SourceModel(
-            class_types=parse_class_types(translation_unit, annotation_map, filter_fn),
-            function_types=parse_function_types(
-                translation_unit, annotation_map, filter_fn
-            ),
-        )
+        return filter_source_model(collect_source_model(translation_unit, scope_fn, annotation_names), filter_fn)
     return None
 
 
 # ---
-def _debug_walk_source_model(cursor: clang_index.Cursor, indent=""):
-    if not str(cursor.spelling).startswith("_"):
-        LOGGER.debug(
-            f"{indent} {cursor.spelling} \t {cursor.kind} [{' '.join([j.spelling for j in cursor.get_tokens()])}]"
-        )
-        for child in cursor.get_children():
-            _debug_walk_source_model(child, indent=indent + "  ")
+def _debug_log_cursor(cursor: clang_index.Cursor, indent: str) -> Optional[str]:
+    if str(cursor.spelling).startswith("_"):
+        return None
+    LOGGER.debug(f"{indent} {cursor.spelling} \t {cursor.kind} [{' '.join([j.spelling for j in cursor.get_tokens()])}]")
+    return indent + "  "
 
 
 def debug_walk_source_model(translation_unit: clang_index.TranslationUnit):
-    _debug_walk_source_model(translation_unit.cursor)
+    indent = _debug_log_cursor(translation_unit.cursor, "")
+    if indent is not None:
+        walk_cursors(translation_unit.cursor, _debug_log_cursor, indent)
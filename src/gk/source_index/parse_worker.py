@@ -0,0 +1,503 @@
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from collections import defaultdict
+from dataclasses import dataclass, field
+import dataclasses
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
+import pathlib
+import re
+import traceback
+
+import logging
+
+import clang.cindex as clang_index
+
+from gk.source_index import lazy_model
+from gk.source_index import parse_source
+from gk.source_index import profiling
+from gk.source_index.config import Extraction, TemplateConfig, UnannotatedHeaders
+from gk.source_index.model import SourceModel
+
+LOGGER = logging.getLogger(__name__)
+
+CLANG_PARSE_OPTIONS = (
+    clang_index.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD
+    | clang_index.TranslationUnit.PARSE_SKIP_FUNCTION_BODIES
+    | clang_index.TranslationUnit.PARSE_INCOMPLETE
+)
+
+CLANG_ARGS = ["-std=c++11"]
+
+
+@dataclass
+class ParseResult:
+    header_file: pathlib.Path
+    # One model per template config, in the order of the app config; none if the header was skipped by the pre-scan
+    source_models: List[SourceModel] = field(default_factory=list)
+    # The header and its include closure
+    dependencies: List[pathlib.Path] = field(default_factory=list)
+    error: Optional[str] = None
+    # Timings of the parse in the process which did it, the results loaded from a cache have none
+    spans: List[profiling.Span] = field(default_factory=list)
+
+
+@dataclass
+class Preamble:
+    """Precompiled header of the common includes, built once per run and loaded by every translation unit"""
+
+    pch_file: pathlib.Path
+    # Include closure of the preamble, translation units loading the PCH do not report these files
+    dependencies: List[pathlib.Path] = field(default_factory=list)
+    # clang refuses a PCH built with other language options or macros, translation units with other arguments do
+    # not load it
+    build_args: List[str] = field(default_factory=lambda: list(CLANG_ARGS))
+
+    @property
+    def clang_args(self) -> List[str]:
+        return ["-include-pch", str(self.pch_file)]
+
+
+def translation_unit_args(clang_args: Optional[List[str]], preamble: Optional[Preamble] = None) -> List[str]:
+    clang_args = clang_args if clang_args is not None else CLANG_ARGS
+    if preamble is not None and preamble.build_args == clang_args:
+        return clang_args + preamble.clang_args
+    return clang_args
+
+
+def log_errors(translation_unit: clang_index.TranslationUnit):
+    # PARSE_INCOMPLETE keeps going after errors, like unresolved includes, whose declarations are then missing
+    errors = [
+        diagnostic
+        for diagnostic in translation_unit.diagnostics
+        if diagnostic.severity >= clang_index.Diagnostic.Error
+    ]
+    if errors:
+        LOGGER.warning(
+            f"{translation_unit.spelling}: {len(errors)} errors, the model may be incomplete; first: "
+            f"{errors[0].location.file}:{errors[0].location.line}: {errors[0].spelling}"
+        )
+
+
+def create_translation_unit(
+    clang_index_parser: clang_index.Index,
+    source_path: pathlib.Path,
+    preamble: Optional[Preamble] = None,
+    clang_args: Optional[List[str]] = None,
+) -> clang_index.TranslationUnit:
+    if not source_path.exists():
+        raise RuntimeError(f"Cannot open file {source_path}")
+
+    LOGGER.info(f"Creating translation unit for {source_path}")
+    return clang_index_parser.parse(
+        str(source_path),
+        args=translation_unit_args(clang_args, preamble),
+        options=CLANG_PARSE_OPTIONS,
+    )
+
+
+def find_dependencies(
+    translation_unit: clang_index.TranslationUnit, preamble: Optional[Preamble] = None
+) -> List[pathlib.Path]:
+    main_file = pathlib.Path(translation_unit.spelling).absolute()
+    # System headers are reported like `/usr/bin/../lib/gcc/...`, a lexical normalization breaks on symlinks
+    includes = {
+        pathlib.Path(os.path.realpath(file_inclusion.include.name))
+        for file_inclusion in translation_unit.get_includes()
+    }
+    if preamble is not None:
+        includes.update(preamble.dependencies)
+    includes.discard(main_file)
+    return [main_file] + sorted(includes)
+
+
+def _scope_key(template_config: TemplateConfig) -> Tuple:
+    return (
+        bool(template_config.traverse_included_files),
+        tuple(template_config.allowed_path_prefixes or []),
+    )
+
+
+def is_main_file_scope(template_configs: List[TemplateConfig]) -> bool:
+    return all(_scope_key(template_config) == (False, ()) for template_config in template_configs)
+
+
+def _annotation_names(template_configs: List[TemplateConfig]) -> Optional[Set[str]]:
+    # A template without annotation filter accepts any macro as an annotation
+    if not all(template_config.filter_annotations for template_config in template_configs):
+        return None
+    return {name for template_config in template_configs for name in template_config.filter_annotations}
+
+
+def _union(values: List[Optional[List[str]]]) -> Optional[List[str]]:
+    # Not set means every one
+    if any(value is None for value in values):
+        return None
+    return sorted({name for value in values for name in value})
+
+
+def _extraction(template_configs: List[TemplateConfig]) -> Extraction:
+    """What the templates of a traversal scope read together"""
+    extractions = [template_config.extraction or Extraction() for template_config in template_configs]
+    return Extraction(
+        class_annotations=_union([extraction.class_annotations for extraction in extractions]),
+        field_annotations=_union([extraction.field_annotations for extraction in extractions]),
+        field_types=any(extraction.field_types for extraction in extractions),
+    )
+
+
+def build_source_models(
+    translation_unit: clang_index.TranslationUnit,
+    template_configs: List[TemplateConfig],
+    statistics: Optional[parse_source.TraversalStatistics] = None,
+    lazy: bool = False,
+) -> List[SourceModel]:
+    """Walks the AST once per distinct traversal scope, then filters the model for every template
+
+    Lazy models are filtered for every template while they are resolved, they need the translation unit until then.
+    """
+    scopes: Dict[Tuple, List[TemplateConfig]] = defaultdict(list)
+    for template_config in template_configs:
+        scopes[_scope_key(template_config)].append(template_config)
+
+    unfiltered_models: Dict[Tuple, SourceModel] = {}
+    visitors: Dict[Tuple, parse_source.SourceModelVisitor] = {}
+    for scope_key, scope_template_configs in scopes.items():
+        scope_filter = parse_source.build_scope_filter(**scope_template_configs[0].to_dict())
+        walk_args = (
+            translation_unit,
+            scope_filter,
+            _annotation_names(scope_template_configs),
+            statistics,
+            _extraction(scope_template_configs),
+        )
+        if lazy:
+            visitors[scope_key] = parse_source.visit_source_model(*walk_args)
+        else:
+            unfiltered_models[scope_key] = parse_source.collect_source_model(*walk_args)
+
+    if lazy:
+        return [
+            lazy_model.lazy_source_model(
+                visitors[_scope_key(template_config)], parse_source.build_filter(**template_config.to_dict())
+            )
+            for template_config in template_configs
+        ]
+    return _filter_source_models(unfiltered_models, template_configs)
+
+
+def resolve_models(result: ParseResult) -> ParseResult:
+    """Replaces the lazy models of the result with eager ones"""
+    result.source_models = [lazy_model.resolve_source_model(source_model) for source_model in result.source_models]
+    return result
+
+
+def _filter_source_models(
+    unfiltered_models: Dict[Tuple, SourceModel], template_configs: List[TemplateConfig]
+) -> List[SourceModel]:
+    source_models = []
+    for template_config in template_configs:
+        parsing_filter = parse_source.build_filter(**template_config.to_dict())
+        source_models.append(
+            parse_source.filter_source_model(unfiltered_models[_scope_key(template_config)], parsing_filter)
+        )
+    return source_models
+
+
+def parse_header(
+    clang_index_parser: clang_index.Index,
+    header_file: pathlib.Path,
+    template_configs: List[TemplateConfig],
+    preamble: Optional[Preamble] = None,
+    clang_args: Optional[List[str]] = None,
+    lazy: bool = False,
+) -> ParseResult:
+    spans: List[profiling.Span] = []
+    try:
+        with profiling.measure(spans, "parse", str(header_file)):
+            translation_unit = create_translation_unit(clang_index_parser, header_file, preamble, clang_args)
+        log_errors(translation_unit)
+
+        LOGGER.info(f"Parsing {header_file}")
+        with profiling.measure(spans, "scan", str(header_file)) as span:
+            statistics = parse_source.TraversalStatistics()
+            source_models = build_source_models(translation_unit, template_configs, statistics, lazy)
+            span.counters.update(dataclasses.asdict(statistics))
+
+        with profiling.measure(spans, "dependencies", str(header_file)):
+            dependencies = find_dependencies(translation_unit, preamble)
+
+        return ParseResult(
+            header_file=header_file, source_models=source_models, dependencies=dependencies, spans=spans
+        )
+    except Exception as e:
+        LOGGER.debug(traceback.format_exc())
+        return ParseResult(header_file=header_file, error=str(e), spans=spans)
+
+
+def parse_headers(
+    header_files: List[pathlib.Path],
+    template_configs: List[TemplateConfig],
+    preamble: Optional[Preamble] = None,
+    clang_args: Optional[Dict[pathlib.Path, List[str]]] = None,
+    lazy: bool = False,
+) -> Iterator[ParseResult]:
+    """Parses the headers one by one; a translation unit is released before the next header is parsed, unless the
+    lazy models of the header are still referenced
+    """
+    clang_index_parser = clang_index.Index.create()
+    for header_file in header_files:
+        yield parse_header(
+            clang_index_parser, header_file, template_configs, preamble, (clang_args or {}).get(header_file), lazy
+        )
+
+
+# --- Pre-scan
+# A header whose text does not name any of the annotation macros has no annotation in its models, it does not need to
+# be parsed for templates which only render annotated declarations. Comments naming a macro merely cost a parse.
+
+
+def annotation_pattern(template_configs: List[TemplateConfig]) -> Optional[re.Pattern]:
+    """Matches the annotation macros of the templates, None if the annotations are not all in the header itself"""
+    annotation_names = _annotation_names(template_configs)
+    if annotation_names is None or not is_main_file_scope(template_configs):
+        return None
+    return re.compile(rb"\b(?:" + b"|".join(re.escape(name.encode()) for name in sorted(annotation_names)) + rb")\b")
+
+
+def has_annotations(header_file: pathlib.Path, pattern: re.Pattern) -> bool:
+    try:
+        with open(header_file, "rb") as f:
+            # Empty files cannot be mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as contents:
+                return pattern.search(contents) is not None
+    except OSError:
+        # The parse reports the error
+        return True
+
+
+def unannotated_result(
+    header_file: pathlib.Path, template_configs: List[TemplateConfig], unannotated_headers: UnannotatedHeaders
+) -> ParseResult:
+    source_models = (
+        [SourceModel(class_types=[], function_types=[]) for _ in template_configs]
+        if unannotated_headers is UnannotatedHeaders.EMPTY
+        else []
+    )
+    return ParseResult(header_file=header_file, source_models=source_models, dependencies=[header_file])
+
+
+# --- Unity translation units
+# Many small headers including the same heavy headers are parsed in a single translation unit including all of them.
+# The top level cursors are split by their file, so every header gets the same models as if it was parsed alone.
+
+
+def supports_unity(template_configs: List[TemplateConfig]) -> bool:
+    # A file included by several headers is parsed once, so it cannot be traversed for each of them
+    return is_main_file_scope(template_configs)
+
+
+def unity_source(header_files: List[pathlib.Path]) -> str:
+    return "".join(f'#include "{header_file.as_posix()}"\n' for header_file in header_files)
+
+
+def _included_file_name(cursor: clang_index.Cursor) -> Optional[str]:
+    try:
+        return cursor.get_included_file().name
+    except AssertionError:
+        # Not found, or a `__has_include` which failed
+        return None
+
+
+def _include_closure(header_file: pathlib.Path, includes: Dict[pathlib.Path, Set[pathlib.Path]]) -> Set[pathlib.Path]:
+    closure: Set[pathlib.Path] = set()
+    pending = [header_file]
+    while pending:
+        for included_file in includes.get(pending.pop(), ()):
+            if included_file not in closure:
+                closure.add(included_file)
+                pending.append(included_file)
+    return closure
+
+
+def parse_unity(
+    clang_index_parser: clang_index.Index,
+    header_files: List[pathlib.Path],
+    template_configs: List[TemplateConfig],
+    preamble: Optional[Preamble] = None,
+    clang_args: Optional[List[str]] = None,
+) -> List[ParseResult]:
+    """Parses the headers in one translation unit; they need include guards, as a header may include another one"""
+    results = {
+        header_file: ParseResult(header_file=header_file, error=f"Cannot open file {header_file}")
+        for header_file in header_files
+        if not header_file.exists()
+    }
+    input_files = header_files
+    header_files = [header_file for header_file in header_files if header_file not in results]
+    if not header_files:
+        return [results[header_file] for header_file in input_files]
+
+    spans: List[profiling.Span] = []
+    try:
+        unity_file = header_files[0].parent / "unity.cpp"
+        with profiling.measure(spans, "parse") as span:
+            LOGGER.info(f"Creating a unity translation unit for {len(header_files)} headers")
+            translation_unit = clang_index_parser.parse(
+                str(unity_file),
+                args=translation_unit_args(clang_args, preamble),
+                unsaved_files=[(str(unity_file), unity_source(header_files))],
+                options=CLANG_PARSE_OPTIONS,
+            )
+            span.counters["headers"] = len(header_files)
+        log_errors(translation_unit)
+
+        # The include directives of the preprocessing record are reported even if the included file was skipped by
+        # its include guard, unlike TranslationUnit.get_includes()
+        with profiling.measure(spans, "split"):
+            header_names = {str(header_file): header_file for header_file in header_files}
+            header_cursors: Dict[pathlib.Path, List[clang_index.Cursor]] = defaultdict(list)
+            includes: Dict[pathlib.Path, Set[pathlib.Path]] = defaultdict(set)
+            for cursor in translation_unit.cursor.get_children():
+                location_file = cursor.location.file
+                if location_file is None:
+                    continue
+                if cursor.kind is clang_index.CursorKind.INCLUSION_DIRECTIVE:
+                    included_file_name = _included_file_name(cursor)
+                    if included_file_name is not None:
+                        includes[pathlib.Path(os.path.realpath(location_file.name))].add(
+                            pathlib.Path(os.path.realpath(included_file_name))
+                        )
+                elif location_file.name in header_names:
+                    header_cursors[header_names[location_file.name]].append(cursor)
+    except Exception as e:
+        LOGGER.debug(traceback.format_exc())
+        for header_file in header_files:
+            results[header_file] = ParseResult(header_file=header_file, error=str(e), spans=spans)
+        return [results[header_file] for header_file in input_files]
+
+    annotation_names = _annotation_names(template_configs)
+    extraction = _extraction(template_configs)
+    for header_file in header_files:
+        header_spans: List[profiling.Span] = []
+        try:
+            with profiling.measure(header_spans, "scan", str(header_file)) as span:
+                header_name = str(header_file)
+
+                def in_header(cursor: clang_index.Cursor) -> bool:
+                    location_file = cursor.location.file
+                    return location_file is not None and location_file.name == header_name
+
+                statistics = parse_source.TraversalStatistics()
+                unfiltered_model = parse_source.collect_cursors_source_model(
+                    header_cursors[header_file], in_header, annotation_names, statistics, extraction
+                )
+                source_models = _filter_source_models({(False, ()): unfiltered_model}, template_configs)
+                span.counters.update(dataclasses.asdict(statistics))
+
+            with profiling.measure(header_spans, "dependencies", str(header_file)):
+                dependencies = _include_closure(pathlib.Path(os.path.realpath(header_file)), includes)
+                if preamble is not None:
+                    dependencies.update(preamble.dependencies)
+                dependencies.discard(header_file)
+
+            results[header_file] = ParseResult(
+                header_file=header_file,
+                source_models=source_models,
+                dependencies=[header_file] + sorted(dependencies),
+                spans=header_spans,
+            )
+        except Exception as e:
+            LOGGER.debug(traceback.format_exc())
+            results[header_file] = ParseResult(header_file=header_file, error=str(e), spans=header_spans)
+
+    # The parse of the translation unit is reported once
+    results[header_files[0]].spans[:0] = spans
+    return [results[header_file] for header_file in input_files]
+
+
+# --- Process pool
+# Every worker owns a libclang index; only the resulting models travel back to the parent process
+
+_worker_index: Optional[clang_index.Index] = None
+_worker_template_configs: List[TemplateConfig] = []
+_worker_preamble: Optional[Preamble] = None
+
+
+def _initialize_worker(
+    clang_path: Optional[str], template_configs: List[TemplateConfig], preamble: Optional[Preamble]
+):
+    global _worker_index, _worker_template_configs, _worker_preamble
+
+    if clang_path is not None and not clang_index.Config.loaded:
+        clang_index.Config.set_library_path(clang_path)
+
+    _worker_index = clang_index.Index.create()
+    _worker_template_configs = template_configs
+    _worker_preamble = preamble
+
+
+def _parse_header_in_worker(header_file: pathlib.Path, clang_args: Optional[List[str]]) -> ParseResult:
+    return parse_header(_worker_index, header_file, _worker_template_configs, _worker_preamble, clang_args)
+
+
+def parse_headers_parallel(
+    header_files: List[pathlib.Path],
+    template_configs: List[TemplateConfig],
+    jobs: int,
+    clang_path: Optional[str] = None,
+    preamble: Optional[Preamble] = None,
+    clang_args: Optional[Dict[pathlib.Path, List[str]]] = None,
+) -> Iterator[ParseResult]:
+    """Parses the headers in a process pool, yielding the results in the order of the input files"""
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_initialize_worker,
+        initargs=(clang_path, template_configs, preamble),
+    ) as executor:
+        yield from executor.map(
+            _parse_header_in_worker,
+            header_files,
+            [(clang_args or {}).get(header_file) for header_file in header_files],
+        )
+
+
+def _parse_unity_in_worker(header_files: List[pathlib.Path], clang_args: Optional[List[str]]) -> List[ParseResult]:
+    return parse_unity(_worker_index, header_files, _worker_template_configs, _worker_preamble, clang_args)
+
+
+def parse_headers_unity(
+    header_files: List[pathlib.Path],
+    template_configs: List[TemplateConfig],
+    jobs: int,
+    clang_path: Optional[str] = None,
+    preamble: Optional[Preamble] = None,
+    clang_args: Optional[Dict[pathlib.Path, List[str]]] = None,
+) -> Iterator[ParseResult]:
+    """Parses the headers in one unity translation unit per worker and distinct clang arguments"""
+    groups: Dict[Tuple[str, ...], List[pathlib.Path]] = defaultdict(list)
+    for header_file in header_files:
+        groups[tuple((clang_args or {}).get(header_file, CLANG_ARGS))].append(header_file)
+
+    if jobs == 1:
+        clang_index_parser = clang_index.Index.create()
+        for group_args, group_files in groups.items():
+            yield from parse_unity(clang_index_parser, group_files, template_configs, preamble, list(group_args))
+        return
+
+    batches: List[Tuple[List[pathlib.Path], List[str]]] = []
+    for group_args, group_files in groups.items():
+        batch_size = -(-len(group_files) // jobs)
+        batches += [
+            (group_files[start : start + batch_size], list(group_args))
+            for start in range(0, len(group_files), batch_size)
+        ]
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(batches)),
+        initializer=_initialize_worker,
+        initargs=(clang_path, template_configs, preamble),
+    ) as executor:
+        for results in executor.map(_parse_unity_in_worker, *zip(*batches)):
+            yield from results
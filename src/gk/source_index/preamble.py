@@ -0,0 +1,103 @@
+from typing import List, Optional, Tuple
+import pathlib
+import tempfile
+
+import logging
+
+import clang.cindex as clang_index
+
+from gk.source_index import parse_worker
+from gk.source_index import utils
+from gk.source_index.parse_worker import Preamble
+
+LOGGER = logging.getLogger(__name__)
+
+PREAMBLE_HEADER_NAME = "preamble.hpp"
+PREAMBLE_PCH_NAME = "preamble.pch"
+
+
+def include_directive(include: str) -> str:
+    # `<string>` and `"path/header.hpp"` are used as is, a bare name is a system include
+    if include.startswith(("<", '"')):
+        return f"#include {include}"
+    return f"#include <{include}>"
+
+
+def preamble_source(includes: List[str]) -> str:
+    return "".join(f"{include_directive(include)}\n" for include in includes)
+
+
+def build_preamble(
+    clang_index_parser: clang_index.Index,
+    includes: List[str],
+    work_dir: pathlib.Path,
+    clang_args: Optional[List[str]] = None,
+) -> Optional[Preamble]:
+    """Builds a PCH of the includes into the work directory, returns None if clang could not save it"""
+    clang_args = clang_args if clang_args is not None else parse_worker.CLANG_ARGS
+    header_file = work_dir / PREAMBLE_HEADER_NAME
+    pch_file = work_dir / PREAMBLE_PCH_NAME
+    header_file.write_text(preamble_source(includes))
+
+    LOGGER.info(f"Precompiling {len(includes)} common includes")
+    translation_unit = clang_index_parser.parse(
+        str(header_file),
+        args=clang_args + ["-x", "c++-header"],
+        # Without the macro definitions of the preamble, which every translation unit would visit otherwise
+        options=parse_worker.CLANG_PARSE_OPTIONS & ~clang_index.TranslationUnit.PARSE_DETAILED_PROCESSING_RECORD,
+    )
+    try:
+        translation_unit.save(str(pch_file))
+    except clang_index.TranslationUnitSaveError as e:
+        LOGGER.warning(f"Cannot precompile the common includes, parsing without them: {e}")
+        return None
+
+    return Preamble(
+        pch_file=pch_file,
+        dependencies=parse_worker.find_dependencies(translation_unit)[1:],
+        build_args=list(clang_args),
+    )
+
+
+class PreambleCache:
+    """Keeps the PCH between the runs of a long running process, until a file of its include closure changes"""
+
+    def __init__(self) -> None:
+        self._work_dir = tempfile.TemporaryDirectory(prefix="generate-code-")
+        self._includes: List[str] = []
+        self._preamble: Optional[Preamble] = None
+        self._signatures: List[Optional[Tuple[int, int]]] = []
+
+    def __enter__(self) -> "PreambleCache":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def _is_valid(self, includes: List[str], clang_args: List[str]) -> bool:
+        return (
+            self._preamble is not None
+            and includes == self._includes
+            and clang_args == self._preamble.build_args
+            # clang refuses to load a PCH whose inputs changed
+            and self._signatures == [utils.file_signature(dependency) for dependency in self._preamble.dependencies]
+        )
+
+    def get(
+        self, clang_index_parser: clang_index.Index, includes: List[str], clang_args: Optional[List[str]] = None
+    ) -> Optional[Preamble]:
+        clang_args = clang_args if clang_args is not None else parse_worker.CLANG_ARGS
+        if not self._is_valid(includes, clang_args):
+            self._includes = list(includes)
+            self._preamble = build_preamble(
+                clang_index_parser, includes, pathlib.Path(self._work_dir.name), clang_args
+            )
+            self._signatures = (
+                [utils.file_signature(dependency) for dependency in self._preamble.dependencies]
+                if self._preamble is not None
+                else []
+            )
+        return self._preamble
+
+    def close(self):
+        self._work_dir.cleanup()
@@ -0,0 +1,120 @@
+from typing import Dict, Iterator, List, Optional
+from collections import defaultdict
+from dataclasses import dataclass, field
+import contextlib
+import json
+import os
+import pathlib
+import time
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """Wall and CPU time of a stage of the code generation, of a header and a template if it belongs to one"""
+
+    stage: str
+    # time.perf_counter() is system wide, so the spans of the worker processes line up with the ones of the parent
+    start: float
+    wall: float = 0.0
+    cpu: float = 0.0
+    pid: int = 0
+    header: Optional[str] = None
+    template: Optional[str] = None
+    counters: Dict[str, int] = field(default_factory=dict)
+
+
+@contextlib.contextmanager
+def measure(
+    spans: List[Span], stage: str, header: Optional[str] = None, template: Optional[str] = None
+) -> Iterator[Span]:
+    span = Span(stage=stage, start=time.perf_counter(), pid=os.getpid(), header=header, template=template)
+    cpu_start = time.process_time()
+    try:
+        yield span
+    finally:
+        span.wall = time.perf_counter() - span.start
+        span.cpu = time.process_time() - cpu_start
+        spans.append(span)
+
+
+class Profiler:
+    """Collects the spans of a run; only a few spans are recorded per header, so it is always on"""
+
+    def __init__(self) -> None:
+        self.spans: List[Span] = []
+
+    def measure(self, stage: str, header: Optional[str] = None, template: Optional[str] = None):
+        return measure(self.spans, stage, header, template)
+
+    def add(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+    def summary(self, slowest_count: int = 10) -> str:
+        stage_times: Dict[str, List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+        template_times: Dict[str, float] = defaultdict(float)
+        header_times: Dict[str, float] = defaultdict(float)
+        counters: Dict[str, int] = defaultdict(int)
+        for span in self.spans:
+            stage_time = stage_times[span.stage]
+            stage_time[0] += 1
+            stage_time[1] += span.wall
+            stage_time[2] += span.cpu
+            if span.template is not None:
+                template_times[span.template] += span.wall
+            if span.header is not None:
+                header_times[span.header] += span.wall
+            for name, value in span.counters.items():
+                counters[name] += value
+
+        lines = [f"{'stage':<16} {'count':>7} {'wall [ms]':>12} {'cpu [ms]':>12}"]
+        for stage, (count, wall, cpu) in stage_times.items():
+            lines.append(f"{stage:<16} {count:>7} {wall * 1000:>12.1f} {cpu * 1000:>12.1f}")
+
+        if template_times:
+            lines += ["", f"{'template':<48} {'wall [ms]':>12}"]
+            for template, wall in sorted(template_times.items(), key=lambda item: item[1], reverse=True):
+                lines.append(f"{template:<48} {wall * 1000:>12.1f}")
+
+        if header_times:
+            lines += ["", f"{'slowest headers':<80} {'wall [ms]':>12}"]
+            for header, wall in sorted(header_times.items(), key=lambda item: item[1], reverse=True)[:slowest_count]:
+                lines.append(f"{header:<80} {wall * 1000:>12.1f}")
+
+        if counters:
+            lines += ["", *(f"{name}: {value}" for name, value in counters.items())]
+
+        return "\n".join(lines)
+
+    def chrome_trace(self) -> Dict:
+        """Trace Event Format, opens in chrome://tracing or Perfetto"""
+        start = min((span.start for span in self.spans), default=0.0)
+        return {
+            "traceEvents": [
+                {
+                    "name": span.stage if span.header is None else f"{span.stage} {pathlib.Path(span.header).name}",
+                    "cat": span.stage,
+                    "ph": "X",
+                    "ts": (span.start - start) * 1e6,
+                    "dur": span.wall * 1e6,
+                    "pid": span.pid,
+                    "tid": span.pid,
+                    "args": {
+                        "header": span.header,
+                        "template": span.template,
+                        "cpu_ms": span.cpu * 1000,
+                        **span.counters,
+                    },
+                }
+                for span in self.spans
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, trace_file: pathlib.Path):
+        LOGGER.info(f"Writing profile trace to {trace_file}")
+        trace_file.parent.mkdir(parents=True, exist_ok=True)
+        trace_file.write_text(json.dumps(self.chrome_trace()))
@@ -0,0 +1,91 @@
+from typing import Dict, List, Tuple
+import pathlib
+
+import logging
+
+from gk.source_index.model import ClassTypeDescriptor, FunctionTypeDescriptor, SourceModel
+from gk.source_index.parse_worker import ParseResult
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DuplicateDefinitionError(ValueError):
+    pass
+
+
+def merge_source_models(source_models: List[Tuple[pathlib.Path, SourceModel]]) -> SourceModel:
+    """Merges the models of the headers in their order
+
+    A class seen by several headers (like one of a shared include) is listed once, two different classes of the same
+    qualified name are an error.
+    """
+    class_types: Dict[str, Tuple[pathlib.Path, ClassTypeDescriptor]] = {}
+    function_types: List[FunctionTypeDescriptor] = []
+    for header_file, source_model in source_models:
+        for class_type in source_model.class_types:
+            qualified_name = class_type.qualified_name
+            defined = class_types.get(qualified_name)
+            if defined is None:
+                class_types[qualified_name] = (header_file, class_type)
+            elif defined[1] != class_type:
+                raise DuplicateDefinitionError(
+                    f"{qualified_name} is defined differently in {defined[0]} and in {header_file}"
+                )
+        for function_type in source_model.function_types:
+            # Overloads have the same name, only identical declarations are merged
+            if function_type not in function_types:
+                function_types.append(function_type)
+
+    return SourceModel(
+        class_types=[class_type for _, class_type in class_types.values()],
+        function_types=function_types,
+    )
+
+
+class ProjectModel:
+    """The models of every input header, merged into one model per template for the aggregate templates
+
+    Long running processes keep it between the runs: a run updates the headers it parsed or loaded from the model
+    cache, the other headers keep their models, and the merged models are built again only once a header changed.
+    """
+
+    def __init__(self) -> None:
+        self._results: Dict[pathlib.Path, ParseResult] = {}
+        self._merged_models: Dict[Tuple[int, Tuple[pathlib.Path, ...]], SourceModel] = {}
+
+    def update(self, result: ParseResult):
+        if not result.source_models:
+            # Skipped by the pre-scan, the header is not part of the project any more
+            if self._results.pop(result.header_file, None) is not None:
+                self._merged_models.clear()
+            return
+        previous_result = self._results.get(result.header_file)
+        if previous_result is None or previous_result.source_models != result.source_models:
+            self._merged_models.clear()
+        self._results[result.header_file] = result
+
+    @property
+    def header_files(self) -> List[pathlib.Path]:
+        # Results arrive in the order of the workers and of the cache hits, the merged models must not depend on it
+        return sorted(self._results.keys())
+
+    def dependencies(self, header_files: List[pathlib.Path]) -> List[pathlib.Path]:
+        return list(
+            dict.fromkeys(
+                dependency for header_file in header_files for dependency in self._results[header_file].dependencies
+            )
+        )
+
+    def source_model(self, template_index: int, header_files: List[pathlib.Path]) -> SourceModel:
+        """The merged model of the template, every header has to be updated before"""
+        key = (template_index, tuple(header_files))
+        merged_model = self._merged_models.get(key)
+        if merged_model is None:
+            LOGGER.debug(f"Merging the models of {len(header_files)} headers")
+            merged_model = self._merged_models[key] = merge_source_models(
+                [
+                    (header_file, self._results[header_file].source_models[template_index])
+                    for header_file in header_files
+                ]
+            )
+        return merged_model
@@ -0,0 +1,175 @@
+from typing import Dict, List, Optional, Tuple
+import contextlib
+import json
+import os
+import pathlib
+import signal
+import socketserver
+import sys
+import threading
+
+import logging
+
+import clang.cindex as clang_index
+import jinja2
+
+from gk.source_index import config
+from gk.source_index import main
+from gk.source_index import model_cache
+from gk.source_index import preamble
+from gk.source_index import templating_tools
+
+LOGGER = logging.getLogger(__name__)
+
+# Requests and replies are JSON documents, one per line:
+#   client: {"argv": [...], "cwd": "..."} or {"shutdown": true}
+#   daemon: {"stdout": "..."}, {"stderr": "..."}, ... then {"exit_code": 0}
+
+
+class _MessageWriter:
+    """File like object sending everything written to it as a message of the given stream"""
+
+    def __init__(self, wfile, stream: str) -> None:
+        self._wfile = wfile
+        self._stream = stream
+
+    def write(self, text: str) -> int:
+        if text:
+            self._wfile.write(json.dumps({self._stream: text}).encode("utf-8") + b"\n")
+        return len(text)
+
+    def flush(self):
+        self._wfile.flush()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: "GeneratorServer"
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+
+        if request.get("shutdown"):
+            LOGGER.info("Shutting down")
+            self._reply({"exit_code": 0})
+            # serve_forever() waits for the handler to return, shutdown() has to be called from another thread
+            threading.Thread(target=self.server.shutdown).start()
+            return
+
+        stdout = _MessageWriter(self.wfile, "stdout")
+        log_handler = logging.StreamHandler(stdout)
+        log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        root_logger = logging.getLogger()
+        root_logger.addHandler(log_handler)
+
+        work_dir = os.getcwd()
+        try:
+            # Requests are served one by one, so the working directory of the client can be borrowed
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(_MessageWriter(self.wfile, "stderr")):
+                exit_code = self.server.run(request["argv"])
+        finally:
+            os.chdir(work_dir)
+            root_logger.removeHandler(log_handler)
+
+        self._reply({"exit_code": exit_code})
+
+    def _reply(self, message: Dict):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class GeneratorServer(socketserver.UnixStreamServer):
+    """Runs generate-code requests in one process
+
+    libclang stays loaded, Jinja environments are kept per config directory (they recompile a template once its file
+    changes), the models are kept in a memory cache per template configuration, and the precompiled preambles per
+    list of includes.
+    """
+
+    def __init__(self, socket_path: pathlib.Path) -> None:
+        super().__init__(str(socket_path), _RequestHandler)
+        self._jinja_environments: Dict[Tuple[pathlib.Path, Optional[pathlib.Path]], jinja2.Environment] = {}
+        self._model_caches: Dict[str, model_cache.MemoryModelCache] = {}
+        self._preamble_caches: Dict[Tuple[str, ...], preamble.PreambleCache] = {}
+
+    def jinja_environment(self, root_dir: pathlib.Path, cache_dir: Optional[pathlib.Path]) -> jinja2.Environment:
+        key = (root_dir.absolute(), cache_dir.absolute() if cache_dir is not None else None)
+        if key not in self._jinja_environments:
+            self._jinja_environments[key] = templating_tools.build_jinja_environment(*key)
+        return self._jinja_environments[key]
+
+    def model_cache(self, app_config: config.AppConfig, args) -> model_cache.MemoryModelCache:
+        context = model_cache.cache_context(app_config.templates, main.model_cache_clang_args(app_config, args))
+        memory_cache = self._model_caches.setdefault(context, model_cache.MemoryModelCache())
+        # The persistent cache and the statistics belong to the request
+        memory_cache.backing_cache = main.create_model_cache(app_config, args)
+        memory_cache.statistics = model_cache.CacheStatistics()
+        return memory_cache
+
+    def preamble_cache(self, app_config: config.AppConfig) -> preamble.PreambleCache:
+        includes = tuple(app_config.precompiled_includes)
+        if includes not in self._preamble_caches:
+            self._preamble_caches[includes] = preamble.PreambleCache()
+        return self._preamble_caches[includes]
+
+    def server_close(self):
+        super().server_close()
+        for preamble_cache in self._preamble_caches.values():
+            preamble_cache.close()
+
+    def run(self, argv: List[str]) -> int:
+        try:
+            args = main.parse_args(argv)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 1
+
+        try:
+            config_path = pathlib.Path(args.config_path)
+            app_config = config.load_app_config(config_path)
+
+            if args.is_list_outputs:
+                for output_file in main.list_outputs(app_config, args):
+                    print(output_file.as_posix())
+                return 0
+
+            if args.clang_path is not None:
+                LOGGER.debug(f"libclang is already loaded, ignoring --clang-path {args.clang_path}")
+
+            root_dir = pathlib.Path(config_path.parent)
+            j2_env = (
+                self.jinja_environment(root_dir, main.template_cache_dir(args)) if not args.is_export_json else None
+            )
+            # Parsed again per request, Jinja only reloads the templates which changed
+            app_config = main.analyze_templates(app_config, j2_env)
+            main.execute(
+                app_config,
+                args,
+                root_dir,
+                j2_env=j2_env,
+                cache=self.model_cache(app_config, args),
+                preamble_cache=self.preamble_cache(app_config),
+            )
+        except Exception as e:
+            LOGGER.error(f"Error: {e}", exc_info=True)
+            return 1
+        return 0
+
+
+def serve(socket_path: pathlib.Path, clang_path: Optional[str] = None):
+    if clang_path is not None:
+        clang_index.Config.set_library_path(clang_path)
+        LOGGER.info(f"Using clang library path: {clang_path}")
+
+    # Left behind by a daemon which was killed
+    socket_path.unlink(missing_ok=True)
+
+    # Stops serve_forever() with the socket removed, like Ctrl+C does
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        with GeneratorServer(socket_path) as server:
+            LOGGER.info(f"Serving on {socket_path}")
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket_path.unlink(missing_ok=True)
@@ -0,0 +1,159 @@
+#pragma once
+// Declarations of the standard library for parsing with --stub-system-headers: the types of the declarations are
+// spelled like with the real headers, without their cost. Nothing here is meant to be compiled.
+
+typedef decltype(sizeof(0)) size_t;
+typedef decltype(static_cast<int*>(0) - static_cast<int*>(0)) ptrdiff_t;
+typedef signed char int8_t;
+typedef short int16_t;
+typedef int int32_t;
+typedef long long int64_t;
+typedef unsigned char uint8_t;
+typedef unsigned short uint16_t;
+typedef unsigned int uint32_t;
+typedef unsigned long long uint64_t;
+typedef long intptr_t;
+typedef unsigned long uintptr_t;
+typedef long long intmax_t;
+typedef unsigned long long uintmax_t;
+
+#ifdef __cplusplus
+namespace std
+{
+using ::size_t;
+using ::ptrdiff_t;
+using ::int8_t;
+using ::int16_t;
+using ::int32_t;
+using ::int64_t;
+using ::uint8_t;
+using ::uint16_t;
+using ::uint32_t;
+using ::uint64_t;
+using ::intptr_t;
+using ::uintptr_t;
+using ::intmax_t;
+using ::uintmax_t;
+typedef decltype(nullptr) nullptr_t;
+
+template <class T, T V> struct integral_constant { static constexpr T value = V; };
+typedef integral_constant<bool, true> true_type;
+typedef integral_constant<bool, false> false_type;
+template <bool B, class T = void> struct enable_if {};
+template <class T> struct enable_if<true, T> { typedef T type; };
+template <class T, class U> struct is_same : false_type {};
+template <class T> struct is_same<T, T> : true_type {};
+template <class T> struct remove_reference { typedef T type; };
+template <class T> struct remove_reference<T&> { typedef T type; };
+template <class T> struct remove_reference<T&&> { typedef T type; };
+template <class T> struct decay { typedef T type; };
+template <class T> struct numeric_limits {};
+template <class T> typename remove_reference<T>::type&& move(T&& value) noexcept;
+template <class T> T&& forward(typename remove_reference<T>::type& value) noexcept;
+
+template <class T> class initializer_list {};
+template <class T> class allocator {};
+template <class T> struct char_traits {};
+template <class T = void> struct less {};
+template <class T = void> struct equal_to {};
+template <class T> struct hash {};
+template <class T1, class T2> struct pair { T1 first; T2 second; };
+template <class... T> class tuple {};
+
+template <class C, class Traits = char_traits<C>, class Alloc = allocator<C>> class basic_string {};
+typedef basic_string<char> string;
+typedef basic_string<wchar_t> wstring;
+typedef basic_string<char16_t> u16string;
+typedef basic_string<char32_t> u32string;
+template <class C, class Traits = char_traits<C>> class basic_string_view {};
+typedef basic_string_view<char> string_view;
+typedef basic_string_view<wchar_t> wstring_view;
+
+template <class T, class Alloc = allocator<T>> class vector {};
+template <class T, class Alloc = allocator<T>> class deque {};
+template <class T, class Alloc = allocator<T>> class list {};
+template <class T, class Alloc = allocator<T>> class forward_list {};
+template <class T, size_t N> struct array { T elements[N]; };
+template <size_t N> class bitset {};
+template <class K, class V, class Compare = less<K>, class Alloc = allocator<pair<const K, V>>> class map {};
+template <class K, class V, class Compare = less<K>, class Alloc = allocator<pair<const K, V>>> class multimap {};
+template <class K, class Compare = less<K>, class Alloc = allocator<K>> class set {};
+template <class K, class Compare = less<K>, class Alloc = allocator<K>> class multiset {};
+template <class K, class V, class Hash = hash<K>, class Equal = equal_to<K>, class Alloc = allocator<pair<const K, V>>>
+class unordered_map {};
+template <class K, class V, class Hash = hash<K>, class Equal = equal_to<K>, class Alloc = allocator<pair<const K, V>>>
+class unordered_multimap {};
+template <class K, class Hash = hash<K>, class Equal = equal_to<K>, class Alloc = allocator<K>> class unordered_set {};
+template <class K, class Hash = hash<K>, class Equal = equal_to<K>, class Alloc = allocator<K>>
+class unordered_multiset {};
+template <class T, class Container = deque<T>> class queue {};
+template <class T, class Container = deque<T>> class stack {};
+template <class T, class Container = vector<T>, class Compare = less<T>> class priority_queue {};
+
+template <class T> class optional {};
+struct nullopt_t {};
+template <class... T> class variant {};
+struct monostate {};
+class any {};
+
+template <class T> struct default_delete {};
+template <class T, class Deleter = default_delete<T>> class unique_ptr {};
+template <class T> class shared_ptr {};
+template <class T> class weak_ptr {};
+template <class T> class enable_shared_from_this {};
+template <class T> class function;
+template <class R, class... Args> class function<R(Args...)> {};
+template <class T> class reference_wrapper {};
+
+template <class T> struct atomic {};
+class mutex {};
+class recursive_mutex {};
+class shared_mutex {};
+class condition_variable {};
+class thread {};
+template <class T> class future {};
+template <class T> class promise {};
+
+template <long long Num, long long Den = 1> struct ratio {};
+namespace chrono
+{
+template <class Rep, class Period = ratio<1>> class duration {};
+typedef duration<long long, ratio<1, 1000000000>> nanoseconds;
+typedef duration<long long, ratio<1, 1000000>> microseconds;
+typedef duration<long long, ratio<1, 1000>> milliseconds;
+typedef duration<long long> seconds;
+typedef duration<long long, ratio<60>> minutes;
+typedef duration<long long, ratio<3600>> hours;
+template <class Clock, class Duration = typename Clock::duration> class time_point {};
+struct system_clock { typedef nanoseconds duration; };
+struct steady_clock { typedef nanoseconds duration; };
+typedef steady_clock high_resolution_clock;
+} // namespace chrono
+
+class exception {};
+class logic_error : public exception {};
+class runtime_error : public exception {};
+class invalid_argument : public logic_error {};
+class out_of_range : public logic_error {};
+class type_info;
+
+template <class C, class Traits = char_traits<C>> class basic_ios {};
+template <class C, class Traits = char_traits<C>> class basic_istream {};
+template <class C, class Traits = char_traits<C>> class basic_ostream {};
+template <class C, class Traits = char_traits<C>> class basic_iostream {};
+template <class C, class Traits = char_traits<C>, class Alloc = allocator<C>> class basic_stringstream {};
+template <class C, class Traits = char_traits<C>, class Alloc = allocator<C>> class basic_istringstream {};
+template <class C, class Traits = char_traits<C>, class Alloc = allocator<C>> class basic_ostringstream {};
+template <class C, class Traits = char_traits<C>> class basic_fstream {};
+typedef basic_istream<char> istream;
+typedef basic_ostream<char> ostream;
+typedef basic_iostream<char> iostream;
+typedef basic_stringstream<char> stringstream;
+typedef basic_istringstream<char> istringstream;
+typedef basic_ostringstream<char> ostringstream;
+typedef basic_fstream<char> fstream;
+extern istream cin;
+extern ostream cout;
+extern ostream cerr;
+} // namespace std
+#endif
@@ -0,0 +1,2 @@
+#pragma once
+#include "gk_std_stubs.hpp"
@@ -0,0 +1,432 @@
+from typing import Iterable, List, Optional, Set
+
+import jinja2
+from jinja2 import nodes
+
+import logging
+
+from gk.source_index import templating_tools
+from gk.source_index.config import Extraction
+
+LOGGER = logging.getLogger(__name__)
+
+# Finds which parts of the models a template reads from the syntax trees of the template and the templates it
+# includes, imports or extends, so the parser can skip the others. Whatever is not understood, like a descriptor
+# printed as a whole, passed to an unknown filter or looked up by a dynamic name, needs the complete models.
+
+# Variables of the render context which are not descriptors
+_CONTEXT_NAMES = {"header", "headers", "loop"}
+
+# Attributes which are never descriptors, printing them does not reveal anything else of the model
+_SCALAR_ATTRIBUTES = {
+    "name",
+    "namespace",
+    "qualified_name",
+    "type",
+    "access_specifier",
+    "arguments",
+    "annotation_names",
+    "value",
+    # loop
+    "index",
+    "index0",
+    "revindex",
+    "revindex0",
+    "first",
+    "last",
+    "length",
+    "depth",
+    "depth0",
+}
+
+# Filters and methods finding classes by their name or namespace, which may be any class
+_CLASS_LOOKUPS = {
+    "find_class",
+    "in_namespace",
+    "classes_in_namespace",
+    "classes_by_qualified_name",
+    "classes_by_name",
+    "classes_by_namespace",
+}
+
+# Attributes of the source model, any other one needs the complete models
+_MODEL_ATTRIBUTES = {
+    "class_types",
+    "function_types",
+    "classes_with_annotation",
+    "classes_by_annotation",
+} | _CLASS_LOOKUPS
+
+# Methods of the descriptors whose result is not a descriptor
+_SCALAR_METHODS = {"has_annotation"}
+
+# Filters of the Jinja environment reading the descriptors without printing them
+_MODEL_FILTERS = {"ns", "with_annotation", "annotation", "find_class", "in_namespace"}
+
+# Builtin filters which select or order the items of a collection without printing them
+_COLLECTION_FILTERS = {
+    "batch",
+    "d",
+    "default",
+    "first",
+    "groupby",
+    "last",
+    "list",
+    "max",
+    "min",
+    "reject",
+    "rejectattr",
+    "reverse",
+    "select",
+    "selectattr",
+    "slice",
+    "sort",
+    "unique",
+}
+
+# Builtin filters giving a number
+_COUNTING_FILTERS = {"count", "length", "sum"}
+
+# Builtin filters whose first argument is an attribute of the items
+_ATTRIBUTE_FILTERS = {"attr", "groupby", "rejectattr", "selectattr", "sum"}
+
+
+def _const_str(node: Optional[nodes.Node]) -> Optional[str]:
+    return node.value if isinstance(node, nodes.Const) and isinstance(node.value, str) else None
+
+
+def _attributes(node: nodes.Filter) -> Optional[List[str]]:
+    """The attribute of the items a filter reads, empty if none and None if it is only known when rendering"""
+    attributes = []
+    if node.name in _ATTRIBUTE_FILTERS and node.args:
+        attributes.append(node.args[0])
+    attributes += [keyword.value for keyword in node.kwargs if keyword.key == "attribute"]
+    names = [_const_str(attribute) for attribute in attributes]
+    if any(name is None for name in names):
+        return None
+    # Dotted attributes look up nested ones
+    return [attr for name in names for attr in name.split(".")]
+
+
+def _bound_names(target: nodes.Node) -> Iterable[str]:
+    return (name.name for name in target.find_all(nodes.Name)) if not isinstance(target, nodes.Name) else [target.name]
+
+
+class TemplateAnalyzer:
+    """Collects the classes and fields the templates read, and whether they read the field types"""
+
+    def __init__(self) -> None:
+        self.everything = False
+        self.all_classes = False
+        self.class_annotations: Set[str] = set()
+        self.all_fields = False
+        self.field_annotations: Set[str] = set()
+        self.field_types = False
+        self._macros: Set[str] = {"caller"}
+        self._import_aliases: Set[str] = set()
+        self._safe_names: Set[str] = set(_CONTEXT_NAMES)
+
+    def analyze(self, template_asts: Iterable[nodes.Template]):
+        template_asts = list(template_asts)
+        self._collect_names(template_asts)
+        for template_ast in template_asts:
+            self.statements(template_ast.body)
+
+    def extraction(self) -> Extraction:
+        if self.everything:
+            return Extraction()
+        return Extraction(
+            class_annotations=None if self.all_classes else sorted(self.class_annotations),
+            field_annotations=None if self.all_fields else sorted(self.field_annotations),
+            field_types=self.field_types,
+        )
+
+    def _collect_names(self, template_asts: List[nodes.Template]):
+        # The loop variables over the headers are strings, unless the name is bound to something else somewhere
+        header_names: Set[str] = set()
+        bound_names: Set[str] = set()
+        for template_ast in template_asts:
+            for node in template_ast.find_all((nodes.For, nodes.Assign, nodes.AssignBlock, nodes.With)):
+                if isinstance(node, nodes.For) and isinstance(node.iter, nodes.Name) and node.iter.name == "headers":
+                    header_names.update(_bound_names(node.target))
+                elif isinstance(node, nodes.With):
+                    bound_names.update(name for target in node.targets for name in _bound_names(target))
+                else:
+                    bound_names.update(_bound_names(node.target))
+            for node in template_ast.find_all((nodes.Macro, nodes.CallBlock)):
+                bound_names.update(argument.name for argument in node.args)
+                if isinstance(node, nodes.Macro):
+                    self._macros.add(node.name)
+            for node in template_ast.find_all((nodes.Import, nodes.FromImport)):
+                if isinstance(node, nodes.Import):
+                    self._import_aliases.add(node.target)
+                else:
+                    self._macros.update(name if isinstance(name, str) else name[1] for name in node.names)
+        self._safe_names = (self._safe_names | header_names) - bound_names
+
+    # --- Statements
+
+    def statements(self, body: Iterable[nodes.Node]):
+        for node in body:
+            self.statement(node)
+
+    def statement(self, node: nodes.Node):
+        if isinstance(node, nodes.Output):
+            for child in node.nodes:
+                if not isinstance(child, nodes.TemplateData):
+                    self.expression(child, escapes=True)
+        elif isinstance(node, nodes.For):
+            self.expression(node.iter, escapes=False)
+            if node.test is not None:
+                self.expression(node.test, escapes=False)
+            self.statements(node.body)
+            self.statements(node.else_)
+        elif isinstance(node, nodes.If):
+            self.expression(node.test, escapes=False)
+            self.statements(node.body)
+            self.statements(node.elif_)
+            self.statements(node.else_)
+        elif isinstance(node, (nodes.Assign, nodes.With)):
+            # Bound names are followed where they are used
+            values = [node.node] if isinstance(node, nodes.Assign) else node.values
+            for value in values:
+                self.expression(value, escapes=False)
+            self.statements(getattr(node, "body", []))
+        elif isinstance(node, (nodes.Macro, nodes.CallBlock)):
+            for default in node.defaults:
+                self.expression(default, escapes=True)
+            if isinstance(node, nodes.CallBlock):
+                self.expression(node.call, escapes=False)
+            self.statements(node.body)
+        elif isinstance(node, (nodes.Include, nodes.Import, nodes.FromImport, nodes.Extends)):
+            # The referenced templates are analyzed as well, unless their name is only known when rendering
+            if _const_str(node.template) is None:
+                self.everything = True
+        elif isinstance(
+            node, (nodes.Block, nodes.Scope, nodes.AssignBlock, nodes.FilterBlock, nodes.EvalContextModifier)
+        ):
+            # The filters of the blocks apply to the rendered text
+            self.statements(node.body)
+        elif isinstance(node, nodes.ExprStmt):
+            self.expression(node.node, escapes=True)
+        elif not isinstance(node, (nodes.Continue, nodes.Break)):
+            for child in node.iter_child_nodes():
+                if isinstance(child, nodes.Expr):
+                    self.expression(child, escapes=True)
+                else:
+                    self.statement(child)
+
+    # --- Expressions
+
+    def is_descriptor(self, node: nodes.Node) -> bool:
+        """Whether the value of the expression may be a descriptor, or a collection of them"""
+        if isinstance(node, nodes.Name):
+            return node.name not in self._safe_names
+        if isinstance(node, nodes.Getattr):
+            return node.attr not in _SCALAR_ATTRIBUTES
+        if isinstance(node, nodes.Getitem):
+            key = _const_str(node.arg)
+            return key not in _SCALAR_ATTRIBUTES if key is not None else self.is_descriptor(node.node)
+        if isinstance(node, nodes.Filter):
+            if node.name in _COLLECTION_FILTERS:
+                return node.node is not None and self.is_descriptor(node.node)
+            if node.name in ("attr", "map"):
+                # `map` applies a filter to the items if it is not given an attribute
+                attributes = _attributes(node)
+                return attributes is None or bool(attributes) and attributes[-1] not in _SCALAR_ATTRIBUTES
+            return node.name in ("with_annotation", "annotation") or node.name in _CLASS_LOOKUPS
+        if isinstance(node, nodes.Call):
+            if isinstance(node.node, nodes.Name):
+                return node.node.name not in self._macros
+            return not (
+                isinstance(node.node, nodes.Getattr)
+                and (node.node.attr in _SCALAR_METHODS or self._is_imported_macro(node.node))
+            )
+        if isinstance(node, (nodes.And, nodes.Or)):
+            return self.is_descriptor(node.left) or self.is_descriptor(node.right)
+        if isinstance(node, nodes.CondExpr):
+            return self.is_descriptor(node.expr1) or (node.expr2 is not None and self.is_descriptor(node.expr2))
+        if isinstance(node, (nodes.List, nodes.Tuple)):
+            return any(self.is_descriptor(item) for item in node.items)
+        if isinstance(node, nodes.Dict):
+            return any(self.is_descriptor(item.value) for item in node.items)
+        return False
+
+    def _is_imported_macro(self, node: nodes.Getattr) -> bool:
+        return isinstance(node.node, nodes.Name) and node.node.name in self._import_aliases
+
+    def attribute(self, attr: str):
+        if attr == "class_types" or attr == "classes_by_annotation" or attr in _CLASS_LOOKUPS:
+            self.all_classes = True
+        elif attr == "fields" or attr == "fields_by_annotation":
+            self.all_fields = True
+        elif attr == "type":
+            self.field_types = True
+
+    def model_attribute(self, node: nodes.Node, attr: str):
+        """An attribute of the source model the analyzer does not know may read anything"""
+        if isinstance(node, nodes.Name) and node.name == "model" and attr not in _MODEL_ATTRIBUTES:
+            self.everything = True
+
+    def annotated(self, node: nodes.Node, annotation: Optional[str]):
+        """The items of the collection the expression gives with the annotation"""
+        if annotation is None:
+            self.everything = True
+        elif isinstance(node, nodes.Getattr) and node.attr in ("class_types", "fields"):
+            self.annotated_items(node.attr, node.node, annotation)
+        elif isinstance(node, nodes.Name) and node.name == "model":
+            self.class_annotations.add(annotation)
+        else:
+            # A class gives its fields, a list its items, which may be classes or fields
+            self.class_annotations.add(annotation)
+            self.field_annotations.add(annotation)
+            self.expression(node, escapes=False)
+
+    def annotated_items(self, attr: str, node: nodes.Node, annotation: Optional[str]):
+        """The classes or the fields of the expression with the annotation"""
+        if annotation is None:
+            self.everything = True
+        elif attr == "class_types":
+            self.class_annotations.add(annotation)
+        else:
+            self.field_annotations.add(annotation)
+        self.expression(node, escapes=False)
+
+    def arguments(self, node: nodes.Node):
+        for argument in node.args:
+            self.expression(argument, escapes=True)
+        for keyword in node.kwargs:
+            self.expression(keyword.value, escapes=True)
+        for dynamic in (node.dyn_args, node.dyn_kwargs):
+            if dynamic is not None:
+                self.expression(dynamic, escapes=True)
+
+    def expression(self, node: nodes.Node, escapes: bool):
+        """Walks an expression; an escaping value is printed, compared or passed to something unknown"""
+        if escapes and self.is_descriptor(node):
+            self.everything = True
+
+        if isinstance(node, nodes.Name):
+            pass
+        elif isinstance(node, nodes.Getattr):
+            self.model_attribute(node.node, node.attr)
+            self.attribute(node.attr)
+            self.expression(node.node, escapes=False)
+        elif isinstance(node, nodes.Getitem):
+            key = _const_str(node.arg)
+            index = node.node.attr if isinstance(node.node, nodes.Getattr) else None
+            if key is not None and index in ("classes_by_annotation", "fields_by_annotation"):
+                # The classes or the fields with the annotation given by the key
+                attr = "class_types" if index == "classes_by_annotation" else "fields"
+                self.annotated_items(attr, node.node.node, key)
+                return
+            if key is not None:
+                self.model_attribute(node.node, key)
+                self.attribute(key)
+            elif not isinstance(node.arg, (nodes.Const, nodes.Slice)) and self.is_descriptor(node.node):
+                self.everything = True
+            self.expression(node.node, escapes=False)
+            self.expression(node.arg, escapes=False)
+        elif isinstance(node, nodes.Filter):
+            self.filter(node)
+        elif isinstance(node, nodes.Test):
+            self.expression(node.node, escapes=False)
+            self.arguments(node)
+        elif isinstance(node, nodes.Call):
+            self.call(node)
+        elif isinstance(node, (nodes.And, nodes.Or)):
+            self.expression(node.left, escapes)
+            self.expression(node.right, escapes)
+        elif isinstance(node, nodes.Not):
+            self.expression(node.node, escapes=False)
+        elif isinstance(node, nodes.CondExpr):
+            self.expression(node.test, escapes=False)
+            self.expression(node.expr1, escapes)
+            if node.expr2 is not None:
+                self.expression(node.expr2, escapes)
+        elif isinstance(node, (nodes.List, nodes.Tuple, nodes.Dict, nodes.Pair)):
+            for child in node.iter_child_nodes():
+                self.expression(child, escapes)
+        elif isinstance(node, nodes.Slice):
+            for child in node.iter_child_nodes():
+                self.expression(child, escapes=False)
+        else:
+            # Operators, comparisons and concatenations use the values themselves
+            for child in node.iter_child_nodes():
+                self.expression(child, escapes=True)
+
+    def filter(self, node: nodes.Filter):
+        if node.name == "with_annotation" and node.node is not None:
+            self.annotated(node.node, _const_str(node.args[0]) if node.args else None)
+            return
+        if node.name == "select" and node.node is not None and len(node.args) == 2:
+            if _const_str(node.args[0]) == "annotated_with":
+                self.annotated(node.node, _const_str(node.args[1]))
+                return
+
+        if node.name in _CLASS_LOOKUPS:
+            self.all_classes = True
+        attributes = _attributes(node)
+        if attributes is None:
+            self.everything = True
+        for attr in attributes or []:
+            self.attribute(attr)
+
+        if node.node is not None:
+            # Filters given an attribute, like `join(attribute="name")`, print that one only
+            known = (
+                node.name in _COLLECTION_FILTERS
+                or node.name in _COUNTING_FILTERS
+                or node.name in _MODEL_FILTERS
+                or bool(attributes)
+            )
+            if node.name == "map" and not attributes:
+                # The items are passed to the filter named by the first argument
+                mapped_filter = _const_str(node.args[0]) if node.args else None
+                known = mapped_filter in _MODEL_FILTERS or mapped_filter in _COUNTING_FILTERS
+            self.expression(node.node, escapes=not known)
+        self.arguments(node)
+
+    def call(self, node: nodes.Call):
+        callee = node.node
+        if isinstance(callee, nodes.Name) and callee.name in self._macros:
+            # The parameters are followed in the body of the macro
+            for argument in node.args:
+                self.expression(argument, escapes=False)
+            for keyword in node.kwargs:
+                self.expression(keyword.value, escapes=False)
+            return
+        if isinstance(callee, nodes.Getattr):
+            if self._is_imported_macro(callee):
+                for argument in node.args:
+                    self.expression(argument, escapes=False)
+                for keyword in node.kwargs:
+                    self.expression(keyword.value, escapes=False)
+                return
+            if callee.attr in ("classes_with_annotation", "fields_with_annotation") and len(node.args) == 1:
+                attr = "class_types" if callee.attr == "classes_with_annotation" else "fields"
+                self.annotated_items(attr, callee.node, _const_str(node.args[0]))
+                return
+            self.attribute(callee.attr)
+            # Other methods, like the serialization ones, may read anything
+            known = callee.attr in _SCALAR_METHODS or callee.attr == "annotation" or callee.attr in _CLASS_LOOKUPS
+            self.expression(callee.node, escapes=not known)
+        else:
+            self.expression(callee, escapes=True)
+        self.arguments(node)
+
+
+def analyze_template(env: jinja2.Environment, template_name: str) -> Extraction:
+    """The extraction a template needs, everything if it cannot be analyzed"""
+    try:
+        templates = templating_tools.parse_template_dependencies(env, template_name)
+        template_asts = [template_ast for _, template_ast in templates.values()]
+    except (jinja2.TemplateError, OSError) as e:
+        LOGGER.warning(f"Cannot analyze template {template_name}, extracting everything: {e}")
+        return Extraction()
+
+    analyzer = TemplateAnalyzer()
+    analyzer.analyze(template_asts)
+    extraction = analyzer.extraction()
+    LOGGER.debug(f"Extraction of {template_name}: {extraction}")
+    return extraction
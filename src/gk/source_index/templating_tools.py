@@ -1,13 +1,42 @@
-from typing import List
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import jinja2
+import jinja2.meta
+import jinja2.nodes
 import pathlib
 
-from gk.source_index.model import AnnotatedDescriptor
+from gk.source_index import utils
+from gk.source_index.model import AnnotatedDescriptor, AnnotationDescriptor, ClassTypeDescriptor, SourceModel
 
+# Bump when the options of the environment change, the compiled templates depend on them
+TEMPLATE_CACHE_VERSION = 1
 
-def _filter_with_annotations(items: List[AnnotatedDescriptor], annotation: str) -> List[AnnotatedDescriptor]:
-    return filter(lambda item: annotation in set([a.name for a in item.annotations]), items)
+
+def _filter_with_annotations(
+    items: Union[SourceModel, ClassTypeDescriptor, Iterable[AnnotatedDescriptor]], annotation: str
+) -> List[AnnotatedDescriptor]:
+    # A model gives its classes, a class its fields straight from their annotation index
+    if isinstance(items, SourceModel):
+        return items.classes_with_annotation(annotation)
+    if isinstance(items, ClassTypeDescriptor):
+        return items.fields_with_annotation(annotation)
+    return [item for item in items if item.has_annotation(annotation)]
+
+
+def _annotation(item: AnnotatedDescriptor, annotation: str) -> Optional[AnnotationDescriptor]:
+    return item.annotation(annotation)
+
+
+def _find_class(source_model: SourceModel, name: str) -> Optional[ClassTypeDescriptor]:
+    return source_model.find_class(name)
+
+
+def _in_namespace(source_model: SourceModel, namespace: str) -> List[ClassTypeDescriptor]:
+    return source_model.classes_in_namespace(namespace)
+
+
+def _is_annotated_with(item: AnnotatedDescriptor, annotation: str) -> bool:
+    return isinstance(item, AnnotatedDescriptor) and item.has_annotation(annotation)
 
 
 def _sanitize_namespace(namespace: str) -> str:
@@ -19,15 +48,66 @@ def _sanitize_namespace(namespace: str) -> str:
 _JINJA_FILTERS = {
     "ns": _sanitize_namespace,
     "with_annotation": _filter_with_annotations,
+    "annotation": _annotation,
+    "find_class": _find_class,
+    "in_namespace": _in_namespace,
+}
+
+_JINJA_TESTS = {
+    "annotated_with": _is_annotated_with,
 }
 
 
-def build_jinja_environment(root_dir: pathlib.Path) -> jinja2.Environment:
+class TemplateBytecodeCache(jinja2.FileSystemBytecodeCache):
+    """Compiled templates shared by the runs; an entry is recompiled once the checksum of the source differs"""
+
+    def get_cache_key(self, name: str, filename: Optional[str] = None) -> str:
+        return super().get_cache_key(f"{TEMPLATE_CACHE_VERSION}|{utils.tool_version()}|{name}", filename)
+
+
+def build_jinja_environment(root_dir: pathlib.Path, cache_dir: Optional[pathlib.Path] = None) -> jinja2.Environment:
+    bytecode_cache = None
+    if cache_dir is not None:
+        template_cache_dir = cache_dir / "templates"
+        template_cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = TemplateBytecodeCache(str(template_cache_dir))
+
     env = jinja2.Environment(
         loader=jinja2.FileSystemLoader(str(root_dir)),
         trim_blocks=True,
+        bytecode_cache=bytecode_cache,
     )
 
     env.filters.update(_JINJA_FILTERS)
+    env.tests.update(_JINJA_TESTS)
 
     return env
+
+
+def parse_template_dependencies(
+    env: jinja2.Environment, template_name: str
+) -> Dict[str, Tuple[pathlib.Path, jinja2.nodes.Template]]:
+    """The file and the syntax tree of the template and of every template it includes, imports or extends"""
+    templates: Dict[str, Tuple[pathlib.Path, jinja2.nodes.Template]] = {}
+    pending_names = [template_name]
+    while pending_names:
+        name = pending_names.pop()
+        if name in templates:
+            continue
+
+        source, filename, _ = env.loader.get_source(env, name)
+        template_ast = env.parse(source)
+        templates[name] = (pathlib.Path(filename).absolute(), template_ast)
+        # Dynamic template names cannot be resolved, these are None
+        pending_names.extend(
+            referenced_name
+            for referenced_name in jinja2.meta.find_referenced_templates(template_ast)
+            if referenced_name is not None
+        )
+
+    return templates
+
+
+def find_template_dependencies(env: jinja2.Environment, template_name: str) -> List[pathlib.Path]:
+    """The template file and every template it includes, imports or extends"""
+    return [template_file for template_file, _ in parse_template_dependencies(env, template_name).values()]
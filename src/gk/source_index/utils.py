@@ -0,0 +1,73 @@
+from typing import Optional, Tuple
+from dataclasses import dataclass
+from importlib import metadata
+import hashlib
+import os
+import pathlib
+import tempfile
+
+
+def tool_version() -> str:
+    try:
+        return metadata.version("gk_source_index")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _current_umask() -> int:
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def write_atomic(target_file: pathlib.Path, data: bytes):
+    """Writes into a temporary file next to the target then renames it, readers never see a partial file"""
+    target_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=target_file.parent, prefix=target_file.name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        # mkstemp creates private files, the target gets the permissions of a regularly created file
+        os.chmod(temp_name, 0o666 & ~_current_umask())
+        os.replace(temp_name, target_file)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+def _file_digest(file_path: pathlib.Path) -> bytes:
+    try:
+        return hashlib.sha256(file_path.read_bytes()).digest()
+    except OSError:
+        return b""
+
+
+def file_signature(file_path: pathlib.Path) -> Optional[Tuple[int, int]]:
+    """Modification time and size, which change with every write of a file"""
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@dataclass
+class OutputStatistics:
+    written: int = 0
+    unchanged: int = 0
+
+
+def write_if_changed(target_file: pathlib.Path, content: str, statistics: OutputStatistics = None) -> bool:
+    """Keeps the file and its modification time untouched if the content is the same, so builds do not rerun"""
+    # Same line endings as a file opened in text mode
+    data = content.replace("\n", os.linesep).encode("utf-8")
+
+    if _file_digest(target_file) == hashlib.sha256(data).digest():
+        if statistics is not None:
+            statistics.unchanged += 1
+        return False
+
+    write_atomic(target_file, data)
+    if statistics is not None:
+        statistics.written += 1
+    return True
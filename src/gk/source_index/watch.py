@@ -0,0 +1,220 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import copy
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+
+import logging
+
+from gk.source_index import config
+from gk.source_index import main
+from gk.source_index import model_cache
+from gk.source_index import preamble
+from gk.source_index import project_model
+from gk.source_index import templating_tools
+from gk.source_index import utils
+
+LOGGER = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.2
+# Editors write a file in several steps, changes closer to each other than this are handled together
+DEBOUNCE_INTERVAL = 0.05
+
+
+class PollingWatcher:
+    """Compares the modification time and size of the files, works everywhere"""
+
+    def __init__(self, interval: float = POLL_INTERVAL) -> None:
+        self._interval = interval
+        self._signatures: Dict[pathlib.Path, Optional[Tuple[int, int]]] = {}
+
+    def wait(self, files: Set[pathlib.Path]) -> Set[pathlib.Path]:
+        for file_path in files - self._signatures.keys():
+            self._signatures[file_path] = utils.file_signature(file_path)
+
+        while True:
+            changed_files = set()
+            for file_path in files:
+                signature = utils.file_signature(file_path)
+                if signature != self._signatures[file_path]:
+                    self._signatures[file_path] = signature
+                    changed_files.add(file_path)
+            if changed_files:
+                return changed_files
+            time.sleep(self._interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Watches the directories of the files, so files replaced by a rename (like most editors save) are seen too"""
+
+    _EVENT_HEADER = struct.Struct("iIII")
+    _MASK = (
+        0x00000002  # IN_MODIFY
+        | 0x00000008  # IN_CLOSE_WRITE
+        | 0x00000040  # IN_MOVED_FROM
+        | 0x00000080  # IN_MOVED_TO
+        | 0x00000100  # IN_CREATE
+        | 0x00000200  # IN_DELETE
+    )
+
+    def __init__(self) -> None:
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._directories: Dict[int, pathlib.Path] = {}
+        self._watched_directories: Set[pathlib.Path] = set()
+
+    def _watch_directory(self, directory: pathlib.Path):
+        watch_descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self._MASK)
+        if watch_descriptor < 0:
+            LOGGER.warning(f"Cannot watch {directory}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._directories[watch_descriptor] = directory
+        self._watched_directories.add(directory)
+
+    def _read_events(self) -> Iterable[pathlib.Path]:
+        buffer = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(buffer):
+            watch_descriptor, _, _, name_length = self._EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self._EVENT_HEADER.size
+            name = buffer[offset : offset + name_length].rstrip(b"\0")
+            offset += name_length
+            if watch_descriptor in self._directories and name:
+                yield self._directories[watch_descriptor] / os.fsdecode(name)
+
+    def wait(self, files: Set[pathlib.Path]) -> Set[pathlib.Path]:
+        for directory in {file_path.parent for file_path in files} - self._watched_directories:
+            self._watch_directory(directory)
+
+        changed_files: Set[pathlib.Path] = set()
+        timeout = None
+        while True:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+            if not readable:
+                if changed_files:
+                    return changed_files
+                timeout = None
+                continue
+            changed_files.update(file_path for file_path in self._read_events() if file_path in files)
+            if changed_files:
+                timeout = DEBOUNCE_INTERVAL
+
+    def close(self):
+        os.close(self._fd)
+
+
+def create_watcher():
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError) as e:
+            LOGGER.warning(f"inotify is not available, polling the files instead: {e}")
+    return PollingWatcher()
+
+
+def _template_files(j2_env, app_config: config.AppConfig) -> Set[pathlib.Path]:
+    template_files = set()
+    for template_config in app_config.templates:
+        try:
+            template_files.update(templating_tools.find_template_dependencies(j2_env, str(template_config.template)))
+        except Exception as e:
+            LOGGER.error(f"Cannot read template {template_config.template}: {e}")
+    return template_files
+
+
+def watch(app_config: config.AppConfig, args, root_dir: pathlib.Path, watcher=None):
+    """Generates the code, then regenerates it for the headers affected by every change until interrupted
+
+    The Jinja environment, the precompiled preamble and the models of the unchanged headers are kept between the runs.
+    """
+    watcher = watcher or create_watcher()
+    config_file = pathlib.Path(args.config_path).absolute()
+    header_files = [pathlib.Path(input_file).absolute() for input_file in args.input_files]
+    j2_env = (
+        templating_tools.build_jinja_environment(root_dir, main.template_cache_dir(args))
+        if not args.is_export_json
+        else None
+    )
+    loaded_config = app_config
+    app_config = main.analyze_templates(loaded_config, j2_env)
+    cache = model_cache.MemoryModelCache(backing_cache=main.create_model_cache(app_config, args))
+    preamble_cache = preamble.PreambleCache()
+    # Aggregate templates are rendered with the models of the headers which are not run again
+    project = project_model.ProjectModel()
+
+    def run(affected_files: List[pathlib.Path]):
+        run_args = copy.copy(args)
+        run_args.input_files = [str(header_file) for header_file in affected_files]
+        # The depfile is written by the complete runs only
+        if len(affected_files) != len(header_files):
+            run_args.depfile_path = None
+
+        cache.statistics = model_cache.CacheStatistics()
+        start = time.perf_counter()
+        try:
+            main.execute(
+                app_config,
+                run_args,
+                root_dir,
+                j2_env=j2_env,
+                cache=cache,
+                preamble_cache=preamble_cache,
+                project_model=project,
+            )
+        except Exception as e:
+            LOGGER.error(f"Error: {e}")
+        LOGGER.info(f"Regenerated {len(affected_files)} headers in {time.perf_counter() - start:.3f}s")
+
+    run(header_files)
+    try:
+        while True:
+            template_files = _template_files(j2_env, app_config) if j2_env is not None else set()
+            header_dependencies = {header_file: set(cache.dependencies(header_file)) for header_file in header_files}
+            # The flags of every header may change with the compilation database, like with the config
+            config_files = {config_file, main.create_compile_flags(app_config, args).database_file} - {None}
+            watched_files = config_files | template_files | set().union(*header_dependencies.values())
+
+            LOGGER.info(f"Watching {len(watched_files)} files")
+            changed_files = watcher.wait(watched_files)
+            LOGGER.info(f"Changed: {', '.join(sorted(str(file_path) for file_path in changed_files))}")
+
+            if changed_files & config_files:
+                try:
+                    loaded_config = config.load_app_config(config_file)
+                except Exception as e:
+                    LOGGER.error(f"Cannot load {config_file}: {e}")
+                    continue
+                app_config = main.analyze_templates(loaded_config, j2_env)
+                cache = model_cache.MemoryModelCache(backing_cache=main.create_model_cache(app_config, args))
+                project = project_model.ProjectModel()
+                run(header_files)
+            elif changed_files & template_files:
+                # The models are still valid unless the templates read other parts of them now
+                analyzed_config = main.analyze_templates(loaded_config, j2_env)
+                if analyzed_config.templates != app_config.templates:
+                    LOGGER.info("The templates read other parts of the models, parsing again")
+                    app_config = analyzed_config
+                    cache = model_cache.MemoryModelCache(backing_cache=main.create_model_cache(app_config, args))
+                    project = project_model.ProjectModel()
+                run(header_files)
+            else:
+                affected_files = [
+                    header_file for header_file in header_files if header_dependencies[header_file] & changed_files
+                ]
+                if affected_files:
+                    run(affected_files)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        preamble_cache.close()
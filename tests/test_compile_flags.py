@@ -0,0 +1,92 @@
+import json
+import pathlib
+
+import clang.cindex as clang_index
+
+from gk.source_index import compile_flags, config, main, parse_worker
+
+
+def test_forwarded_arguments(tmp_path):
+    arguments = ["-c", "-o", "a.o", "-Iinclude", "-isystem", "/opt/lib", "-DNAME=1", "-U", "OLD", "-std=c++17"]
+    arguments += ["-O2", "-Wall", "-MD", "-MF", "a.d", "--sysroot", "sysroot", "a.cpp"]
+
+    assert compile_flags.forwarded_arguments(arguments, tmp_path) == [
+        "-I",
+        str(tmp_path / "include"),
+        "-isystem",
+        "/opt/lib",
+        "-D",
+        "NAME=1",
+        "-U",
+        "OLD",
+        "-std=c++17",
+        f"--sysroot={tmp_path / 'sysroot'}",
+    ]
+
+
+def test_forwarded_arguments_of_precompiled_headers(tmp_path):
+    # As CMake passes a precompiled header to clang
+    arguments = ["-Xclang", "-include-pch", "-Xclang", "cmake_pch.hxx.pch", "-Xclang", "-include", "-Xclang", "pch.hxx"]
+    arguments += ["-include-pch", "other.pch", "-include", "prefix.hpp", "-includeconfig.hpp", "-c", "a.cpp"]
+
+    assert compile_flags.forwarded_arguments(arguments, tmp_path) == [
+        "-include",
+        str(tmp_path / "prefix.hpp"),
+        "-include",
+        str(tmp_path / "config.hpp"),
+    ]
+
+
+def test_compilation_database(tmp_path):
+    database_file = tmp_path / "compile_commands.json"
+    database_file.write_text(
+        json.dumps(
+            [
+                {"directory": str(tmp_path), "command": "c++ -DA -c src/a.cpp", "file": "src/a.cpp"},
+                {"directory": str(tmp_path), "arguments": ["c++", "-DB", "-c", "src/b.cpp"], "file": "src/b.cpp"},
+                {"directory": str(tmp_path), "arguments": ["c++", "-DC", "-c", "src/c/c.cpp"], "file": "src/c/c.cpp"},
+            ]
+        )
+    )
+    database = compile_flags.CompilationDatabase.load(compile_flags.compilation_database_file(tmp_path))
+
+    # Same name next to it, then the first source file of the closest directory
+    assert database.arguments(tmp_path / "src" / "b.hpp") == ["-D", "B"]
+    assert database.arguments(tmp_path / "src" / "other.hpp") == ["-D", "A"]
+    assert database.arguments(tmp_path / "src" / "c" / "d" / "d.hpp") == ["-D", "C"]
+    # Any flags are closer to the ones of the header than none
+    assert database.arguments(pathlib.Path("/elsewhere/e.hpp")) == ["-D", "A"]
+    assert compile_flags.CompilationDatabase({}).arguments(tmp_path / "src" / "a.hpp") == []
+
+
+def test_forwarded_flags(clang_index_parser: clang_index.Index, tmp_path):
+    (tmp_path / "include").mkdir()
+    (tmp_path / "include" / "types.hpp").write_text("#pragma once\nstruct Type {};\n")
+    header_file = tmp_path / "a.hpp"
+    header_file.write_text(
+        '#include "types.hpp"\n#include <vector>\n#define SERIALIZABLE(type)\n'
+        "#ifdef WITH_A\nstruct A { Type type; std::vector<int> values; };\nSERIALIZABLE(A)\n#endif\n"
+    )
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "templates:\n"
+        '  - template: "serialize.j2"\n'
+        '    filename_suffix: ".cpp"\n'
+        "    filter_annotations: [SERIALIZABLE]\n"
+        "include_directories: [include]\n"
+        "stub_system_headers: true\n"
+    )
+    app_config = config.load_app_config(config_file)
+    args = main.parse_args(["-c", str(config_file), "-i", str(header_file), "-D", "WITH_A", "--std", "c++17"])
+    clang_args = main.create_compile_flags(app_config, args).args(header_file)
+    assert clang_args[-2:] == ["-DWITH_A", "-std=c++17"]
+
+    result = parse_worker.parse_header(clang_index_parser, header_file, app_config.templates, clang_args=clang_args)
+
+    assert result.error is None
+    (class_type,) = result.source_models[0].class_types
+    assert [(field.name, field.type) for field in class_type.fields] == [
+        ("type", "Type"),
+        ("values", "std::vector<int>"),
+    ]
+    assert compile_flags.STUBS_DIR / "vector" in result.dependencies
@@ -0,0 +1,14 @@
+import pathlib
+
+from gk.source_index.depfile import format_depfile
+
+
+def test_format_depfile():
+    dependencies = {
+        pathlib.Path("/out/serialize_a.cpp"): [pathlib.Path("/src/a.hpp"), pathlib.Path("/src/my dir/b.hpp")],
+        pathlib.Path("/out/serialize_c.cpp"): [],
+    }
+
+    assert format_depfile(dependencies) == (
+        "/out/serialize_a.cpp: \\\n  /src/a.hpp \\\n  /src/my\\ dir/b.hpp\n" "/out/serialize_c.cpp:\n"
+    )
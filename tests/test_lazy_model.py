@@ -0,0 +1,95 @@
+import pathlib
+import pickle
+
+import clang.cindex as clang_index
+import pytest
+
+from gk.source_index import lazy_model, main, parse_worker, templating_tools
+from gk.source_index.config import TemplateConfig
+from gk.source_index.model import ClassTypeDescriptor, FieldTypeDescriptor
+
+EXAMPLE_DIR = pathlib.Path(__file__).parent.parent / "example" / "src"
+
+SRC = """
+#define SERIALIZABLE(type)
+#define FIELD(type)
+
+namespace ns {
+struct A {
+    int a;
+    float b;
+};
+
+struct Plain {
+    int c;
+};
+
+class B {
+public:
+    int d;
+private:
+    int e;
+};
+}
+
+SERIALIZABLE(ns::A)
+SERIALIZABLE(ns::B)
+FIELD(ns::A::a)
+FIELD(ns::B::d)
+FIELD(ns::B::e)
+"""
+
+
+@pytest.mark.parametrize("allow_public_members_only", [True, False])
+def test_lazy_models_match_eager(clang_index_parser: clang_index.Index, tmp_path, allow_public_members_only):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    template_configs = [
+        TemplateConfig(
+            template="serialize.j2",
+            filter_annotations=["SERIALIZABLE", "FIELD"],
+            filename_suffix=".cpp",
+            allow_public_members_only=allow_public_members_only,
+        ),
+        TemplateConfig(template="fields.j2", filter_annotations=["FIELD"], filename_suffix=".h"),
+    ]
+    translation_unit = parse_worker.create_translation_unit(clang_index_parser, header_file)
+
+    source_models = parse_worker.build_source_models(translation_unit, template_configs)
+    lazy_models = parse_worker.build_source_models(translation_unit, template_configs, lazy=True)
+
+    assert [lazy_model.resolve_source_model(source_model) for source_model in lazy_models] == source_models
+    # The processes and the caches get eager descriptors
+    assert pickle.loads(pickle.dumps(lazy_models)) == source_models
+    assert type(pickle.loads(pickle.dumps(lazy_models[0].class_types[0]))) is ClassTypeDescriptor
+
+
+def test_unrendered_classes_are_not_resolved(clang_index_parser: clang_index.Index, tmp_path):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    template_config = TemplateConfig(template="serialize.j2", filter_annotations=[], filename_suffix=".cpp")
+    translation_unit = parse_worker.create_translation_unit(clang_index_parser, header_file)
+    j2_env = templating_tools.build_jinja_environment(EXAMPLE_DIR)
+
+    (source_model,) = parse_worker.build_source_models(translation_unit, [template_config])
+    (lazy_source_model,) = parse_worker.build_source_models(translation_unit, [template_config], lazy=True)
+
+    assert main.render_template(j2_env, template_config, header_file, lazy_source_model) == main.render_template(
+        j2_env, template_config, header_file, source_model
+    )
+    resolved_fields = {
+        class_type.name: [field.name for field in ClassTypeDescriptor.fields.__get__(class_type)]
+        for class_type in lazy_source_model.class_types
+        if _is_set(ClassTypeDescriptor.fields, class_type)
+    }
+    assert resolved_fields == {"A": ["a", "b"], "B": ["d"]}
+    # The template prints the names of the fields only
+    assert not any(_is_set(FieldTypeDescriptor.type, field) for field in lazy_source_model.class_types[0].fields)
+
+
+def _is_set(slot, descriptor) -> bool:
+    try:
+        slot.__get__(descriptor)
+        return True
+    except AttributeError:
+        return False
@@ -1,5 +1,13 @@
 import clang.cindex as clang_index
-from gk.source_index.parse_source import parse_source_model
+import pytest
+
+from gk.source_index.parse_source import (
+    MalformedAnnotationError,
+    build_filter,
+    build_scope_filter,
+    collect_source_model,
+    parse_source_model,
+)
 
 
 """
@@ -123,3 +131,153 @@ def test_basic_annotated_model(clang_index_parser: clang_index.Index):
 
     assert len(source_model.class_types[0].fields[1].annotations) == 1
     assert source_model.class_types[0].fields[1].annotations[0].name == "FIELD"
+
+
+def test_filtered_model(clang_index_parser: clang_index.Index):
+    src = """
+    #define SERIALIZABLE(type)
+    #define FIELD(type)
+    #define OTHER(type)
+
+    class A {
+    public:
+        int a;
+    private:
+        float b;
+    };
+
+    SERIALIZABLE(A)
+    OTHER(A)
+    FIELD(A::a)
+    """
+
+    translation_unit = clang_index_parser.parse(
+        "tmp.cpp",
+        args=["-std=c++11"],
+        unsaved_files=[("tmp.cpp", src)],
+        options=CLANG_PARSE_OPTIONS,
+    )
+
+    parsing_filter = build_filter(filter_annotations=["SERIALIZABLE", "FIELD"], allow_public_members_only=True)
+    source_model = parse_source_model(translation_unit, parsing_filter)
+
+    assert source_model
+    assert len(source_model.class_types) == 1
+    assert [a.name for a in source_model.class_types[0].annotations] == ["SERIALIZABLE"]
+
+    assert len(source_model.class_types[0].fields) == 1
+    assert source_model.class_types[0].fields[0].name == "a"
+    assert source_model.class_types[0].fields[0].annotations[0].name == "FIELD"
+
+
+def test_main_file_scope(clang_index_parser: clang_index.Index, tmp_path):
+    (tmp_path / "include").mkdir()
+    (tmp_path / "include" / "included.hpp").write_text("struct Included { int a; };")
+    (tmp_path / "main.hpp").write_text('#include "include/included.hpp"\nstruct Main { int b; };')
+
+    translation_unit = clang_index_parser.parse(
+        str(tmp_path / "main.hpp"),
+        args=["-std=c++11"],
+        options=CLANG_PARSE_OPTIONS,
+    )
+
+    source_model = parse_source_model(translation_unit, scope_fn=build_scope_filter())
+    assert [c.name for c in source_model.class_types] == ["Main"]
+
+    scope_fn = build_scope_filter(allowed_path_prefixes=[str(tmp_path / "include")])
+    source_model = parse_source_model(translation_unit, scope_fn=scope_fn)
+    assert [c.name for c in source_model.class_types] == ["Included", "Main"]
+
+    source_model = parse_source_model(translation_unit, scope_fn=build_scope_filter(traverse_included_files=True))
+    assert [c.name for c in source_model.class_types] == ["Included", "Main"]
+
+
+def test_pruned_cursor_kinds(clang_index_parser: clang_index.Index):
+    src = """
+    #define SERIALIZABLE(type)
+
+    typedef struct { int a; } T;
+    using U = struct UStruct { int u; };
+    extern "C" { struct C { int c; }; }
+    template <typename X> struct Tpl { struct Nested { int n; }; };
+    struct A {
+        int m(int a) const;
+        enum E { E1 };
+    };
+
+    SERIALIZABLE(T)
+    """
+
+    translation_unit = clang_index_parser.parse(
+        "tmp.cpp",
+        args=["-std=c++11"],
+        unsaved_files=[("tmp.cpp", src)],
+        options=CLANG_PARSE_OPTIONS,
+    )
+
+    scoped_kinds = set()
+
+    def scope_fn(cursor: clang_index.Cursor) -> bool:
+        scoped_kinds.add(cursor.kind)
+        return True
+
+    source_model = collect_source_model(translation_unit, scope_fn)
+
+    # Classes defined in a typedef or an alias are not visited a second time through them
+    assert [c.name for c in source_model.class_types] == ["T", "UStruct", "C", "Nested", "A"]
+    assert [a.name for a in source_model.class_types[0].annotations] == ["SERIALIZABLE"]
+    # Pruned before their location is looked up
+    assert not scoped_kinds & {
+        clang_index.CursorKind.TYPEDEF_DECL,
+        clang_index.CursorKind.TYPE_ALIAS_DECL,
+        clang_index.CursorKind.CXX_METHOD,
+        clang_index.CursorKind.ENUM_DECL,
+        clang_index.CursorKind.MACRO_DEFINITION,
+    }
+
+
+def test_annotation_arguments(clang_index_parser: clang_index.Index):
+    src = """#define SERIALIZABLE(...)
+    struct A {};
+    SERIALIZABLE( A , "a, b" , std::vector<int> /* comment */, \\
+        42)
+    SERIALIZABLE()
+    """
+
+    translation_unit = clang_index_parser.parse(
+        "tmp.cpp",
+        args=["-std=c++11"],
+        unsaved_files=[("tmp.cpp", src)],
+        options=CLANG_PARSE_OPTIONS,
+    )
+
+    with pytest.raises(MalformedAnnotationError, match="tmp.cpp:5: Malformed SERIALIZABLE"):
+        collect_source_model(translation_unit)
+
+    source_model = collect_source_model(translation_unit, lambda cursor: cursor.location.line != 5)
+    assert source_model.class_types[0].annotations[0].arguments == ('"a, b"', "std::vector<int>", "42")
+
+
+def test_deeply_nested_namespaces(clang_index_parser: clang_index.Index):
+    # Deeper than the recursion limit of Python, a recursive walk would fail in the libclang callback
+    namespaces = [f"n{depth}" for depth in range(1200)]
+    src = f"""
+    namespace {"::".join(namespaces)} {{
+    struct A {{
+        int a;
+    }};
+    }}
+    """
+
+    translation_unit = clang_index_parser.parse(
+        "tmp.cpp",
+        args=["-std=c++17"],
+        unsaved_files=[("tmp.cpp", src)],
+        options=CLANG_PARSE_OPTIONS,
+    )
+
+    source_model = collect_source_model(translation_unit)
+
+    assert [class_type.name for class_type in source_model.class_types] == ["A"]
+    assert source_model.class_types[0].namespace == "::" + "::".join(namespaces)
+    assert [field.name for field in source_model.class_types[0].fields] == ["a"]
@@ -0,0 +1,61 @@
+import clang.cindex as clang_index
+
+from gk.source_index.config import TemplateConfig
+from gk.source_index.model_cache import ModelCache
+from gk.source_index.parse_worker import CLANG_ARGS, parse_header
+
+
+TEMPLATE_CONFIGS = [
+    TemplateConfig(
+        template="serialize.j2",
+        filter_annotations=["SERIALIZABLE", "FIELD"],
+        filename_suffix=".cpp",
+    )
+]
+
+
+def _write_sources(tmp_path):
+    (tmp_path / "annotations.hpp").write_text("#define SERIALIZABLE(type)\n")
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text('#include "annotations.hpp"\nstruct A { int a; };\nSERIALIZABLE(A)\n')
+    return header_file
+
+
+def test_cache_follows_include_closure(clang_index_parser: clang_index.Index, tmp_path):
+    header_file = _write_sources(tmp_path)
+    cache_dir = tmp_path / "cache"
+
+    cache = ModelCache(cache_dir, TEMPLATE_CONFIGS, CLANG_ARGS)
+    assert cache.load(header_file) is None
+
+    result = parse_header(clang_index_parser, header_file, TEMPLATE_CONFIGS)
+    assert result.dependencies == [header_file, tmp_path / "annotations.hpp"]
+    cache.store(result)
+
+    # A new run starts with fresh file digests
+    cache = ModelCache(cache_dir, TEMPLATE_CONFIGS, CLANG_ARGS)
+    cached_result = cache.load(header_file)
+    assert cached_result is not None
+    assert cached_result.source_models == result.source_models
+    assert cache.statistics.hits == 1
+
+    (tmp_path / "annotations.hpp").write_text("#define SERIALIZABLE(type)\n#define FIELD(type)\n")
+    cache = ModelCache(cache_dir, TEMPLATE_CONFIGS, CLANG_ARGS)
+    assert cache.load(header_file) is None
+
+    cache = ModelCache(cache_dir, TEMPLATE_CONFIGS, CLANG_ARGS + ["-DOTHER"])
+    assert cache.load(header_file) is None
+    assert cache.statistics.misses == 1
+
+
+def test_cache_eviction(clang_index_parser: clang_index.Index, tmp_path):
+    header_file = _write_sources(tmp_path)
+
+    cache = ModelCache(tmp_path / "cache", TEMPLATE_CONFIGS, CLANG_ARGS, max_size=0)
+    cache.store(parse_header(clang_index_parser, header_file, TEMPLATE_CONFIGS))
+    cache.evict()
+
+    assert cache.statistics.evictions == 1
+    assert cache.load(header_file) is None
+    # The manifests are evicted as well
+    assert not any(path.is_file() for path in (tmp_path / "cache").rglob("*"))
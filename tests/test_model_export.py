@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from gk.source_index import model_export
+from gk.source_index.model import (
+    AccessSpecifier,
+    AnnotationDescriptor,
+    ClassTypeDescriptor,
+    FieldTypeDescriptor,
+    FunctionTypeDescriptor,
+    SourceModel,
+    TypeDescriptor,
+)
+
+SOURCE_MODEL = SourceModel(
+    class_types=[
+        ClassTypeDescriptor(
+            name="A",
+            namespace="::ns1",
+            access_specifier=None,
+            annotations=[AnnotationDescriptor(name="SERIALIZABLE", arguments=["json", 1])],
+            fields=[
+                FieldTypeDescriptor(
+                    name="a",
+                    access_specifier=AccessSpecifier.PUBLIC,
+                    annotations=[AnnotationDescriptor(name="FIELD", arguments=[])],
+                    type="std::string",
+                ),
+                FieldTypeDescriptor(name="b", access_specifier=AccessSpecifier.PRIVATE, annotations=[], type="int"),
+            ],
+        )
+    ],
+    function_types=[
+        FunctionTypeDescriptor(
+            name="f",
+            namespace="::",
+            access_specifier=None,
+            annotations=[],
+            return_type=TypeDescriptor(name="", type="void"),
+            argument_list=[TypeDescriptor(name="x", type="const A &")],
+        )
+    ],
+)
+
+
+# As dataclasses_json exported it
+DOCUMENT = {
+    "class_types": [
+        {
+            "name": "A",
+            "access_specifier": None,
+            "annotations": [{"name": "SERIALIZABLE", "arguments": ["json", 1]}],
+            "namespace": "::ns1",
+            "fields": [
+                {
+                    "name": "a",
+                    "access_specifier": "AccessSpecifier.PUBLIC",
+                    "annotations": [{"name": "FIELD", "arguments": []}],
+                    "type": "std::string",
+                },
+                {"name": "b", "access_specifier": "AccessSpecifier.PRIVATE", "annotations": [], "type": "int"},
+            ],
+        }
+    ],
+    "function_types": [
+        {
+            "name": "f",
+            "access_specifier": None,
+            "annotations": [],
+            "namespace": "::",
+            "return_type": {"name": "", "type": "void"},
+            "argument_list": [{"name": "x", "type": "const A &"}],
+        }
+    ],
+}
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_same_document_as_dataclasses_json(monkeypatch, use_orjson: bool):
+    if use_orjson and model_export.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(model_export, "orjson", None)
+
+    assert json.loads(model_export.source_model_to_json(SOURCE_MODEL)) == DOCUMENT
+
+
+def test_same_bytes_with_both_backends(monkeypatch):
+    if model_export.orjson is None:
+        pytest.skip("orjson is not installed")
+    source_model = SourceModel(
+        class_types=[
+            ClassTypeDescriptor(
+                name="Ä",
+                namespace="::ns",
+                access_specifier=AccessSpecifier.PUBLIC,
+                annotations=[AnnotationDescriptor(name="DOC", arguments=["naïve \"text\"", 2])],
+                fields=[],
+            )
+        ],
+        function_types=[],
+    )
+    exported = model_export.source_model_to_json(source_model)
+    monkeypatch.setattr(model_export, "orjson", None)
+
+    assert model_export.source_model_to_json(source_model) == exported
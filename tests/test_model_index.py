@@ -0,0 +1,122 @@
+import pathlib
+import pickle
+import sys
+
+from gk.source_index.model import (
+    AccessSpecifier,
+    AnnotationDescriptor,
+    ClassTypeDescriptor,
+    FieldTypeDescriptor,
+    SourceModel,
+)
+from gk.source_index.templating_tools import build_jinja_environment
+
+
+def _field(name, *annotations):
+    return FieldTypeDescriptor(
+        name=name,
+        access_specifier=AccessSpecifier.PUBLIC,
+        annotations=[AnnotationDescriptor(name=a, arguments=[]) for a in annotations],
+        type="int",
+    )
+
+
+def _class(namespace, name, annotations, fields):
+    return ClassTypeDescriptor(
+        name=name,
+        namespace=namespace,
+        access_specifier=AccessSpecifier.PUBLIC,
+        annotations=[AnnotationDescriptor(name=a, arguments=[name]) for a in annotations],
+        fields=fields,
+    )
+
+
+def _source_model():
+    return SourceModel(
+        class_types=[
+            _class("::ns1::ns2", "A", ["SERIALIZABLE"], [_field("a", "FIELD"), _field("b"), _field("c", "FIELD")]),
+            _class("::ns1", "B", [], [_field("a", "FIELD")]),
+            _class("::", "A", ["SERIALIZABLE", "SERIALIZABLE"], []),
+        ],
+        function_types=[],
+    )
+
+
+def test_model_indexes():
+    source_model = _source_model()
+    a, b, global_a = source_model.class_types
+
+    assert source_model.classes_with_annotation("SERIALIZABLE") == [a, global_a]
+    assert source_model.classes_with_annotation("MISSING") == []
+    assert source_model.find_class("ns1::ns2::A") is a
+    assert source_model.find_class("::ns1::ns2::A") is a
+    assert source_model.find_class("::A") is global_a
+    assert source_model.find_class("B") is b
+    assert source_model.find_class("ns1::C") is None
+    assert source_model.classes_in_namespace("ns1") == [b]
+    assert source_model.classes_in_namespace("") == [global_a]
+
+    assert a.qualified_name == "::ns1::ns2::A"
+    assert global_a.qualified_name == "::A"
+    assert [field.name for field in a.fields_with_annotation("FIELD")] == ["a", "c"]
+    assert a.has_annotation("SERIALIZABLE") and not b.has_annotation("SERIALIZABLE")
+    assert a.annotation("SERIALIZABLE").arguments == ("A",)
+    assert len(global_a.annotations_by_name["SERIALIZABLE"]) == 2
+
+    # The indexes are not part of the model
+    assert "classes_by_annotation" not in source_model.to_dict()
+    assert source_model == _source_model()
+
+
+def test_annotation_filters(tmp_path: pathlib.Path):
+    (tmp_path / "t.j2").write_text(
+        "{% for c in model | with_annotation('SERIALIZABLE') %}"
+        "{{ c.name }}:{% for f in c | with_annotation('FIELD') %}{{ f.name }}{% endfor %}"
+        "/{{ c.fields | with_annotation('FIELD') | length }} "
+        "{% endfor %}"
+        "{{ (model | find_class('ns1::B')).name }} "
+        "{{ model | in_namespace('ns1::ns2') | map(attribute='name') | join }} "
+        "{{ (model.class_types[0] | annotation('SERIALIZABLE')).arguments[0] }} "
+        "{{ model.class_types | select('annotated_with', 'SERIALIZABLE') | list | length }}"
+    )
+
+    env = build_jinja_environment(tmp_path)
+
+    assert env.get_template("t.j2").render(model=_source_model()) == "A:ac/2 A:/0 B A A 2"
+
+
+def test_compact_descriptors():
+    type_name = "".join(["std::", "string"])
+    field = FieldTypeDescriptor(name="a", access_specifier=AccessSpecifier.PUBLIC, annotations=[], type=type_name)
+    class_type = _class("::ns1", "A", ["SERIALIZABLE"], [field])
+
+    assert not hasattr(field, "__dict__") and not hasattr(class_type, "__dict__")
+    assert field.type is sys.intern("std::string")
+    assert isinstance(class_type.fields, tuple) and isinstance(class_type.annotations[0].arguments, tuple)
+    # Exported like before
+    assert class_type.to_dict()["fields"] == [
+        {"name": "a", "access_specifier": AccessSpecifier.PUBLIC, "annotations": [], "type": "std::string"}
+    ]
+
+
+def test_schema_round_trip():
+    source_model = _source_model()
+    schema = SourceModel.schema()
+
+    loaded_model = schema.load(source_model.to_dict())
+    assert loaded_model == source_model
+    assert isinstance(loaded_model.class_types[0].fields, tuple)
+    assert SourceModel.from_json(source_model.to_json()) == source_model
+
+
+def test_pickled_without_indexes():
+    source_model = _source_model()
+    source_model.find_class("A")
+    source_model.classes_with_annotation("SERIALIZABLE")[0].fields_with_annotation("FIELD")
+
+    loaded_model = pickle.loads(pickle.dumps(source_model))
+    assert loaded_model == source_model
+    assert "classes_by_name" not in loaded_model.__dict__ and "classes_by_annotation" not in loaded_model.__dict__
+    assert loaded_model.class_types[0]._fields_by_annotation is None
+    assert len(pickle.dumps(source_model)) == len(pickle.dumps(_source_model()))
+    assert [f.name for f in loaded_model.find_class("ns1::ns2::A").fields_with_annotation("FIELD")] == ["a", "c"]
@@ -0,0 +1,189 @@
+import pathlib
+
+import clang.cindex as clang_index
+import pytest
+
+from gk.source_index import config, main, parse_source, parse_worker
+from gk.source_index.config import TemplateConfig
+from gk.source_index.parse_worker import (
+    annotation_pattern,
+    build_source_models,
+    create_translation_unit,
+    parse_header,
+    parse_headers_parallel,
+    parse_unity,
+)
+
+
+SRC = """
+#define SERIALIZABLE(type)
+#define FIELD(type)
+
+namespace ns {
+struct A {
+    int a;
+    float b;
+};
+}
+
+SERIALIZABLE(ns::A)
+FIELD(ns::A::a)
+"""
+
+TEMPLATE_CONFIGS = [
+    TemplateConfig(
+        template="serialize.j2",
+        filter_annotations=["SERIALIZABLE", "FIELD"],
+        filename_suffix=".cpp",
+    )
+]
+
+
+def test_parallel_matches_serial(
+    clang_index_parser: clang_index.Index, clang_path: str, tmp_path: pathlib.Path
+):
+    header_files = []
+    for i in range(3):
+        header_file = tmp_path / f"header_{i}.hpp"
+        header_file.write_text(SRC)
+        header_files.append(header_file)
+
+    serial_results = [parse_header(clang_index_parser, header_file, TEMPLATE_CONFIGS) for header_file in header_files]
+    parallel_results = list(parse_headers_parallel(header_files, TEMPLATE_CONFIGS, 2, clang_path))
+
+    assert [r.header_file for r in parallel_results] == header_files
+    assert all(r.error is None for r in parallel_results)
+    assert [r.source_models for r in parallel_results] == [r.source_models for r in serial_results]
+    assert parallel_results[0].source_models[0].class_types[0].name == "A"
+
+
+def test_parallel_reports_failure_per_file(clang_index_parser: clang_index.Index, clang_path: str, tmp_path):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    missing_file = tmp_path / "missing.hpp"
+
+    results = list(parse_headers_parallel([missing_file, header_file], TEMPLATE_CONFIGS, 2, clang_path))
+
+    assert results[0].error is not None
+    assert "missing.hpp" in results[0].error
+    assert results[1].error is None
+    assert len(results[1].source_models) == 1
+
+
+def test_unity_matches_per_header(clang_index_parser: clang_index.Index, tmp_path):
+    (tmp_path / "annotations.hpp").write_text("#pragma once\n#define SERIALIZABLE(type)\n#define FIELD(type)\n")
+    header_a = tmp_path / "a.hpp"
+    header_a.write_text('#pragma once\n#include "annotations.hpp"\nstruct A { int a; };\nSERIALIZABLE(A)\nFIELD(A::a)')
+    # Includes the other input, whose declarations and dependencies stay its own
+    header_b = tmp_path / "b.hpp"
+    header_b.write_text('#pragma once\n#include "a.hpp"\nnamespace ns { struct B { A a; }; }\nSERIALIZABLE(ns::B)\n')
+    missing_file = tmp_path / "missing.hpp"
+
+    results = parse_unity(clang_index_parser, [header_b, missing_file, header_a], TEMPLATE_CONFIGS)
+
+    assert [r.header_file for r in results] == [header_b, missing_file, header_a]
+    assert "missing.hpp" in results[1].error
+    for result in [results[0], results[2]]:
+        expected = parse_header(clang_index_parser, result.header_file, TEMPLATE_CONFIGS)
+        assert result.error is None
+        assert result.source_models == expected.source_models
+        assert result.dependencies == expected.dependencies
+    assert [c.name for c in results[0].source_models[0].class_types] == ["B"]
+    assert [p.name for p in results[0].dependencies] == ["b.hpp", "a.hpp", "annotations.hpp"]
+
+
+def test_single_walk_for_all_templates(clang_index_parser: clang_index.Index, tmp_path, monkeypatch):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    translation_unit = create_translation_unit(clang_index_parser, header_file)
+
+    template_configs = TEMPLATE_CONFIGS + [
+        TemplateConfig(template="fields.j2", filter_annotations=["FIELD"], filename_suffix=".h"),
+    ]
+
+    walk_count = 0
+    collect_source_model = parse_source.collect_source_model
+
+    def counting_collect_source_model(*args, **kwargs):
+        nonlocal walk_count
+        walk_count += 1
+        return collect_source_model(*args, **kwargs)
+
+    monkeypatch.setattr(parse_source, "collect_source_model", counting_collect_source_model)
+    source_models = build_source_models(translation_unit, template_configs)
+
+    assert walk_count == 1
+    assert [a.name for a in source_models[0].class_types[0].annotations] == ["SERIALIZABLE"]
+    assert source_models[1].class_types[0].annotations == ()
+    assert [a.name for a in source_models[1].class_types[0].fields[0].annotations] == ["FIELD"]
+
+
+def test_annotation_pattern(tmp_path):
+    pattern = annotation_pattern(TEMPLATE_CONFIGS)
+    header_file = tmp_path / "a.hpp"
+    header_file.write_text("struct FIELDS {};\n")
+    assert not parse_worker.has_annotations(header_file, pattern)
+    header_file.write_text("struct A { int a; };\nFIELD (A::a)\n")
+    assert parse_worker.has_annotations(header_file, pattern)
+    header_file.write_text("")
+    assert not parse_worker.has_annotations(header_file, pattern)
+
+    # Annotations of the included files, or any macro being one, cannot be found in the text of the header
+    assert annotation_pattern([TemplateConfig(template="t.j2", filter_annotations=[], filename_suffix=".h")]) is None
+    assert (
+        annotation_pattern(
+            [
+                TemplateConfig(
+                    template="t.j2", filter_annotations=["FIELD"], filename_suffix=".h", traverse_included_files=True
+                )
+            ]
+        )
+        is None
+    )
+
+
+@pytest.mark.parametrize("unannotated_headers", ["empty", "skip"])
+def test_prescan_avoids_parses(clang_index_parser: clang_index.Index, tmp_path, monkeypatch, unannotated_headers):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "templates:\n"
+        '  - template: "serialize.j2"\n'
+        '    filename_suffix: ".cpp"\n'
+        "    filter_annotations: [SERIALIZABLE, FIELD]\n"
+        f"unannotated_headers: {unannotated_headers}\n"
+    )
+    (tmp_path / "serialize.j2").write_text("{% for c in model.class_types %}{{ c.name }}{% endfor %}")
+    header_a = tmp_path / "a.hpp"
+    header_a.write_text(SRC)
+    header_b = tmp_path / "b.hpp"
+    header_b.write_text("struct B { int b; };\n")
+    out_dir = tmp_path / "out"
+
+    parsed_files = []
+    parse_headers = parse_worker.parse_headers
+
+    def recording_parse_headers(header_files, *args):
+        parsed_files.extend(header_file.name for header_file in header_files)
+        return parse_headers(header_files, *args)
+
+    monkeypatch.setattr(parse_worker, "parse_headers", recording_parse_headers)
+
+    depfile_path = tmp_path / "generate.d"
+    args = main.parse_args(
+        ["-c", str(config_file), "-d", str(out_dir), "-i", str(header_a), str(header_b), "--depfile", str(depfile_path)]
+    )
+    app_config = config.load_app_config(config_file)
+    main.execute(app_config, args, tmp_path)
+
+    assert parsed_files == ["a.hpp"]
+    assert (out_dir / "a.cpp").read_text() == "A"
+    if unannotated_headers == "empty":
+        assert (out_dir / "b.cpp").read_text() == ""
+        assert main.list_outputs(app_config, args) == [out_dir.absolute() / "a.cpp", out_dir.absolute() / "b.cpp"]
+        assert main.list_outputs_dependencies(app_config, args) == [config_file]
+    else:
+        assert not (out_dir / "b.cpp").exists()
+        assert main.list_outputs(app_config, args) == [out_dir.absolute() / "a.cpp"]
+        # Annotating the skipped header adds an output
+        assert str(header_b) in depfile_path.read_text()
+        assert main.list_outputs_dependencies(app_config, args) == [config_file, header_a, header_b]
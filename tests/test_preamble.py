@@ -0,0 +1,60 @@
+import pathlib
+
+import clang.cindex as clang_index
+
+from gk.source_index.config import TemplateConfig
+from gk.source_index.parse_worker import parse_header
+from gk.source_index.preamble import build_preamble, preamble_source
+
+SRC = """
+#include <vector>
+#include "common.hpp"
+
+#define SERIALIZABLE(type)
+#define FIELD(type)
+
+struct A {
+    std::vector<int> a;
+    Common b;
+};
+
+SERIALIZABLE(A)
+FIELD(A::a)
+"""
+
+TEMPLATE_CONFIGS = [
+    TemplateConfig(
+        template="serialize.j2",
+        filter_annotations=["SERIALIZABLE", "FIELD"],
+        filename_suffix=".cpp",
+    )
+]
+
+
+def test_preamble_source():
+    assert preamble_source(["<string>", "vector", '"/include/json.hpp"']) == (
+        '#include <string>\n#include <vector>\n#include "/include/json.hpp"\n'
+    )
+
+
+def test_parse_with_preamble(clang_index_parser: clang_index.Index, tmp_path: pathlib.Path):
+    common_header = tmp_path / "common.hpp"
+    common_header.write_text("#pragma once\nstruct Common {};\n")
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+
+    preamble = build_preamble(clang_index_parser, ["<vector>", f'"{common_header.as_posix()}"'], work_dir)
+    assert preamble is not None
+    assert preamble.pch_file.exists()
+
+    result = parse_header(clang_index_parser, header_file, TEMPLATE_CONFIGS)
+    precompiled_result = parse_header(clang_index_parser, header_file, TEMPLATE_CONFIGS, preamble)
+
+    assert precompiled_result.error is None
+    assert precompiled_result.source_models == result.source_models
+    assert [field.name for field in precompiled_result.source_models[0].class_types[0].fields] == ["a", "b"]
+    # The include closure is the same, even though the includes are read from the PCH
+    assert precompiled_result.dependencies == result.dependencies
+    assert common_header in precompiled_result.dependencies
@@ -0,0 +1,45 @@
+import pathlib
+
+import clang.cindex as clang_index
+
+from gk.source_index.config import TemplateConfig
+from gk.source_index.parse_worker import parse_header
+from gk.source_index.profiling import Profiler
+
+SRC = """
+#define SERIALIZABLE(type)
+
+struct A {
+    int a;
+};
+
+SERIALIZABLE(A)
+"""
+
+
+def test_profile_parse(clang_index_parser: clang_index.Index, tmp_path: pathlib.Path):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    template_configs = [TemplateConfig(template="a.j2", filter_annotations=["SERIALIZABLE"], filename_suffix=".h")]
+
+    result = parse_header(clang_index_parser, header_file, template_configs)
+
+    assert [span.stage for span in result.spans] == ["parse", "scan", "dependencies"]
+    assert all(span.header == str(header_file) and span.wall >= 0 for span in result.spans)
+    assert result.spans[1].counters["annotations"] == 1
+    assert result.spans[1].counters["get_tokens_calls"] == 0
+    assert result.spans[1].counters["cursors"] > 0
+
+    profiler = Profiler()
+    profiler.add(result.spans)
+    with profiler.measure("render", str(header_file), "a.j2"):
+        pass
+
+    summary = profiler.summary()
+    assert "annotations: 1" in summary
+    assert "a.j2" in summary
+
+    trace_events = profiler.chrome_trace()["traceEvents"]
+    assert [event["cat"] for event in trace_events] == ["parse", "scan", "dependencies", "render"]
+    assert trace_events[0]["ts"] == 0
+    assert trace_events[3]["args"]["template"] == "a.j2"
@@ -0,0 +1,114 @@
+import pathlib
+
+import clang.cindex as clang_index
+import pytest
+
+from gk.source_index import config, main, parse_worker
+from gk.source_index.config import TemplateConfig
+from gk.source_index.model import AccessSpecifier, ClassTypeDescriptor, FieldTypeDescriptor, SourceModel
+from gk.source_index.project_model import DuplicateDefinitionError, merge_source_models
+
+CONFIG = """
+templates:
+  - template: "serialize.j2"
+    filename_suffix: ".cpp"
+    filter_annotations:
+      - SERIALIZABLE
+  - template: "registry.j2"
+    filename: "registry.cpp"
+    filter_annotations:
+      - SERIALIZABLE
+"""
+
+TEMPLATE = "{% for c in model.class_types %}{{ c.name }}{% endfor %}\n"
+
+REGISTRY_TEMPLATE = """{% for h in headers %}#include "{{ h }}"
+{% endfor %}{% for c in model | with_annotation("SERIALIZABLE") %}{{ c.qualified_name }}
+{% endfor %}"""
+
+
+def _class(name, field_type="int"):
+    field = FieldTypeDescriptor(name="a", access_specifier=AccessSpecifier.PUBLIC, annotations=[], type=field_type)
+    return ClassTypeDescriptor(name=name, namespace="::", access_specifier=None, annotations=[], fields=[field])
+
+
+def test_merge_source_models():
+    header_a, header_b = pathlib.Path("a.hpp"), pathlib.Path("b.hpp")
+    merged_model = merge_source_models(
+        [
+            (header_a, SourceModel(class_types=[_class("Shared"), _class("A")], function_types=[])),
+            (header_b, SourceModel(class_types=[_class("Shared"), _class("B")], function_types=[])),
+        ]
+    )
+
+    assert [class_type.name for class_type in merged_model.class_types] == ["Shared", "A", "B"]
+
+    with pytest.raises(DuplicateDefinitionError, match="::Shared is defined differently in a.hpp and in b.hpp"):
+        merge_source_models(
+            [
+                (header_a, SourceModel(class_types=[_class("Shared")], function_types=[])),
+                (header_b, SourceModel(class_types=[_class("Shared", "float")], function_types=[])),
+            ]
+        )
+
+
+def test_merge_forward_declarations(clang_index_parser: clang_index.Index, tmp_path):
+    header_a = tmp_path / "a.hpp"
+    header_a.write_text("#define SERIALIZABLE(type)\nstruct B;\nstruct A { B* b; int x; };\nSERIALIZABLE(A)\n")
+    header_b = tmp_path / "b.hpp"
+    header_b.write_text("#define SERIALIZABLE(type)\nstruct B { int y; };\nSERIALIZABLE(B)\n")
+    template_configs = [
+        TemplateConfig(template="registry.j2", filename="registry.cpp", filter_annotations=["SERIALIZABLE"])
+    ]
+
+    merged_model = merge_source_models(
+        [
+            (header_file, parse_worker.parse_header(clang_index_parser, header_file, template_configs).source_models[0])
+            for header_file in (header_a, header_b)
+        ]
+    )
+
+    assert [(c.name, [f.name for f in c.fields]) for c in merged_model.class_types] == [("A", ["b", "x"]), ("B", ["y"])]
+
+
+@pytest.mark.parametrize("extra_args", [[], ["--lazy-models"]])
+def test_aggregate_template(clang_index_parser: clang_index.Index, tmp_path, monkeypatch, extra_args):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(CONFIG)
+    (tmp_path / "serialize.j2").write_text(TEMPLATE)
+    (tmp_path / "registry.j2").write_text(REGISTRY_TEMPLATE)
+    (tmp_path / "annotations.hpp").write_text("#define SERIALIZABLE(type)\n")
+    header_a = tmp_path / "a.hpp"
+    header_a.write_text('#include "annotations.hpp"\nnamespace ns { struct A {}; }\nSERIALIZABLE(ns::A)\n')
+    header_b = tmp_path / "b.hpp"
+    header_b.write_text('#include "annotations.hpp"\nstruct B {};\nSERIALIZABLE(B)\n')
+    out_dir = tmp_path / "out"
+
+    parsed_files = []
+    parse_headers = parse_worker.parse_headers
+
+    def recording_parse_headers(header_files, *args):
+        parsed_files.extend(header_file.name for header_file in header_files)
+        return parse_headers(header_files, *args)
+
+    monkeypatch.setattr(parse_worker, "parse_headers", recording_parse_headers)
+
+    def run(*header_files):
+        args = main.parse_args(
+            ["-c", str(config_file), "-d", str(out_dir), "-I", str(tmp_path), "--cache-dir", str(tmp_path / "cache")]
+            + extra_args
+            + ["-i"]
+            + [str(header_file) for header_file in header_files]
+        )
+        app_config = config.load_app_config(config_file)
+        main.execute(app_config, args, tmp_path)
+        return main.list_outputs(app_config, args)
+
+    assert run(header_a) == [out_dir.absolute() / "a.cpp", out_dir.absolute() / "registry.cpp"]
+    assert (out_dir / "registry.cpp").read_text() == '#include "a.hpp"\n::ns::A\n'
+
+    # The model of the first header comes from the cache
+    run(header_a, header_b)
+    assert parsed_files == ["a.hpp", "b.hpp"]
+    assert (out_dir / "registry.cpp").read_text() == '#include "a.hpp"\n#include "b.hpp"\n::ns::A\n::B\n'
+    assert (out_dir / "b.cpp").read_text() == "B"
@@ -0,0 +1,76 @@
+import json
+import socket
+import subprocess
+import sys
+import time
+
+from gk.source_index import client
+from gk.source_index.client import send_request
+
+CONFIG = """
+templates:
+  - template: "serialize.j2"
+    filename_suffix: ".cpp"
+    filter_annotations:
+      - SERIALIZABLE
+"""
+
+SRC = """
+#define SERIALIZABLE(type)
+
+struct {name} {{
+    int a;
+}};
+
+SERIALIZABLE({name})
+"""
+
+
+def test_serve_requests(clang_path: str, tmp_path, capsys):
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC.format(name="A"))
+    socket_path = tmp_path / "generate-code.sock"
+
+    # The daemon redirects the standard streams of its process, so it cannot share one with the client
+    server_args = [sys.executable, "-m", "gk.source_index", "--serve", str(socket_path)]
+    server = subprocess.Popen(server_args + (["--clang-path", clang_path] if clang_path else []))
+    try:
+        for _ in range(100):
+            if socket_path.exists():
+                break
+            time.sleep(0.1)
+
+        request = {"argv": ["-c", "config.yaml", "-i", "header.hpp", "-d", "out", "--json"], "cwd": str(tmp_path)}
+
+        assert send_request(str(socket_path), request) == 0
+        assert "Memory model cache: 0 hits, 1 misses" in capsys.readouterr().out
+
+        assert send_request(str(socket_path), request) == 0
+        assert "Memory model cache: 1 hits, 0 misses" in capsys.readouterr().out
+
+        header_file.write_text(SRC.format(name="Changed"))
+        assert send_request(str(socket_path), request) == 0
+        assert "Memory model cache: 0 hits, 1 misses" in capsys.readouterr().out
+        source_model = json.loads((tmp_path / "out" / "header.json").read_text())
+        assert source_model["class_types"][0]["name"] == "Changed"
+
+        assert send_request(str(socket_path), {"argv": ["-c", "config.yaml"], "cwd": str(tmp_path)}) == 2
+        assert "required: --input/-i" in capsys.readouterr().err
+
+        assert send_request(str(socket_path), {"shutdown": True}) == 0
+        assert server.wait(timeout=10) == 0
+        assert not socket_path.exists()
+    finally:
+        server.kill()
+
+
+def test_client_without_unix_sockets(monkeypatch, tmp_path):
+    monkeypatch.delattr(socket, "AF_UNIX", raising=False)
+    monkeypatch.setattr(sys, "argv", ["generate-code-client", "--socket", str(tmp_path / "sock"), "-c", "config.yaml"])
+    in_process_argv = []
+    monkeypatch.setattr(client, "run_in_process", in_process_argv.extend)
+
+    client.main()
+
+    assert in_process_argv == ["-c", "config.yaml"]
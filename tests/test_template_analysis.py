@@ -0,0 +1,144 @@
+import pathlib
+
+import clang.cindex as clang_index
+import pytest
+
+from gk.source_index import main, parse_worker, templating_tools
+from gk.source_index.config import AppConfig, Extraction, TemplateConfig
+from gk.source_index.template_analysis import analyze_template
+
+EXAMPLE_DIR = pathlib.Path(__file__).parent.parent / "example" / "src"
+
+SRC = """
+#define SERIALIZABLE(type)
+#define FIELD(type)
+
+namespace ns {
+struct A {
+    int a;
+    float b;
+    struct Nested { int c; };
+    Nested nested;
+};
+
+struct Plain {
+    int d;
+};
+
+class B {
+public:
+    int e;
+private:
+    int f;
+};
+}
+
+SERIALIZABLE(ns::A)
+SERIALIZABLE(ns::B)
+FIELD(ns::A::a)
+FIELD(ns::A::nested)
+FIELD(ns::B::e)
+FIELD(ns::B::f)
+"""
+
+
+@pytest.mark.parametrize(
+    "source, extraction",
+    [
+        (
+            '{% for c in model.class_types | with_annotation("S") %}{{ c.name }}'
+            '{% for f in c.fields | with_annotation("F") %}{{ f.name }}{% endfor %}{% endfor %}',
+            Extraction(class_annotations=["S"], field_annotations=["F"], field_types=False),
+        ),
+        (
+            '{% for c in model.classes_with_annotation("S") %}{{ c.fields | join(",", attribute="type") }}{% endfor %}',
+            Extraction(class_annotations=["S"], field_annotations=None, field_types=True),
+        ),
+        (
+            '{% for h in headers %}#include "{{ h }}"{% endfor %}{{ model.class_types | length }}',
+            Extraction(class_annotations=None, field_annotations=[], field_types=False),
+        ),
+        ('{% for c in model.class_types | with_annotation("S") %}{{ c }}{% endfor %}', Extraction()),
+        ('{{ model.class_types | with_annotation("S") | tojson }}', Extraction()),
+        ("{% for c in model.class_types | with_annotation(name) %}{% endfor %}", Extraction()),
+        ("{% include template_name %}", Extraction()),
+        (
+            '{% for c in model.classes_by_annotation["S"] %}{{ c.name }}{% endfor %}',
+            Extraction(class_annotations=["S"], field_annotations=[], field_types=False),
+        ),
+        (
+            '{% for c in model.classes_by_namespace["::ns"] %}{{ c.name }}{% endfor %}',
+            Extraction(class_annotations=None, field_annotations=[], field_types=False),
+        ),
+        ("{{ model.unknown_index | length }}", Extraction()),
+    ],
+)
+def test_analyze_template(tmp_path, source, extraction):
+    (tmp_path / "template.j2").write_text(source)
+    assert analyze_template(templating_tools.build_jinja_environment(tmp_path), "template.j2") == extraction
+
+
+def test_analyze_imported_macros(tmp_path):
+    (tmp_path / "macros.j2").write_text("{% macro render(c) %}{{ c.name }}: {{ c.fields | length }}{% endmacro %}")
+    (tmp_path / "template.j2").write_text(
+        '{% import "macros.j2" as m %}{% for c in model | with_annotation("S") %}{{ m.render(c) }}{% endfor %}'
+    )
+    assert analyze_template(templating_tools.build_jinja_environment(tmp_path), "template.j2") == Extraction(
+        class_annotations=["S"], field_annotations=None, field_types=False
+    )
+
+
+def test_pruned_models_render_the_same(clang_index_parser: clang_index.Index, tmp_path):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    j2_env = templating_tools.build_jinja_environment(EXAMPLE_DIR)
+    template_config = TemplateConfig(
+        template="serialize.j2", filter_annotations=["SERIALIZABLE", "FIELD"], filename_suffix=".cpp"
+    )
+    analyzed_config = main.analyze_templates(AppConfig(templates=[template_config]), j2_env).templates[0]
+    assert analyzed_config.extraction == Extraction(
+        class_annotations=["SERIALIZABLE"], field_annotations=["FIELD"], field_types=False
+    )
+
+    translation_unit = parse_worker.create_translation_unit(clang_index_parser, header_file)
+    (source_model,) = parse_worker.build_source_models(translation_unit, [template_config])
+    (pruned_model,) = parse_worker.build_source_models(translation_unit, [analyzed_config])
+
+    assert [c.name for c in source_model.class_types] == ["A", "Nested", "Plain", "B"]
+    assert [(c.name, [f.name for f in c.fields]) for c in pruned_model.class_types] == [
+        ("A", ["a", "nested"]),
+        ("B", ["e"]),
+    ]
+    assert all(f.type == "" for c in pruned_model.class_types for f in c.fields)
+    assert main.render_template(j2_env, template_config, header_file, source_model) == main.render_template(
+        j2_env, analyzed_config, header_file, pruned_model
+    )
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        '{% for c in model.classes_by_annotation["SERIALIZABLE"] %}{{ c.name }};{% endfor %}',
+        '{% for c in model.classes_by_namespace["::ns"] %}{{ c.name }};{% endfor %}',
+        '{% for c in model.classes_by_name["A"] %}'
+        '{{ c.fields_by_annotation["FIELD"] | join(",", attribute="name") }};{% endfor %}',
+        '{{ model.classes_by_qualified_name["::ns::B"].name }};',
+    ],
+)
+def test_pruned_indexes_render_the_same(clang_index_parser: clang_index.Index, tmp_path, source):
+    header_file = tmp_path / "header.hpp"
+    header_file.write_text(SRC)
+    (tmp_path / "template.j2").write_text(source)
+    j2_env = templating_tools.build_jinja_environment(tmp_path)
+    template_config = TemplateConfig(
+        template="template.j2", filter_annotations=["SERIALIZABLE", "FIELD"], filename_suffix=".cpp"
+    )
+    analyzed_config = main.analyze_templates(AppConfig(templates=[template_config]), j2_env).templates[0]
+
+    translation_unit = parse_worker.create_translation_unit(clang_index_parser, header_file)
+    (source_model,) = parse_worker.build_source_models(translation_unit, [template_config])
+    (pruned_model,) = parse_worker.build_source_models(translation_unit, [analyzed_config])
+
+    rendered = main.render_template(j2_env, template_config, header_file, source_model)
+    assert rendered.strip()
+    assert main.render_template(j2_env, analyzed_config, header_file, pruned_model) == rendered
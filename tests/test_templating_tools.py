@@ -0,0 +1,37 @@
+import pytest
+
+from gk.source_index.templating_tools import build_jinja_environment, find_template_dependencies
+
+
+def test_template_dependencies(tmp_path):
+    (tmp_path / "main.j2").write_text('{% include "part.j2" %}{% import "macros.j2" as m %}')
+    (tmp_path / "part.j2").write_text('{% include "macros.j2" %}')
+    (tmp_path / "macros.j2").write_text("{% macro f() %}{% endmacro %}")
+
+    env = build_jinja_environment(tmp_path)
+
+    assert sorted(path.name for path in find_template_dependencies(env, "main.j2")) == [
+        "macros.j2",
+        "main.j2",
+        "part.j2",
+    ]
+
+
+def test_template_bytecode_cache(tmp_path, monkeypatch):
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    (template_dir / "main.j2").write_text("{% for c in classes %}{{ c }}{% endfor %}")
+    cache_dir = tmp_path / "cache"
+
+    assert build_jinja_environment(template_dir, cache_dir).get_template("main.j2").render(classes="ab") == "ab"
+    assert len(list((cache_dir / "templates").iterdir())) == 1
+
+    # A warm environment loads the compiled template
+    env = build_jinja_environment(template_dir, cache_dir)
+    monkeypatch.setattr(env, "compile", lambda *args, **kwargs: pytest.fail("Template compiled again"))
+    assert env.get_template("main.j2").render(classes="ab") == "ab"
+
+    # A changed source does not match the checksum of the compiled one
+    (template_dir / "main.j2").write_text("{{ classes | length }}")
+    monkeypatch.undo()
+    assert build_jinja_environment(template_dir, cache_dir).get_template("main.j2").render(classes="ab") == "2"
@@ -0,0 +1,21 @@
+import os
+
+from gk.source_index.utils import OutputStatistics, write_if_changed
+
+
+def test_write_if_changed(tmp_path):
+    target_file = tmp_path / "generated" / "target.cpp"
+    statistics = OutputStatistics()
+
+    assert write_if_changed(target_file, "int a;\n", statistics)
+    os.utime(target_file, (0, 0))
+
+    assert not write_if_changed(target_file, "int a;\n", statistics)
+    assert target_file.stat().st_mtime == 0
+
+    assert write_if_changed(target_file, "int b;\n", statistics)
+    assert target_file.read_text() == "int b;\n"
+    assert target_file.stat().st_mtime != 0
+
+    assert statistics == OutputStatistics(written=2, unchanged=1)
+    assert [path.name for path in target_file.parent.iterdir()] == ["target.cpp"]
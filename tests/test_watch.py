@@ -0,0 +1,89 @@
+import threading
+
+import clang.cindex as clang_index
+import pytest
+
+from gk.source_index import config, main
+from gk.source_index.watch import InotifyWatcher, PollingWatcher, watch
+
+CONFIG = """
+templates:
+  - template: "serialize.j2"
+    filename_suffix: ".cpp"
+    filter_annotations:
+      - SERIALIZABLE
+"""
+
+TEMPLATE = "{% for c in model.class_types %}{{ c.name }}{% endfor %}\n"
+
+
+@pytest.mark.parametrize("watcher_type", [PollingWatcher, InotifyWatcher])
+def test_watcher_reports_changed_files(watcher_type, tmp_path):
+    changed_file = tmp_path / "changed.hpp"
+    changed_file.write_text("")
+    other_file = tmp_path / "other.hpp"
+    other_file.write_text("")
+
+    watcher = watcher_type()
+    changed_files = []
+
+    def wait():
+        changed_files.append(watcher.wait({changed_file, other_file}))
+
+    # Lets the watcher see the files before they change
+    watcher_thread = threading.Thread(target=wait)
+    watcher_thread.start()
+    watcher_thread.join(timeout=0.5)
+
+    changed_file.write_text("struct A {};\n")
+    watcher_thread.join(timeout=10)
+    watcher.close()
+
+    assert changed_files == [{changed_file}]
+
+
+class ScriptedWatcher:
+    def __init__(self, changes):
+        self._changes = list(changes)
+        self.watched_files = []
+
+    def wait(self, files):
+        self.watched_files.append(files)
+        if not self._changes:
+            raise KeyboardInterrupt()
+        return self._changes.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_watch_regenerates_affected_headers(clang_index_parser: clang_index.Index, tmp_path, monkeypatch):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(CONFIG)
+    template_file = tmp_path / "serialize.j2"
+    template_file.write_text(TEMPLATE)
+    shared_header = tmp_path / "shared.hpp"
+    shared_header.write_text("#define SERIALIZABLE(type)\n")
+    header_a = tmp_path / "a.hpp"
+    header_a.write_text('#include "shared.hpp"\nstruct A {};\nSERIALIZABLE(A)\n')
+    header_b = tmp_path / "b.hpp"
+    header_b.write_text("#define SERIALIZABLE(type)\nstruct B {};\nSERIALIZABLE(B)\n")
+
+    executed_inputs = []
+    execute = main.execute
+
+    def recording_execute(app_config, args, *rest, **kwargs):
+        executed_inputs.append([p.split("/")[-1] for p in args.input_files])
+        return execute(app_config, args, *rest, **kwargs)
+
+    monkeypatch.setattr(main, "execute", recording_execute)
+
+    args = main.parse_args(
+        ["-c", str(config_file), "-d", str(tmp_path / "out"), "-i", str(header_a), str(header_b), "--watch"]
+    )
+    watcher = ScriptedWatcher([{shared_header}, {template_file}])
+    watch(config.load_app_config(config_file), args, tmp_path, watcher)
+
+    assert executed_inputs == [["a.hpp", "b.hpp"], ["a.hpp"], ["a.hpp", "b.hpp"]]
+    assert {config_file, template_file, shared_header, header_a, header_b} <= watcher.watched_files[0]
+    assert (tmp_path / "out" / "a.cpp").read_text() == "A"